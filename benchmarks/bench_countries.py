@@ -0,0 +1,78 @@
+"""countries.json decoding and the group name -> country code mapping.
+
+    python benchmarks/bench_countries.py [--countries 250] [--repeat 20] [--json]
+
+Decodes a synthetic countries.json shaped like the iptv-org one and resolves
+the code for every group of a synthetic playlist through CountryCodes. The
+groups include respelled country names and names that aren't countries at all.
+Each lookup pass starts from a fresh mapping, so the memo doesn't help it.
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_parser import best_of  # noqa: E402
+from catalog_loader import decode_countries  # noqa: E402
+from country_codes import CountryCodes  # noqa: E402
+
+# Group names in real playlists that have no country entry.
+EXTRA_GROUPS = ("Undefined", "International", "Worldwide", "XXX")
+
+
+def synthetic_countries(count: int) -> bytes:
+    return json.dumps([
+        {
+            "name": f"Country {i}",
+            "code": chr(65 + i // 26 % 26) + chr(65 + i % 26),
+            "languages": ["eng"],
+            "flag": "\U0001F3F3",
+        }
+        for i in range(count)
+    ]).encode("utf-8")
+
+
+def group_names(count: int):
+    # Every tenth country also appears respelled, as merged playlists do.
+    respelled = [f"COUNTRY  {i}." for i in range(0, count, 10)]
+    return [f"Country {i}" for i in range(count)] + respelled + list(EXTRA_GROUPS)
+
+
+def lookup_all(name_to_code, names):
+    codes = CountryCodes(name_to_code)
+    return [codes.get(name) for name in names]
+
+
+def run(countries=250, repeat=20):
+    body = synthetic_countries(countries)
+    groups = group_names(countries)
+    name_to_code = decode_countries(body)
+    return {
+        "countries": countries,
+        "bytes": len(body),
+        "decode_seconds": best_of(decode_countries, body, repeat),
+        "lookup_seconds": best_of(lambda names: lookup_all(name_to_code, names), groups, repeat),
+        "resolved": sum(1 for name in groups if name_to_code.get(name)) / len(groups),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--countries", type=int, default=250)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = run(args.countries, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.countries} countries, {results['bytes'] / 1e3:.1f} KB")
+    print(f"  decode   {results['decode_seconds'] * 1000:8.3f} ms")
+    print(f"  lookup   {results['lookup_seconds'] * 1000:8.3f} ms  ({results['resolved']:.0%} of groups resolved)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,176 @@
+"""Catalog fetch latency against local servers that stall and fail on purpose.
+
+    python benchmarks/bench_fetch.py [--requests 40] [--slow 0.5] [--slow-rate 0.1] [--json]
+
+Runs Fetcher against a primary and a mirror, both served from local
+http.servers that delay or fail requests as each scenario asks. The
+scenarios are:
+
+tail: the primary stalls for --slow seconds before answering --slow-rate of
+the requests. It is run with hedging and without, which shows what hedging
+does to p95 and max latency.
+outage: the primary answers every request with 503, so the mirror has to
+serve everything.
+flaky: there is no mirror, and the primary fails the first two requests of
+each fetch. Only retries can save it.
+
+Timings cover the whole response, headers and body. Backoff and hedge delays
+are scaled down so the run stays short. Nothing touches the network.
+"""
+import argparse
+import functools
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+from http_fetch import Fetcher  # noqa: E402
+
+BODY = b"#EXTM3U\n" + b"".join(
+    b'#EXTINF:-1 group-title="Country %d",Channel %d\nhttps://streams.example.com/%d.m3u8\n' % (i % 50, i, i)
+    for i in range(2000)
+)
+HEDGE_DELAY = 0.1
+BACKOFF_BASE = 0.05
+
+
+class FaultyHandler(BaseHTTPRequestHandler):
+    def __init__(self, *args, faults, **kwargs):
+        self.faults = faults
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        delay, status = self.faults.next()
+        time.sleep(delay)
+        self.send_response(status)
+        body = BODY if status == 200 else b""
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class Faults:
+    """What a stand-in does to each request: (delay before answering, status)"""
+
+    def __init__(self, slow=0.0, slow_rate=0.0, status=200, fail_first=0, seed=0):
+        self.slow = slow
+        self.slow_rate = slow_rate
+        self.status = status
+        self.fail_first = fail_first
+        self.seed = seed
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._seen = 0
+
+    def reset(self):
+        with self._lock:
+            self._seen = 0
+            self._rng.seed(self.seed)
+
+    def next(self):
+        with self._lock:
+            self._seen += 1
+            failing = self._seen <= self.fail_first
+            delay = self.slow if self._rng.random() < self.slow_rate else 0.0
+        return delay, 503 if failing else self.status
+
+
+class StandIn:
+    def __init__(self, faults):
+        self.faults = faults
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(FaultyHandler, faults=faults))
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/index.country.m3u"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def fetch_times(fetcher, urls, count, before_each=None):
+    """Seconds per complete fetch, and how many fetches failed outright"""
+    times = []
+    failed = 0
+    for _ in range(count):
+        if before_each:
+            before_each()
+        started = time.perf_counter()
+        try:
+            _, response = fetcher.get(urls, timeout=(2, 5), stream=True)
+            with response:
+                response.raise_for_status()
+                response.content
+        except requests.RequestException:
+            failed += 1
+            continue
+        times.append(time.perf_counter() - started)
+    return times, failed
+
+
+def summary(prefix, times, failed):
+    times = sorted(times) or [float("nan")]
+    return {
+        f"{prefix}_p50_seconds": statistics.median(times),
+        f"{prefix}_p95_seconds": times[min(len(times) - 1, int(len(times) * 0.95))],
+        f"{prefix}_max_seconds": times[-1],
+        f"{prefix}_failed": failed,
+    }
+
+
+def run(count=40, slow=0.5, slow_rate=0.1):
+    session = requests.Session()
+    results = {"requests": count}
+    primary = StandIn(Faults(slow, slow_rate))
+    mirror = StandIn(Faults())
+    try:
+        for prefix, hedge_delay in (("tail_unhedged", None), ("tail_hedged", HEDGE_DELAY)):
+            primary.faults.reset()
+            fetcher = Fetcher(session, hedge_delay=hedge_delay, backoff_base=BACKOFF_BASE)
+            results.update(summary(prefix, *fetch_times(fetcher, [primary.url, mirror.url], count)))
+
+        primary.faults.status, primary.faults.slow_rate = 503, 0.0
+        fetcher = Fetcher(session, hedge_delay=HEDGE_DELAY, backoff_base=BACKOFF_BASE)
+        results.update(summary("outage", *fetch_times(fetcher, [primary.url, mirror.url], count)))
+
+        primary.faults.status, primary.faults.fail_first = 200, 2
+        results.update(summary("flaky", *fetch_times(fetcher, [primary.url], count, primary.faults.reset)))
+    finally:
+        primary.close()
+        mirror.close()
+        session.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=40)
+    parser.add_argument("--slow", type=float, default=0.5, help="seconds the primary stalls on a slow request")
+    parser.add_argument("--slow-rate", type=float, default=0.1, help="fraction of primary requests that stall")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = run(args.requests, args.slow, args.slow_rate)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.requests} fetches per scenario")
+    for prefix in ("tail_unhedged", "tail_hedged", "outage", "flaky"):
+        print(f"  {prefix:<14} p50 {results[f'{prefix}_p50_seconds'] * 1000:7.1f} ms  "
+              f"p95 {results[f'{prefix}_p95_seconds'] * 1000:7.1f} ms  "
+              f"max {results[f'{prefix}_max_seconds'] * 1000:7.1f} ms  "
+              f"failed {results[f'{prefix}_failed']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""Control-tree construction cost of the country grid and a country's channel grid.
+
+    python benchmarks/bench_grid.py [--countries 200] [--sizes 100,1000,10000] [--repeat 5] [--json]
+
+Calls main.show_countries() and main.show_country_channels() against a page
+that only counts update() calls. It times building the controls up to the
+first paint. Tasks they start are not run. Work handed to run_thread, such
+as building the search index, runs inline and is included in the timing.
+Images stay on the placeholder, and the health store and catalog database
+are scratch copies, so nothing touches the network, the real cache or
+config.db.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_countries import synthetic_countries  # noqa: E402
+from bench_parser import synthetic_playlist  # noqa: E402
+from bench_search import build_group  # noqa: E402
+
+DEFAULT_SIZES = (100, 1000, 10_000)
+
+
+class ScratchPage:
+    """Just enough of ft.Page to build screens against"""
+
+    class Task:
+        def cancel(self):
+            pass
+
+    def __init__(self):
+        self.title = self.scroll = self.bgcolor = self.padding = None
+        self.controls = []
+        self.overlay = []
+        self.updates = 0
+
+    def update(self, *controls):
+        self.updates += 1
+
+    def add(self, *controls):
+        self.controls.extend(controls)
+        self.update()
+
+    def run_task(self, handler, *args):
+        handler(*args).close()
+        return self.Task()
+
+    def run_thread(self, handler, *args):
+        handler(*args)
+
+
+def scratch_environment(directory):
+    """Point every singleton the screens use at scratch state under directory"""
+    os.environ["FLET_APP_STORAGE_CACHE"] = directory
+    import catalog_db
+    import image_cache
+    import stream_health
+
+    class OfflineImageCache(image_cache.ImageCache):
+        def _download(self, key, url, width, height):
+            pass
+
+    catalog_db._catalog_db = catalog_db.CatalogDB(os.path.join(directory, "catalog.db"))
+    stream_health._health_store = stream_health.HealthStore(os.path.join(directory, "catalog.db"))
+    image_cache._image_cache = OfflineImageCache(os.path.join(directory, "images"))
+
+
+def best_of(build, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        page = ScratchPage()
+        started = time.perf_counter()
+        build(page)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def run(countries=200, sizes=DEFAULT_SIZES, repeat=5):
+    from catalog_loader import decode_countries
+    from catalog_snapshot import CatalogSnapshot, write_snapshot
+    from channel_store import ChannelStore
+    from m3u_parser import parse_m3u
+
+    with tempfile.TemporaryDirectory() as directory:
+        scratch_environment(directory)
+        import main
+
+        store = ChannelStore()
+        # bench_parser spreads entries over 200 groups; 50 per group keeps this quick.
+        for group, channel in parse_m3u([synthetic_playlist(countries * 50)]):
+            store.add(group, channel)
+        name_to_code = decode_countries(synthetic_countries(countries))
+        snapshot = CatalogSnapshot(write_snapshot(os.path.join(directory, "catalog.snap"), store, name_to_code, ""))
+
+        results = {
+            "countries": len(snapshot.countries()),
+            "countries_seconds": best_of(
+                lambda page: main.show_countries(page, snapshot.countries(), None, snapshot), repeat
+            ),
+        }
+        rng = random.Random(0)
+        for size in sizes:
+            group = build_group(size, rng)
+            results[f"channels_{size}_seconds"] = best_of(
+                lambda page: main.show_country_channels(page, "Country 0", group), repeat
+            )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--countries", type=int, default=200)
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)), help="channel group sizes")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    results = run(args.countries, sizes, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"  country grid ({results['countries']} groups) {results['countries_seconds'] * 1000:8.1f} ms")
+    for size in sizes:
+        print(f"  channel grid ({size} channels) {results[f'channels_{size}_seconds'] * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
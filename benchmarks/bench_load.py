@@ -0,0 +1,140 @@
+"""End-to-end catalog load against a local HTTP server.
+
+    python benchmarks/bench_load.py [--entries 10000] [--repeat 3] [--json]
+
+Serves a synthetic playlist and countries.json from a local http.server.
+load_catalog() then runs the way live_view drives it, in three stages. cold
+starts from an empty cache, so both files come over HTTP and are parsed as
+they stream in. warm reads the cached copies from disk. import applies the
+records to an empty catalog database and compiles the snapshot. first_record
+is how long it takes until the first tile could be shown. The real cache,
+config.db and the network are never touched.
+"""
+import argparse
+import asyncio
+import functools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_countries import synthetic_countries  # noqa: E402
+from bench_parser import synthetic_playlist  # noqa: E402
+import catalog_loader  # noqa: E402
+from catalog_db import CatalogDB  # noqa: E402
+from catalog_snapshot import write_snapshot  # noqa: E402
+from playlist_cache import PlaylistCache  # noqa: E402
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class StandIn:
+    """countries.json and a playlist served from a scratch directory on a free port"""
+
+    def __init__(self, directory, entries, countries=250):
+        with open(os.path.join(directory, "countries.json"), "wb") as f:
+            f.write(synthetic_countries(countries))
+        with open(os.path.join(directory, "index.country.m3u"), "wb") as f:
+            f.write(synthetic_playlist(entries))
+        handler = functools.partial(QuietHandler, directory=directory)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        base = f"http://127.0.0.1:{self.server.server_address[1]}"
+        self.countries_url = f"{base}/countries.json"
+        self.playlist_url = f"{base}/index.country.m3u"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+async def load(cache):
+    """(seconds to the first record, seconds to the last, name_to_code, records)"""
+    catalog_loader._cache = cache
+    started = time.perf_counter()
+    name_to_code, channels = await catalog_loader.load_catalog()
+    first = None
+    records = []
+    async for record in channels:
+        if first is None:
+            first = time.perf_counter() - started
+        records.append(record)
+    return first, time.perf_counter() - started, name_to_code, records
+
+
+def run(entries=10_000, repeat=3):
+    results = {"entries": entries}
+    with tempfile.TemporaryDirectory() as directory:
+        served = os.path.join(directory, "served")
+        os.makedirs(served)
+        stand_in = StandIn(served, entries)
+        catalog_loader.COUNTRIES_URL = stand_in.countries_url
+        catalog_loader.catalog_sources = lambda: [stand_in.playlist_url]
+        catalog_loader.catalog_mirrors = lambda url: []
+        try:
+            for stage in ("cold", "warm"):
+                best = None
+                for attempt in range(repeat):
+                    cache_dir = os.path.join(directory, f"cache-{attempt}")
+                    cache = PlaylistCache(cache_dir)
+                    if stage == "warm":
+                        asyncio.run(load(cache))
+                    timing = asyncio.run(load(cache))
+                    if best is None or timing[1] < best[1]:
+                        best = timing
+                    for name in os.listdir(cache_dir):
+                        os.remove(os.path.join(cache_dir, name))
+                first, total, name_to_code, records = best
+                results[f"{stage}_first_record_seconds"] = first
+                results[f"{stage}_seconds"] = total
+            results["records"] = len(records)
+
+            import_seconds = snapshot_seconds = float("inf")
+            for attempt in range(repeat):
+                catalog = CatalogDB(os.path.join(directory, f"catalog-{attempt}.db"))
+                started = time.perf_counter()
+                importer = catalog.importer(name_to_code)
+                for group, channel in records:
+                    importer.add(group, channel)
+                importer.commit("0" * 40)
+                import_seconds = min(import_seconds, time.perf_counter() - started)
+                started = time.perf_counter()
+                digest, codes, store = catalog.export()
+                write_snapshot(os.path.join(directory, "catalog.snap"), store, codes, digest)
+                snapshot_seconds = min(snapshot_seconds, time.perf_counter() - started)
+            results["import_seconds"] = import_seconds
+            results["snapshot_seconds"] = snapshot_seconds
+        finally:
+            stand_in.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=10_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = run(args.entries, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.entries} entries, {results['records']} records")
+    for stage in ("cold", "warm"):
+        print(f"  {stage:<8} first record {results[f'{stage}_first_record_seconds'] * 1000:8.1f} ms  "
+              f"all {results[f'{stage}_seconds'] * 1000:8.1f} ms")
+    print(f"  import   {results['import_seconds'] * 1000:8.1f} ms")
+    print(f"  snapshot {results['snapshot_seconds'] * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""What the multi-view budget scheduler lets play, and what it costs to plan.
+
+    python benchmarks/bench_multiview.py [--budget-kbps 8000] [--max-decodes 4] [--repeat 1000] [--json]
+
+Fills a 2x2 and a 3x3 grid with channels that have a typical four-rung
+variant ladder, one tile focused and the rest muted. For each grid it
+reports the bandwidth and the number of streams decoding, first as planned
+by BudgetScheduler and then as they would be with every tile on its top
+variant. It also times one plan() call. No players or pages are involved.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from multiview import LAYOUTS, BudgetScheduler, MultiViewTile, cost  # noqa: E402
+
+# Bits per second of a typical 360p / 480p / 720p / 1080p ladder.
+LADDER = (800_000, 1_400_000, 2_800_000, 5_000_000)
+
+
+def synthetic_tiles(count: int):
+    tiles = []
+    for index in range(count):
+        tile = MultiViewTile()
+        tile.channel = f"Channel {index}"
+        tile.variants = [(rate, f"https://streams.example.com/{index}/{rate}.m3u8") for rate in LADDER]
+        tiles.append(tile)
+    return tiles
+
+
+def run(budget=8_000_000, max_decodes=4, repeat=1000):
+    scheduler = BudgetScheduler(budget, max_decodes)
+    results = {"budget": budget, "max_decodes": max_decodes}
+    for layout, size in LAYOUTS.items():
+        tiles = synthetic_tiles(size * size)
+        plan = scheduler.plan(tiles, 0)
+        chosen = [variant for variant in plan if variant is not None]
+        results[f"{layout}_bandwidth"] = sum(cost(variant) for variant in chosen)
+        results[f"{layout}_playing"] = len(chosen)
+        results[f"{layout}_focused_bandwidth"] = cost(plan[0])
+        results[f"{layout}_unbudgeted_bandwidth"] = sum(cost(tile.variants[-1]) for tile in tiles)
+        started = time.perf_counter()
+        for _ in range(repeat):
+            scheduler.plan(tiles, 0)
+        results[f"{layout}_plan_seconds"] = (time.perf_counter() - started) / repeat
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--budget-kbps", type=int, default=8000)
+    parser.add_argument("--max-decodes", type=int, default=4)
+    parser.add_argument("--repeat", type=int, default=1000)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = run(args.budget_kbps * 1000, args.max_decodes, args.repeat)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for layout in LAYOUTS:
+        print(f"  {layout}  {results[f'{layout}_playing']} playing, "
+              f"{results[f'{layout}_bandwidth'] / 1e6:5.1f} Mbit/s "
+              f"(focused {results[f'{layout}_focused_bandwidth'] / 1e6:.1f}), "
+              f"unbudgeted {results[f'{layout}_unbudgeted_bandwidth'] / 1e6:5.1f} Mbit/s, "
+              f"plan {results[f'{layout}_plan_seconds'] * 1e6:.1f} us")
+
+
+if __name__ == "__main__":
+    main()
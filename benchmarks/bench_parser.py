@@ -0,0 +1,107 @@
+"""Parser throughput on a synthetic playlist.
+
+    python benchmarks/bench_parser.py [--entries 100000] [--json]
+
+Compares the original split-based loop from live_view with M3UStreamParser fed
+in 64 KiB chunks into a ChannelStore, the way catalog_loader fills the catalog,
+and again with a tvg-id index. Both sides read every channel's logo.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from channel_store import ChannelStore  # noqa: E402
+from m3u_parser import parse_m3u  # noqa: E402
+
+CHUNK_SIZE = 64 * 1024
+
+
+def synthetic_playlist(entries: int) -> bytes:
+    lines = ["#EXTM3U"]
+    for i in range(entries):
+        group = f"Country {i % 200}"
+        if i % 10 == 0:
+            group += f";Country {(i + 1) % 200}"
+        lines.append(
+            f'#EXTINF:-1 tvg-id="channel{i}.xx" tvg-name="Channel {i}" tvg-country="XX" '
+            f'tvg-logo="https://i.imgur.com/logo{i}.png" group-title="{group}",Channel {i} (720p)'
+        )
+        if i % 20 == 0:
+            lines.append("#EXTVLCOPT:http-user-agent=Mozilla/5.0")
+        lines.append(f"https://streams.example.com/live/{i}/index.m3u8")
+    return "\n".join(lines).encode("utf-8")
+
+
+def legacy_parse(m3u_content: str):
+    country_channels = {}
+    lines = m3u_content.splitlines()
+    for i in range(len(lines)):
+        line = lines[i]
+        if line.startswith('#EXTINF'):
+            parts = line.split('group-title="')
+            if len(parts) > 1:
+                country = parts[1].split('"')[0]
+                channel_name = line.split(',', 1)[1] if ',' in line else "Unnamed Channel"
+                logo = line.split('tvg-logo="')[1].split('"')[0] if 'tvg-logo="' in line else "https://via.placeholder.com/64"
+                url = lines[i + 1].strip() if (i + 1 < len(lines) and not lines[i + 1].startswith('#')) else ""
+                if country not in country_channels:
+                    country_channels[country] = []
+                country_channels[country].append({"name": channel_name, "logo": logo, "url": url})
+    return country_channels
+
+
+def stream_parse(body: bytes, index=None):
+    chunks = (body[i:i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE))
+    store = ChannelStore()
+    for group, channel in parse_m3u(chunks, index):
+        store.add(group, channel)
+    return store
+
+
+def best_of(func, arg, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func(arg)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run(entries, repeat=3):
+    body = synthetic_playlist(entries)
+    results = {
+        "entries": entries,
+        "bytes": len(body),
+        "legacy_seconds": best_of(lambda b: legacy_parse(b.decode("utf-8")), body, repeat),
+        "stream_seconds": best_of(stream_parse, body, repeat),
+        "stream_indexed_seconds": best_of(lambda b: stream_parse(b, {}), body, repeat),
+    }
+    for name in ("legacy", "stream", "stream_indexed"):
+        results[f"{name}_entries_per_second"] = entries / results[f"{name}_seconds"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = run(args.entries, args.repeat)
+    body_bytes = results["bytes"]
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.entries} entries, {body_bytes / 1e6:.1f} MB")
+    for name in ("legacy", "stream", "stream_indexed"):
+        print(f"  {name:<14} {results[f'{name}_seconds'] * 1000:8.1f} ms  "
+              f"{results[f'{name}_entries_per_second']:>12,.0f} entries/s")
+
+
+if __name__ == "__main__":
+    main()
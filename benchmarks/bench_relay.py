@@ -0,0 +1,148 @@
+"""Tune and re-tune time and origin traffic, direct versus through the HLS relay.
+
+    python benchmarks/bench_relay.py [--segments 6] [--segment-kb 500] [--latency 0.03] [--sessions 4] [--json]
+
+Serves a master playlist, a media playlist and --segments segments from a
+local origin that adds --latency seconds to every request. A tune fetches
+what a player needs to start: the master playlist, the media playlist and
+the last three segments. It is timed three ways: straight from the origin,
+through a cold relay, and again through the now warm relay (a re-tune).
+Then --sessions players tune at once, first directly and then through the
+relay, and the bytes the origin sent are counted for each. The relay's
+segment cache lives in a scratch directory. Nothing touches the network.
+"""
+import argparse
+import functools
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+from hls_relay import HLSRelay, SegmentCache  # noqa: E402
+
+# Players join a live playlist about three segments from its end.
+JOIN_SEGMENTS = 3
+
+
+class Origin:
+    """A static HLS channel under directory, served slowly, counting what it sends"""
+
+    def __init__(self, directory, segments, segment_bytes, latency):
+        os.makedirs(os.path.join(directory, "live"))
+        with open(os.path.join(directory, "master.m3u8"), "w") as f:
+            f.write("#EXTM3U\n#EXT-X-STREAM-INF:BANDWIDTH=2000000\nlive/index.m3u8\n")
+        with open(os.path.join(directory, "live", "index.m3u8"), "w") as f:
+            f.write("#EXTM3U\n#EXT-X-TARGETDURATION:6\n#EXT-X-MEDIA-SEQUENCE:0\n")
+            for i in range(segments):
+                f.write(f"#EXTINF:6.0,\nseg{i}.ts\n")
+        for i in range(segments):
+            with open(os.path.join(directory, "live", f"seg{i}.ts"), "wb") as f:
+                f.write(os.urandom(segment_bytes))
+        self.bytes_sent = 0
+        self.requests = 0
+        lock = threading.Lock()
+        origin = self
+
+        class Handler(SimpleHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(latency)
+                with lock:
+                    origin.requests += 1
+                    path = self.translate_path(self.path)
+                    origin.bytes_sent += os.path.getsize(path) if os.path.isfile(path) else 0
+                super().do_GET()
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(Handler, directory=directory))
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/master.m3u8"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def reset(self):
+        self.bytes_sent = self.requests = 0
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def uris(session, url):
+    response = session.get(url, timeout=10)
+    response.raise_for_status()
+    return [urljoin(response.url, line) for line in response.text.splitlines() if line and not line.startswith("#")]
+
+
+def tune(url):
+    """Seconds until a player would have everything it needs to start playing url"""
+    with requests.Session() as session:
+        started = time.perf_counter()
+        variant = uris(session, url)[0]
+        for segment in uris(session, variant)[-JOIN_SEGMENTS:]:
+            session.get(segment, timeout=10).raise_for_status()
+        return time.perf_counter() - started
+
+
+def run(segments=6, segment_kb=500, latency=0.03, sessions=4):
+    results = {"segments": segments, "segment_bytes": segment_kb * 1024, "sessions": sessions}
+    with tempfile.TemporaryDirectory() as directory:
+        origin = Origin(os.path.join(directory, "origin"), segments, segment_kb * 1024, latency)
+        relay = HLSRelay(port=0, public_url=None, cache=SegmentCache(os.path.join(directory, "segments")))
+        try:
+            results["direct_tune_seconds"] = tune(origin.url)
+            relayed = relay.url_for(origin.url)
+            results["relay_cold_tune_seconds"] = tune(relayed)
+            results["relay_retune_seconds"] = tune(relayed)
+
+            for name, url in (("direct", origin.url), ("relay", None)):
+                if url is None:
+                    # A fresh relay, so the sessions start from an empty cache.
+                    relay.stop()
+                    relay = HLSRelay(port=0, public_url=None, cache=SegmentCache(os.path.join(directory, "fresh")))
+                    url = relay.url_for(origin.url)
+                origin.reset()
+                with ThreadPoolExecutor(sessions) as executor:
+                    started = time.perf_counter()
+                    list(executor.map(tune, [url] * sessions))
+                results[f"{name}_sessions_seconds"] = time.perf_counter() - started
+                results[f"{name}_origin_bytes"] = origin.bytes_sent
+                results[f"{name}_origin_requests"] = origin.requests
+        finally:
+            relay.stop()
+            origin.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--segments", type=int, default=6)
+    parser.add_argument("--segment-kb", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.03, help="seconds the origin adds to every request")
+    parser.add_argument("--sessions", type=int, default=4)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = run(args.segments, args.segment_kb, args.latency, args.sessions)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"  tune direct      {results['direct_tune_seconds'] * 1000:8.1f} ms")
+    print(f"  tune relay cold  {results['relay_cold_tune_seconds'] * 1000:8.1f} ms")
+    print(f"  re-tune relay    {results['relay_retune_seconds'] * 1000:8.1f} ms")
+    for name in ("direct", "relay"):
+        print(f"  {args.sessions} sessions {name:<6} {results[f'{name}_sessions_seconds'] * 1000:8.1f} ms  "
+              f"origin {results[f'{name}_origin_requests']} requests, "
+              f"{results[f'{name}_origin_bytes'] / 1024:.0f} KB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+"""Channel filter latency per query length, as update_channel_list sees it.
+
+    python benchmarks/bench_search.py [--channels 10000] [--max-length 8] [--json]
+
+Builds one group of --channels synthetic channels and a SearchIndex over
+their names. For each query length it times the filter step of
+update_channel_list: the search, mapping positions back to channels, and the
+health-rank sort. Two
+cases are timed. "fresh" is a query typed from scratch, answered from the
+trigram index or a full scan. "typed" is the same query reached one keystroke
+at a time, where each step only re-checks the previous matches. The grid
+rebind is left out; bench_grid covers it.
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from channel_search import SearchIndex, normalize  # noqa: E402
+from channel_store import ChannelStore  # noqa: E402
+from m3u_parser import ChannelRecord  # noqa: E402
+from stream_health import STATUS_DEAD, STATUS_OK, health_rank  # noqa: E402
+
+QUERIES_PER_LENGTH = 50
+SYLLABLES = ("ka", "ri", "to", "ne", "sa", "lu", "mo", "vi", "de", "ra", "zo", "pe", "chi", "an", "el", "or")
+SUFFIXES = ("", " TV", " HD", " News", " Sport", " Kids", " Music", " 24", " Cinema", " Plus")
+
+
+def synthetic_names(count: int, rng):
+    """Channel names varied enough that longer queries narrow the results"""
+    return [
+        "".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))).capitalize()
+        + rng.choice(SUFFIXES) + (f" {i % 7 + 1}" if i % 5 == 0 else "")
+        for i in range(count)
+    ]
+
+
+def build_group(channels: int, rng):
+    store = ChannelStore()
+    for i, name in enumerate(synthetic_names(channels, rng)):
+        store.add("Country 0", ChannelRecord.from_attributes(name, f"https://streams.example.com/live/{i}/index.m3u8", {}))
+    return store.group("Country 0")
+
+
+def sample_queries(names, length, count, rng):
+    """Substrings of real names, so every query matches something"""
+    candidates = [name for name in names if len(name) >= length]
+    queries = []
+    for _ in range(count):
+        name = rng.choice(candidates)
+        start = rng.randrange(len(name) - length + 1)
+        queries.append(name[start:start + length])
+    return queries
+
+
+def visible(index, group, health, query):
+    found = (group[position] for position in index.search(query))
+    return sorted(found, key=lambda channel: health_rank(health, channel))
+
+
+def run(channels=10_000, max_length=8, queries=QUERIES_PER_LENGTH):
+    rng = random.Random(0)
+    group = build_group(channels, rng)
+    names = group.names()
+    started = time.perf_counter()
+    index = SearchIndex(names)
+    index.build()
+    results = {"channels": len(group), "index_seconds": time.perf_counter() - started}
+    # A probed catalog: a third live, a third offline, the rest never checked.
+    health = {}
+    for position, channel in enumerate(group):
+        if position % 3 < 2:
+            health[channel.url] = (STATUS_OK if position % 3 == 0 else STATUS_DEAD, None, None)
+
+    normalized = [normalize(name) for name in names]
+    for length in range(1, max_length + 1):
+        fresh, typed, matches = [], [], []
+        for query in sample_queries(normalized, length, queries, rng):
+            index.search("")
+            started = time.perf_counter()
+            found = visible(index, group, health, query)
+            fresh.append(time.perf_counter() - started)
+            matches.append(len(found))
+
+            index.search("")
+            started = time.perf_counter()
+            for end in range(1, length + 1):
+                visible(index, group, health, query[:end])
+            typed.append(time.perf_counter() - started)
+        results[f"len{length}_fresh_p50_seconds"] = statistics.median(fresh)
+        results[f"len{length}_fresh_max_seconds"] = max(fresh)
+        results[f"len{length}_typed_p50_seconds"] = statistics.median(typed)
+        results[f"len{length}_matches"] = statistics.median(matches)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--channels", type=int, default=10_000)
+    parser.add_argument("--max-length", type=int, default=8)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = run(args.channels, args.max_length)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{results['channels']} channels, index built in {results['index_seconds'] * 1000:.1f} ms")
+    print("  len    fresh p50    fresh max    typed p50   matches")
+    for length in range(1, args.max_length + 1):
+        print(f"  {length:>3} {results[f'len{length}_fresh_p50_seconds'] * 1000:9.3f} ms "
+              f"{results[f'len{length}_fresh_max_seconds'] * 1000:9.3f} ms "
+              f"{results[f'len{length}_typed_p50_seconds'] * 1000:9.3f} ms "
+              f"{results[f'len{length}_matches']:>9.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""Cold-start cost: import time and time to the first frame.
+
+    python benchmarks/bench_startup.py [--repeat 5] [--top 15] [--check-deferred] [--json]
+
+Every run is a fresh interpreter. It imports main and calls main() against a
+page that records the time of each update() instead of talking to a client.
+first_paint is the first update (the shell), home is the update that puts the
+home screen up. Times are measured from the start of the child process. The
+process time is the full wall time, including interpreter startup.
+--top lists the slowest imports under `import main`, using -X importtime.
+--check-deferred exits with status 1 if any module in HEAVY_MODULES has
+been imported by the time of the first frame.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+started = time.perf_counter()
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# Nothing on the startup path should need these before the first frame.
+HEAVY_MODULES = ("requests", "flet_video", "PIL", "sqlite3", "catalog_loader")
+HOME_TIMEOUT = 10
+
+
+class RecordingPage:
+    """Just enough of ft.Page for main() to paint against; times every update()"""
+
+    def __init__(self):
+        self.title = self.scroll = self.bgcolor = self.padding = None
+        self.controls = []
+        self.overlay = []
+        self.updates = []
+
+    def update(self):
+        self.updates.append((time.perf_counter(), [m for m in HEAVY_MODULES if m in sys.modules]))
+
+    def add(self, *controls):
+        self.controls.extend(controls)
+        self.update()
+
+    def run_task(self, handler, *args):
+        return asyncio.ensure_future(handler(*args))
+
+    def run_thread(self, handler, *args):
+        threading.Thread(target=handler, args=args, daemon=True).start()
+
+
+async def measure():
+    import main
+    imported = time.perf_counter()
+    page = RecordingPage()
+    await main.main(page)
+    deadline = time.monotonic() + HOME_TIMEOUT
+    while len(page.updates) < 2:
+        if time.monotonic() > deadline:
+            raise RuntimeError("home screen never painted")
+        await asyncio.sleep(0.001)
+    (first_paint, loaded), (home, _) = page.updates[:2]
+    return {
+        "import_seconds": imported - started,
+        "first_paint_seconds": first_paint - started,
+        "home_seconds": home - started,
+        "loaded_at_first_paint": loaded,
+    }
+
+
+def run_child():
+    # asyncio.run cancels main's pending warm-up once the home screen is measured.
+    print(json.dumps(asyncio.run(measure())))
+
+
+def cold_start():
+    begin = time.perf_counter()
+    child = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child"],
+        cwd=ROOT, capture_output=True, text=True,
+    )
+    if child.returncode:
+        sys.exit(f"startup run failed:\n{child.stderr}")
+    result = json.loads(child.stdout)
+    result["process_seconds"] = time.perf_counter() - begin
+    return result
+
+
+def slowest_imports(top):
+    """[(module, cumulative_seconds)] for the slowest imports under `import main`"""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    ).stderr
+    timings = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        timings.append((name.strip(), int(cumulative) / 1e6))
+    return sorted(timings, key=lambda timing: -timing[1])[:top]
+
+
+def summarize(runs, key):
+    values = [run[key] for run in runs]
+    return {"median": statistics.median(values), "min": min(values), "max": max(values)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="slowest imports to list (0 to skip)")
+    parser.add_argument("--check-deferred", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        run_child()
+        return
+
+    runs = [cold_start() for _ in range(args.repeat)]
+    keys = ("process_seconds", "import_seconds", "first_paint_seconds", "home_seconds")
+    report = {
+        "repeat": args.repeat,
+        "python": sys.version.split()[0],
+        **{key: summarize(runs, key) for key in keys},
+        "loaded_at_first_paint": sorted({name for run in runs for name in run["loaded_at_first_paint"]}),
+        "slowest_imports": slowest_imports(args.top) if args.top else [],
+    }
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        for key in keys:
+            stats = report[key]
+            print(f"{key:<22} median {stats['median'] * 1000:8.1f} ms  "
+                  f"(min {stats['min'] * 1000:.1f}, max {stats['max'] * 1000:.1f})")
+        print(f"loaded at first paint: {', '.join(report['loaded_at_first_paint']) or 'none of ' + ', '.join(HEAVY_MODULES)}")
+        for name, seconds in report["slowest_imports"]:
+            print(f"  {seconds * 1000:8.1f} ms  {name}")
+    if args.check_deferred and report["loaded_at_first_paint"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""Catalog memory footprint, measured with tracemalloc.
+
+    python benchmarks/bench_store.py [--entries 100000] [--json]
+
+Compares the old country -> list-of-dicts layout with ChannelStore, both built
+from the same parsed synthetic playlist.
+"""
+import argparse
+import gc
+import json
+import os
+import sys
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_parser import CHUNK_SIZE, synthetic_playlist  # noqa: E402
+from channel_store import ChannelStore  # noqa: E402
+from m3u_parser import parse_m3u  # noqa: E402
+
+
+def chunks(body):
+    return (body[i:i + CHUNK_SIZE] for i in range(0, len(body), CHUNK_SIZE))
+
+
+def build_dicts(body):
+    # The old layout: one dict of every attribute per channel, listed under each group.
+    country_channels = {}
+    last_channel = last_dict = None
+    for group, channel in parse_m3u(chunks(body)):
+        if channel is not last_channel:
+            last_channel = channel
+            last_dict = dict(channel.attributes(), name=channel.name, url=channel.url)
+        country_channels.setdefault(group, []).append(last_dict)
+    return country_channels
+
+
+def build_store(body):
+    store = ChannelStore()
+    for group, channel in parse_m3u(chunks(body)):
+        store.add(group, channel)
+    store._last_channel = None
+    return store
+
+
+def measure(build, body):
+    """Return (retained bytes, peak bytes) allocated while building"""
+    gc.collect()
+    tracemalloc.start()
+    result = build(body)
+    gc.collect()
+    retained, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return retained, peak
+
+
+def run(entries):
+    body = synthetic_playlist(entries)
+    results = {"entries": entries}
+    for name, build in (("dicts", build_dicts), ("store", build_store)):
+        results[f"{name}_retained_bytes"], results[f"{name}_peak_bytes"] = measure(build, body)
+    results["retained_reduction"] = 1 - results["store_retained_bytes"] / results["dicts_retained_bytes"]
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=100_000)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = run(args.entries)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{args.entries} entries")
+    for name in ("dicts", "store"):
+        print(f"  {name:<6} retained {results[f'{name}_retained_bytes'] / 1e6:7.1f} MB  "
+              f"peak {results[f'{name}_peak_bytes'] / 1e6:7.1f} MB")
+    print(f"  retained memory reduced by {results['retained_reduction']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
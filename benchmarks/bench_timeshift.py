@@ -0,0 +1,132 @@
+"""Resume latency and footprint of the time-shift buffer.
+
+    python benchmarks/bench_timeshift.py [--seconds 6] [--segment 0.25] [--segment-kb 200] [--latency 0.05] [--json]
+
+Serves a live channel from a local origin that publishes a new segment
+every --segment seconds and adds --latency seconds to each request. The
+channel is recorded into a small ring for --seconds. The ring's window is a
+quarter of that, so it wraps and evicts several times. A resume is what a
+player does after a pause: fetch the playlist, then the three segments it
+rejoins at. It is timed from the ring and, for comparison, as a reconnect to
+the origin. The ring file size is reported before and after, to show it
+grows with what is recorded and stops at the ring's capacity, along with
+how many segments stay indexed. Nothing touches the network.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urljoin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests  # noqa: E402
+from hls_relay import HLSRelay, SegmentCache  # noqa: E402
+from timeshift import Timeshift  # noqa: E402
+
+# Segments a live playlist lists, and how many a player rejoins at.
+LIVE_SEGMENTS = 6
+JOIN_SEGMENTS = 3
+
+
+class LiveOrigin:
+    """A live channel whose playlist slides forward in real time"""
+
+    def __init__(self, segment, segment_bytes, latency):
+        started = time.monotonic()
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                time.sleep(latency)
+                newest = int((time.monotonic() - started) / segment) + LIVE_SEGMENTS
+                if self.path.startswith("/live.m3u8"):
+                    first = newest - LIVE_SEGMENTS
+                    body = (
+                        f"#EXTM3U\n#EXT-X-TARGETDURATION:{max(round(segment), 1)}\n#EXT-X-MEDIA-SEQUENCE:{first}\n"
+                        + "".join(f"#EXTINF:{segment},\nseg{i}.ts\n" for i in range(first, newest))
+                    ).encode("utf-8")
+                else:
+                    match = re.search(r"seg(\d+)\.ts", self.path)
+                    body = bytes([int(match.group(1)) % 256]) * segment_bytes if match else b""
+                self.send_response(200 if body else 404)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/live.m3u8"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def resume(url):
+    with requests.Session() as session:
+        started = time.perf_counter()
+        response = session.get(url, timeout=20)
+        response.raise_for_status()
+        segments = [line for line in response.text.splitlines() if line and not line.startswith("#")]
+        for segment in segments[-JOIN_SEGMENTS:]:
+            session.get(urljoin(response.url, segment), timeout=10).raise_for_status()
+        return time.perf_counter() - started
+
+
+def run(seconds=6.0, segment=0.25, segment_kb=200, latency=0.05):
+    window = seconds / 4
+    capacity = int(window / segment + 2) * segment_kb * 1024
+    results = {"window_seconds": window, "ring_bytes": capacity}
+    with tempfile.TemporaryDirectory() as directory:
+        origin = LiveOrigin(segment, segment_kb * 1024, latency)
+        relay = HLSRelay(port=0, public_url=None, cache=SegmentCache(os.path.join(directory, "segments")))
+        timeshift = Timeshift(relay, os.path.join(directory, "timeshift"), capacity, window)
+        try:
+            url, _ = timeshift.play_url(origin.url)
+            ring_path = timeshift.ring.path
+            results["first_playlist_seconds"] = resume(url)
+            results["file_bytes_before"] = os.path.getsize(ring_path)
+            time.sleep(seconds)
+            results["resume_seconds"] = resume(url)
+            results["reconnect_seconds"] = resume(origin.url)
+            results["file_bytes_after"] = os.path.getsize(ring_path)
+            results["segments_indexed"] = len(timeshift.ring.entries())
+            results["segments_recorded"] = timeshift.ring.entries()[-1][0] + 1
+        finally:
+            timeshift.close()
+            relay.stop()
+            origin.close()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--seconds", type=float, default=6.0, help="how long to record")
+    parser.add_argument("--segment", type=float, default=0.25, help="segment duration in seconds")
+    parser.add_argument("--segment-kb", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds the origin adds to every request")
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args()
+
+    results = run(args.seconds, args.segment, args.segment_kb, args.latency)
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"  first playlist  {results['first_playlist_seconds'] * 1000:8.1f} ms")
+    print(f"  resume (ring)   {results['resume_seconds'] * 1000:8.1f} ms")
+    print(f"  reconnect       {results['reconnect_seconds'] * 1000:8.1f} ms")
+    print(f"  ring file       {results['file_bytes_before']} -> {results['file_bytes_after']} bytes")
+    print(f"  segments        {results['segments_indexed']} indexed of {results['segments_recorded']} recorded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""Regression check for exported metrics snapshots.
+
+    python benchmarks/check_metrics.py metrics.json --baseline baseline.json [--tolerance 0.2]
+    python benchmarks/check_metrics.py metrics.json --budget play_start_seconds=2.5 --budget catalog_load_seconds=10
+
+Compares the chosen quantile of every timing histogram in a snapshot written by
+Metrics.write() (or the debug screen's Export JSON) against a baseline snapshot
+and/or absolute budgets in seconds. Exits with status 1 if anything regressed.
+"""
+import argparse
+import json
+import sys
+
+
+def load(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def series(snapshot, quantile):
+    """{(name, labels): value} for every histogram in snapshot"""
+    return {
+        (entry["name"], tuple(sorted(entry["labels"].items()))): entry[quantile]
+        for entry in snapshot["histograms"]
+        if entry["count"]
+    }
+
+
+def describe(key):
+    name, labels = key
+    return name + ("{" + ",".join(f"{k}={v}" for k, v in labels) + "}" if labels else "")
+
+
+def check(current, baseline=None, budgets=None, tolerance=0.2, quantile="p95"):
+    """Return a list of human-readable regressions"""
+    failures = []
+    values = series(current, quantile)
+    if baseline is not None:
+        for key, before in series(baseline, quantile).items():
+            after = values.get(key)
+            if after is not None and after > before * (1 + tolerance):
+                failures.append(f"{describe(key)} {quantile} {after:.4f}s > baseline {before:.4f}s (+{tolerance:.0%})")
+    for name, limit in (budgets or {}).items():
+        for key, value in values.items():
+            if key[0] == name and value > limit:
+                failures.append(f"{describe(key)} {quantile} {value:.4f}s > budget {limit:.4f}s")
+    return failures
+
+
+def parse_budget(text):
+    name, _, limit = text.partition("=")
+    return name, float(limit)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("snapshot")
+    parser.add_argument("--baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs. baseline (fraction)")
+    parser.add_argument("--quantile", default="p95", choices=("p50", "p95", "p99", "max"))
+    parser.add_argument("--budget", type=parse_budget, action="append", default=[], metavar="NAME=SECONDS")
+    args = parser.parse_args()
+
+    failures = check(
+        load(args.snapshot),
+        load(args.baseline) if args.baseline else None,
+        dict(args.budget),
+        args.tolerance,
+        args.quantile,
+    )
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(1)
+    print("no regressions")
+
+
+if __name__ == "__main__":
+    main()
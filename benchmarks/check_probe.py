@@ -0,0 +1,164 @@
+"""Check stream_health.probe() against a local stand-in stream server.
+
+    python benchmarks/check_probe.py [--timeout 0.5]
+
+Each case is a path on a local http.server that answers the way a live,
+offline, broken or stalled stream would:
+
+ok: an HLS manifest starting with #EXTM3U.
+dead: 404, and a port nothing listens on.
+invalid: 200 with an HTML page where the manifest should be.
+timeout: the server stalls before answering, or after the headers but before the body.
+
+Probe timeouts are scaled down to --timeout seconds. The script then runs
+PROBE_CONCURRENCY probes at once and checks that urllib3 never had to discard
+a connection because the probe pool was full. It exits with status 1 if
+anything fails, and nothing touches the network.
+"""
+import argparse
+import logging
+import os
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stream_health  # noqa: E402
+from stream_health import STATUS_DEAD, STATUS_INVALID, STATUS_OK  # noqa: E402
+
+MANIFEST = b"#EXTM3U\n#EXT-X-TARGETDURATION:6\n#EXTINF:6.0,\nsegment0.ts\n"
+PAGE = b"<!doctype html><title>Not here</title>"
+
+
+class StreamHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    stall = 1.0
+
+    def do_GET(self):
+        path = self.path.split("?")[0]
+        if path == "/stall-headers.m3u8":
+            time.sleep(self.stall)
+        if path == "/dead.m3u8":
+            self.answer(404, b"", "text/plain")
+        elif path == "/invalid.m3u8":
+            self.answer(200, PAGE, "text/html")
+        elif path == "/stall-body.m3u8":
+            self.send_response(200)
+            self.send_header("Content-Type", "application/vnd.apple.mpegurl")
+            self.send_header("Content-Length", str(len(MANIFEST)))
+            self.end_headers()
+            self.wfile.flush()
+            time.sleep(self.stall)
+            self.wfile.write(MANIFEST)
+        elif path == "/slow.m3u8":
+            time.sleep(self.stall / 16)
+            self.answer(200, MANIFEST, "application/vnd.apple.mpegurl")
+        else:
+            self.answer(200, MANIFEST, "application/vnd.apple.mpegurl")
+
+    def answer(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class StreamServer(ThreadingHTTPServer):
+    daemon_threads = True
+    # Room for every concurrent probe to connect at once.
+    request_queue_size = 64
+
+    def handle_error(self, request, client_address):
+        # Stalled cases write after the probe has already given up on them.
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+def unused_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class PoolFullCounter(logging.Handler):
+    def __init__(self):
+        super().__init__(logging.WARNING)
+        self.count = 0
+
+    def emit(self, record):
+        if "Connection pool is full" in record.getMessage():
+            self.count += 1
+
+
+def check(timeout):
+    """Return a list of human-readable failures"""
+    stream_health.PROBE_CONNECT_TIMEOUT = timeout
+    stream_health.PROBE_READ_TIMEOUT = timeout
+    StreamHandler.stall = timeout * 4
+    server = StreamServer(("127.0.0.1", 0), StreamHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f"http://127.0.0.1:{server.server_address[1]}"
+    cases = [
+        ("ok", f"{base}/live.m3u8", STATUS_OK),
+        ("dead (404)", f"{base}/dead.m3u8", STATUS_DEAD),
+        ("dead (refused)", f"http://127.0.0.1:{unused_port()}/live.m3u8", STATUS_DEAD),
+        ("invalid", f"{base}/invalid.m3u8", STATUS_INVALID),
+        ("timeout (headers)", f"{base}/stall-headers.m3u8", STATUS_DEAD),
+        ("timeout (body)", f"{base}/stall-body.m3u8", STATUS_DEAD),
+    ]
+    failures = []
+    try:
+        for label, url, expected in cases:
+            started = time.monotonic()
+            status, http_status, latency_ms = stream_health.probe(url)
+            elapsed = time.monotonic() - started
+            print(f"  {label:<18} {status:<8} http={http_status} latency={latency_ms} ms  ({elapsed:.2f}s)")
+            if status != expected:
+                failures.append(f"{label}: expected {expected}, got {status}")
+            if elapsed > timeout * 3:
+                failures.append(f"{label}: took {elapsed:.2f}s with a {timeout}s timeout")
+
+        counter = PoolFullCounter()
+        logger = logging.getLogger("urllib3.connectionpool")
+        logger.addHandler(counter)
+        try:
+            concurrency = stream_health.PROBE_CONCURRENCY
+            with ThreadPoolExecutor(concurrency) as pool:
+                results = list(pool.map(stream_health.probe, [f"{base}/slow.m3u8?{i}" for i in range(concurrency * 2)]))
+        finally:
+            logger.removeHandler(counter)
+        ok = sum(status == STATUS_OK for status, _, _ in results)
+        print(f"  {f'{concurrency} at once':<18} {ok}/{len(results)} ok, {counter.count} connections discarded")
+        if ok != len(results):
+            failures.append(f"concurrent probes: only {ok}/{len(results)} ok")
+        if counter.count:
+            failures.append(f"concurrent probes: {counter.count} connections discarded, the pool is smaller than PROBE_CONCURRENCY")
+    finally:
+        server.shutdown()
+        server.server_close()
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--timeout", type=float, default=0.5, help="probe connect/read timeout in seconds")
+    args = parser.parse_args()
+
+    failures = check(args.timeout)
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(1)
+    print("all probes behaved")
+
+
+if __name__ == "__main__":
+    main()
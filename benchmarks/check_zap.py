@@ -0,0 +1,142 @@
+"""Check that zapping swaps media on one running player.
+
+    python benchmarks/check_zap.py [--zaps 3]
+
+Builds a flet_video Video against a page that records the commands sent to
+the client instead of talking to one, then zaps it --zaps times with
+zap_prefetch.swap_media(), the way the channel screen does. After every zap
+the player must be on the new channel with a one-item playlist, and the
+client must have been told to add it, jump to index 1 and remove index 0.
+
+It then runs a 2x2 multi-view through a focus change, which swaps two
+tiles' variants, and through a decode limit of two and back, which must
+pause the two left-out tiles and resume them on the same players.
+It exits with status 1 if anything fails, and nothing touches the network.
+"""
+import argparse
+import os
+import sys
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import flet as ft  # noqa: E402
+from flet_video import Video, VideoMedia  # noqa: E402
+import hls_relay  # noqa: E402
+from multiview import BudgetScheduler, MultiView  # noqa: E402
+from zap_prefetch import swap_media  # noqa: E402
+
+# Bits per second of a two-rung variant ladder.
+LADDER = (800_000, 2_800_000)
+
+
+class CommandPage:
+    """Just enough of ft.Page for a control's invoke_method(); records every call"""
+
+    def __init__(self):
+        self.commands = []
+
+    def _invoke_method(self, control_id, method_name, arguments=None, wait_for_result=False, wait_timeout=5):
+        self.commands.append((method_name, arguments))
+
+    def run_task(self, handler, *args):
+        # Updates are never flushed; the check looks at the commands only.
+        pass
+
+
+def media(number):
+    return VideoMedia(f"https://streams.example.com/{number}/index.m3u8")
+
+
+def check(zaps):
+    """Return a list of human-readable failures"""
+    page = CommandPage()
+    player = Video(playlist=[media(0)], playlist_mode=ft.PlaylistMode.LOOP, autoplay=True)
+    player.page = page
+    failures = []
+    for number in range(1, zaps + 1):
+        page.commands.clear()
+        current = media(number)
+        try:
+            swap_media(player, current)
+        except Exception as e:
+            failures.append(f"zap {number}: {type(e).__name__}: {e}")
+            break
+        names = [name for name, _ in page.commands]
+        print(f"  zap {number}  {' '.join(names)}  playlist={[item.resource for item in player.playlist]}")
+        if player.playlist != [current]:
+            failures.append(f"zap {number}: playlist holds {len(player.playlist)} items, not just the new channel")
+        expected = [
+            ("playlist_add", None),
+            ("jump_to", {"media_index": "1"}),
+            ("playlist_remove", {"media_index": "0"}),
+        ]
+        sent = [(name, None if name == "playlist_add" else arguments) for name, arguments in page.commands]
+        if sent != expected:
+            failures.append(f"zap {number}: sent {sent}, expected {expected}")
+    return failures
+
+
+def check_multiview():
+    """Return a list of human-readable failures"""
+    hls_relay.RELAY_ENABLED = False
+    page = CommandPage()
+    view = MultiView(page, Video, VideoMedia, "2x2", BudgetScheduler(budget=10_000_000, max_decodes=4))
+    for index, tile in enumerate(view.tiles):
+        tile.channel = SimpleNamespace(name=f"Channel {index}", http_headers={})
+        tile.variants = [(rate, f"https://streams.example.com/{index}/{rate}.m3u8") for rate in LADDER]
+
+    def step(label, change):
+        page.commands.clear()
+        try:
+            change()
+        except Exception as e:
+            return [f"{label}: {type(e).__name__}: {e}"]
+        names = [name for name, _ in page.commands]
+        print(f"  {label:<22} {' '.join(names) or 'nothing sent'}")
+        return [
+            f"{label}: tile {index} playlist holds {len(tile.player.playlist)} items"
+            for index, tile in enumerate(view.tiles)
+            if tile.player is not None and len(tile.player.playlist) != 1
+        ]
+
+    failures = step("start", view.reschedule)
+    players = [tile.player for tile in view.tiles]
+    for player in players:
+        # As if the update carrying them had reached the client.
+        player.page = page
+    failures += step("focus tile 1", lambda: view.focus(1))
+    if [tile.playing[0] for tile in view.tiles[:2]] != [LADDER[0], LADDER[-1]]:
+        failures.append("focus tile 1: the focus did not move the top variant from tile 0 to tile 1")
+
+    def limit(max_decodes):
+        view.scheduler.max_decodes = max_decodes
+        view.reschedule()
+
+    failures += step("limit to 2 decodes", lambda: limit(2))
+    paused = [index for index, tile in enumerate(view.tiles) if tile.paused]
+    if paused != [2, 3] or [name for name, _ in page.commands].count("pause") != 2:
+        failures.append(f"limit to 2 decodes: paused tiles {paused}, expected [2, 3] with one pause each")
+    failures += step("limit to 4 decodes", lambda: limit(4))
+    if any(tile.paused for tile in view.tiles) or [name for name, _ in page.commands].count("play") != 2:
+        failures.append("limit to 4 decodes: the paused tiles did not resume")
+    if [tile.player for tile in view.tiles] != players:
+        failures.append("a tile rebuilt its player instead of reusing it")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--zaps", type=int, default=3)
+    args = parser.parse_args()
+
+    failures = check(args.zaps) + check_multiview()
+    for failure in failures:
+        print(failure)
+    if failures:
+        sys.exit(1)
+    print("every zap reused the player")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""Run every benchmark and write one machine-readable result file.
+
+    python benchmarks/run_suite.py [--quick] [--only parser,search] [--out results.json]
+    python benchmarks/run_suite.py --baseline results-main.json [--tolerance 0.2]
+
+Results are keyed "<benchmark>/<size>" and tagged with the git commit and
+Python version, so files from different commits can be compared. With
+--baseline, every *_seconds value that got slower than the baseline by more
+than --tolerance is reported, and the exit status is 1. --quick skips the
+100k-entry sizes.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import bench_countries  # noqa: E402
+import bench_fetch  # noqa: E402
+import bench_grid  # noqa: E402
+import bench_load  # noqa: E402
+import bench_multiview  # noqa: E402
+import bench_parser  # noqa: E402
+import bench_relay  # noqa: E402
+import bench_search  # noqa: E402
+import bench_store  # noqa: E402
+import bench_timeshift  # noqa: E402
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SIZES = (1_000, 10_000, 100_000)
+QUICK_SIZES = SIZES[:2]
+
+
+def cases(sizes):
+    """(benchmark, size, run) for every measurement in the suite"""
+    for size in sizes:
+        yield "parser", size, lambda size=size: bench_parser.run(size)
+    yield "countries", 250, lambda: bench_countries.run(250)
+    for size in sizes:
+        yield "search", size, lambda size=size: bench_search.run(size)
+    yield "grid", 200, lambda: bench_grid.run(200, [size for size in sizes if size <= 10_000])
+    for size in sizes:
+        yield "load", size, lambda size=size: bench_load.run(size)
+    yield "fetch", 40, lambda: bench_fetch.run(40)
+    yield "relay", 6, lambda: bench_relay.run(6)
+    yield "timeshift", 6, lambda: bench_timeshift.run(6)
+    yield "multiview", 9, lambda: bench_multiview.run()
+    yield "store", sizes[-1], lambda: bench_store.run(sizes[-1])
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, tolerance):
+    """Human-readable regressions of current against baseline"""
+    failures = []
+    for key, before in baseline["results"].items():
+        after = current["results"].get(key)
+        if after is None:
+            continue
+        for name, value in before.items():
+            if not name.endswith("_seconds") or name not in after:
+                continue
+            if after[name] > value * (1 + tolerance):
+                failures.append(f"{key} {name} {after[name]:.4f}s > baseline {value:.4f}s (+{tolerance:.0%})")
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--quick", action="store_true", help="skip the 100k-entry sizes")
+    parser.add_argument("--only", help="comma-separated benchmarks to run")
+    parser.add_argument("--out", help="write the results here as well as to stdout")
+    parser.add_argument("--baseline", help="results file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed slowdown vs. baseline (fraction)")
+    args = parser.parse_args()
+
+    only = set(args.only.split(",")) if args.only else None
+    report = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": {},
+    }
+    for name, size, run in cases(QUICK_SIZES if args.quick else SIZES):
+        if only and name not in only:
+            continue
+        started = time.perf_counter()
+        report["results"][f"{name}/{size}"] = run()
+        print(f"{name}/{size} done in {time.perf_counter() - started:.1f}s", file=sys.stderr)
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            failures = compare(report, json.load(f), args.tolerance)
+        for failure in failures:
+            print(failure, file=sys.stderr)
+        if failures:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
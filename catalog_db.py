@@ -0,0 +1,370 @@
+import json
+import os
+import sqlite3
+import threading
+from channel_search import RESULTS_PAGE_SIZE, normalize, words
+from channel_store import ChannelStore, extra_items
+from m3u_parser import ChannelRecord
+
+CONFIG_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "config.db")
+
+# Bump when the catalog tables change shape or meaning; older tables are dropped
+# and reimported. 3: group codes are resolved through country_codes aliases.
+CATALOG_SCHEMA = 3
+IMPORT_BATCH_SIZE = 1000
+SEARCH_RESULTS_GROUP = "Search"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS catalog_meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+CREATE TABLE IF NOT EXISTS catalog_channels (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    search_name TEXT NOT NULL,
+    logo TEXT NOT NULL,
+    url TEXT NOT NULL,
+    -- Which repeat of url this row is, in playlist order; (url, occurrence) identifies
+    -- a channel across refreshes.
+    occurrence INTEGER NOT NULL,
+    tvg_id TEXT NOT NULL,
+    extras TEXT,
+    UNIQUE (url, occurrence)
+);
+CREATE INDEX IF NOT EXISTS catalog_channels_tvg_id ON catalog_channels (tvg_id) WHERE tvg_id != '';
+CREATE TABLE IF NOT EXISTS catalog_groups (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    code TEXT
+);
+CREATE TABLE IF NOT EXISTS catalog_group_channels (
+    group_id INTEGER NOT NULL,
+    position INTEGER NOT NULL,
+    channel_id INTEGER NOT NULL,
+    PRIMARY KEY (group_id, position)
+) WITHOUT ROWID;
+"""
+
+# External-content FTS5 index over the normalized names; rebuilt after each import.
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS catalog_fts USING fts5(
+    search_name,
+    content='catalog_channels',
+    content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+_TABLES = ("catalog_fts", "catalog_group_channels", "catalog_groups", "catalog_channels", "catalog_meta")
+
+
+def connect(path):
+    conn = sqlite3.connect(path, check_same_thread=False)
+    # WAL lets the UI keep reading the previous catalog while an import commits.
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+class CatalogDB:
+    """The channel catalog persisted in config.db.
+
+    Countries, the channels of one country and global search results are read
+    with indexed queries, so a screen only loads the rows it shows. Rows come
+    back as Channel views over a small ChannelStore holding just those rows.
+    Search uses an FTS5 index when SQLite has it, and a LIKE scan otherwise.
+    """
+
+    def __init__(self, path=CONFIG_DB):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = connect(path)
+        self.has_fts = True
+        with self._conn:
+            version = self._meta("schema") if self._table_exists("catalog_meta") else None
+            if version is not None and int(version) != CATALOG_SCHEMA:
+                for table in _TABLES:
+                    self._conn.execute(f"DROP TABLE IF EXISTS {table}")
+            self._conn.executescript(_SCHEMA)
+            try:
+                self._conn.executescript(_FTS_SCHEMA)
+            except sqlite3.OperationalError:
+                self.has_fts = False
+            self._conn.execute(
+                "INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('schema', ?)", (str(CATALOG_SCHEMA),)
+            )
+
+    def _table_exists(self, name):
+        return self._conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+    def _meta(self, key):
+        row = self._conn.execute("SELECT value FROM catalog_meta WHERE key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def digest(self):
+        """sha1 of the playlist the stored catalog was imported from, or None"""
+        with self._lock:
+            return self._meta("digest")
+
+    def countries(self):
+        """{group name: country code} for every group in the catalog"""
+        with self._lock:
+            return self._countries()
+
+    def _countries(self):
+        return dict(self._conn.execute("SELECT name, code FROM catalog_groups"))
+
+    @staticmethod
+    def _to_store(rows, store, group):
+        for name, logo, url, tvg_id, extras in rows:
+            attrs = json.loads(extras) if extras else {}
+            attrs.update({"tvg-logo": logo, "tvg-id": tvg_id})
+            store.add(group, ChannelRecord.from_attributes(name, url, attrs))
+
+    def group(self, name: str):
+        """The channels of one group, in playlist order"""
+        with self._lock:
+            rows = self._conn.execute(
+                """
+                SELECT c.name, c.logo, c.url, c.tvg_id, c.extras
+                FROM catalog_groups g
+                JOIN catalog_group_channels gc ON gc.group_id = g.id
+                JOIN catalog_channels c ON c.id = gc.channel_id
+                WHERE g.name = ?
+                ORDER BY gc.position
+                """,
+                (name,),
+            ).fetchall()
+        store = ChannelStore()
+        self._to_store(rows, store, name)
+        return store.group(name)
+
+    def export(self):
+        """(digest, {group: code}, ChannelStore) of the whole catalog, read in one transaction"""
+        with self._lock:
+            self._conn.execute("BEGIN")
+            try:
+                digest = self._meta("digest")
+                name_to_code = self._countries()
+                rows = self._conn.execute(
+                    """
+                    SELECT g.name, c.name, c.logo, c.url, c.tvg_id, c.extras
+                    FROM catalog_groups g
+                    JOIN catalog_group_channels gc ON gc.group_id = g.id
+                    JOIN catalog_channels c ON c.id = gc.channel_id
+                    ORDER BY g.name, gc.position
+                    """
+                ).fetchall()
+            finally:
+                self._conn.execute("COMMIT")
+        store = ChannelStore()
+        for group, *row in rows:
+            self._to_store([row], store, group)
+        return digest, name_to_code, store
+
+    def search(self, query: str, page: int = 0, page_size: int = RESULTS_PAGE_SIZE):
+        """Return (total matches, Channel views for the requested page).
+
+        Every query word must match a whole word of the name, except the last,
+        which may also be a word prefix. Exact names rank first, then names
+        starting with the query, then the rest, shorter names first.
+        """
+        query = normalize(query.strip())
+        query_words = words(query)
+        if not query_words:
+            return 0, []
+        if self.has_fts:
+            *full_words, last_word = query_words
+            match = " ".join([f'"{word}"' for word in full_words] + [f'"{last_word}"*'])
+            source = "catalog_fts f JOIN catalog_channels c ON c.id = f.rowid WHERE catalog_fts MATCH ?"
+            params = (match,)
+        else:
+            source = "catalog_channels c WHERE " + " AND ".join("c.search_name LIKE ? ESCAPE '\\'" for _ in query_words)
+            params = tuple(f"%{escape_like(word)}%" for word in query_words)
+        with self._lock:
+            total = self._conn.execute(f"SELECT count(*) FROM {source}", params).fetchone()[0]
+            rows = self._conn.execute(
+                f"""
+                SELECT c.name, c.logo, c.url, c.tvg_id, c.extras FROM {source}
+                ORDER BY CASE
+                    WHEN c.search_name = ? THEN 0
+                    WHEN c.search_name LIKE ? ESCAPE '\\' THEN 1
+                    ELSE 2
+                END, length(c.search_name), c.id
+                LIMIT ? OFFSET ?
+                """,
+                params + (query, escape_like(query) + "%", page_size, page * page_size),
+            ).fetchall()
+        store = ChannelStore()
+        self._to_store(rows, store, SEARCH_RESULTS_GROUP)
+        return total, list(store.group(SEARCH_RESULTS_GROUP))
+
+    def importer(self, name_to_code: dict):
+        return CatalogImport(self, name_to_code)
+
+
+def escape_like(text: str):
+    return text.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+class CatalogDelta:
+    """What a CatalogImport commit changed"""
+
+    def __init__(self):
+        self.added = 0
+        self.removed = 0
+        self.changed = 0
+        self.added_groups = []
+        self.removed_groups = []
+        # Existing groups whose channel list or any of whose channels changed.
+        self.changed_groups = set()
+        # Country code of every added group, and of existing groups whose code changed.
+        self.codes = {}
+
+    def __bool__(self):
+        return bool(
+            self.added or self.removed or self.changed
+            or self.added_groups or self.removed_groups or self.changed_groups or self.codes
+        )
+
+    def summary(self):
+        return f"{self.added} added, {self.removed} removed, {self.changed} changed"
+
+
+class CatalogImport:
+    """Collects (group, channel) records while the playlists stream in and
+    applies them to the stored catalog in one transaction.
+
+    commit() diffs the records against what is stored, keyed by (url,
+    occurrence), and only inserts, updates or deletes the rows that differ,
+    keeping the FTS index in step row by row. Records are buffered until then,
+    so the write lock on config.db is held for the length of the batched writes
+    rather than the whole download, and readers see either the old catalog or
+    the new one, never a mix.
+    """
+
+    def __init__(self, catalog: CatalogDB, name_to_code: dict):
+        self._catalog = catalog
+        self._name_to_code = name_to_code
+        self._rows = {}
+        self._groups = {}
+        self._occurrences = {}
+        self._last_channel = None
+        self._last_key = None
+
+    def add(self, group: str, channel: ChannelRecord):
+        if channel is not self._last_channel:
+            self._last_channel = channel
+            url = channel.url
+            occurrence = self._occurrences.get(url, 0)
+            self._occurrences[url] = occurrence + 1
+            self._last_key = (url, occurrence)
+            extras = dict(extra_items(channel))
+            self._rows[self._last_key] = (
+                channel.name,
+                normalize(channel.name),
+                channel.get("tvg-logo", "").strip(),
+                channel.tvg_id,
+                json.dumps(extras, ensure_ascii=False) if extras else None,
+            )
+        self._groups.setdefault(group, []).append(self._last_key)
+
+    def commit(self, digest):
+        """Apply the collected catalog and return a CatalogDelta; meant to run off the UI thread"""
+        delta = CatalogDelta()
+        conn = connect(self._catalog.path)
+        try:
+            with conn:
+                self._apply_channels(conn, delta)
+                conn.execute("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES ('digest', ?)", (digest,))
+        finally:
+            conn.close()
+        return delta
+
+    def _apply_channels(self, conn, delta):
+        stored = {}
+        ids = {}
+        for channel_id, url, occurrence, *values in conn.execute(
+            "SELECT id, url, occurrence, name, search_name, logo, tvg_id, extras FROM catalog_channels"
+        ):
+            stored[url, occurrence] = tuple(values)
+            ids[url, occurrence] = channel_id
+        removed = [key for key in stored if key not in self._rows]
+        changed = [key for key, values in self._rows.items() if key in stored and stored[key] != values]
+        added = [key for key in self._rows if key not in stored]
+        next_id = max(ids.values(), default=0) + 1
+        for offset, key in enumerate(added):
+            ids[key] = next_id + offset
+
+        if self._catalog.has_fts:
+            # External-content FTS rows are deleted by handing back the old indexed value.
+            batched(conn, "INSERT INTO catalog_fts (catalog_fts, rowid, search_name) VALUES ('delete', ?, ?)",
+                    [(ids[key], stored[key][1]) for key in removed + changed])
+        batched(conn, "DELETE FROM catalog_channels WHERE id = ?", [(ids[key],) for key in removed])
+        batched(conn, "UPDATE catalog_channels SET name = ?, search_name = ?, logo = ?, tvg_id = ?, extras = ? "
+                      "WHERE id = ?", [(*self._rows[key], ids[key]) for key in changed])
+        batched(conn, "INSERT INTO catalog_channels (id, url, occurrence, name, search_name, logo, tvg_id, extras) "
+                      "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", [(ids[key], *key, *self._rows[key]) for key in added])
+        if self._catalog.has_fts:
+            batched(conn, "INSERT INTO catalog_fts (rowid, search_name) VALUES (?, ?)",
+                    [(ids[key], self._rows[key][1]) for key in changed + added])
+        delta.added = len(added)
+        delta.removed = len(removed)
+        delta.changed = len(changed)
+        self._apply_groups(conn, delta, ids, {ids[key] for key in changed})
+
+    def _apply_groups(self, conn, delta, ids, changed_ids):
+        stored_groups = {}
+        stored_codes = {}
+        for name, group_id, code in conn.execute("SELECT name, id, code FROM catalog_groups"):
+            stored_groups[name] = group_id
+            stored_codes[name] = code
+        members = {}
+        for group_id, channel_id in conn.execute(
+            "SELECT group_id, channel_id FROM catalog_group_channels ORDER BY group_id, position"
+        ):
+            members.setdefault(group_id, []).append(channel_id)
+        for name, group_id in stored_groups.items():
+            if name not in self._groups:
+                conn.execute("DELETE FROM catalog_group_channels WHERE group_id = ?", (group_id,))
+                conn.execute("DELETE FROM catalog_groups WHERE id = ?", (group_id,))
+                delta.removed_groups.append(name)
+        next_group_id = max(stored_groups.values(), default=0) + 1
+        for name, keys in self._groups.items():
+            channel_ids = [ids[key] for key in keys]
+            group_id = stored_groups.get(name)
+            code = self._name_to_code.get(name)
+            if group_id is not None and code != stored_codes[name]:
+                # Newer aliases or countries.json can resolve a group stored without one.
+                conn.execute("UPDATE catalog_groups SET code = ? WHERE id = ?", (code, group_id))
+                delta.codes[name] = code
+            if group_id is None:
+                group_id = next_group_id
+                next_group_id += 1
+                conn.execute("INSERT INTO catalog_groups (id, name, code) VALUES (?, ?, ?)", (group_id, name, code))
+                delta.added_groups.append(name)
+                delta.codes[name] = code
+            elif members.get(group_id) == channel_ids:
+                if not changed_ids.isdisjoint(channel_ids):
+                    delta.changed_groups.add(name)
+                continue
+            else:
+                conn.execute("DELETE FROM catalog_group_channels WHERE group_id = ?", (group_id,))
+                delta.changed_groups.add(name)
+            batched(conn, "INSERT INTO catalog_group_channels (group_id, position, channel_id) VALUES (?, ?, ?)",
+                    [(group_id, position, channel_id) for position, channel_id in enumerate(channel_ids)])
+
+
+def batched(conn, sql, rows):
+    for start in range(0, len(rows), IMPORT_BATCH_SIZE):
+        conn.executemany(sql, rows[start:start + IMPORT_BATCH_SIZE])
+
+
+_catalog_db = None
+
+
+def get_catalog_db():
+    global _catalog_db
+    if _catalog_db is None:
+        _catalog_db = CatalogDB()
+    return _catalog_db
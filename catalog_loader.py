@@ -0,0 +1,447 @@
+import asyncio
+import concurrent.futures
+import hashlib
+import json
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from country_codes import CountryCodes
+from http_fetch import Fetcher, mirrors
+from m3u_parser import M3UStreamParser
+from metrics import get_metrics
+from playlist_cache import PlaylistCache
+from playlist_sources import playlist_sources
+
+COUNTRIES_URL = 'https://iptv-org.github.io/api/countries.json'
+M3U_URL = 'https://iptv-org.github.io/iptv/index.country.m3u'
+
+CONNECT_TIMEOUT = 5
+READ_TIMEOUT = 20
+# Upper bound for a whole catalog load, so a server trickling bytes can't hang the app.
+TOTAL_TIMEOUT = 60
+# How long a load or revalidation waits for a secondary playlist; one that
+# isn't in by then is skipped (or left as cached) rather than holding up the rest.
+SECONDARY_TIMEOUT = 10
+CHUNK_SIZE = 64 * 1024
+# Chunks a worker thread may get ahead of its consumer before it waits; this
+# bounds what a slow consumer buffers to CHUNK_QUEUE_SIZE * CHUNK_SIZE.
+CHUNK_QUEUE_SIZE = 8
+# How often a worker waiting on a full queue checks whether it was cancelled.
+PUT_POLL_SECONDS = 0.1
+# Label for the catalog_fetch_seconds metric.
+_RESOURCES = {COUNTRIES_URL: "countries", M3U_URL: "playlist"}
+
+_session = None
+_fetcher = None
+_cache = None
+_background_tasks = set()
+# url -> the task downloading it, so overlapping revalidations share one request.
+_downloads = {}
+
+
+class CatalogLoadError(Exception):
+    pass
+
+
+def get_session():
+    """Shared keep-alive session so both catalog requests reuse the same connection pool"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8)
+        _session.mount("https://", adapter)
+        _session.mount("http://", adapter)
+    return _session
+
+
+def get_fetcher():
+    """Catalog requests go through this, so they retry, fail over to mirrors and hedge"""
+    global _fetcher
+    if _fetcher is None:
+        _fetcher = Fetcher(get_session())
+    return _fetcher
+
+
+def get_cache():
+    global _cache
+    if _cache is None:
+        _cache = PlaylistCache()
+    return _cache
+
+
+def stream(url, replay_cached=True):
+    """Conditional GET through the playlist cache, yielding the body in chunks.
+
+    A 200 response is written to the cache while it is being yielded. On a 304 the
+    cached body is replayed, unless replay_cached is False. The request may be
+    answered by one of url's mirrors; the body is cached under url either way.
+    """
+    cache = get_cache()
+    entry = cache.meta(url)
+    started = time.perf_counter()
+    _, response = get_fetcher().get(
+        [url, *catalog_mirrors(url)],
+        resource=_RESOURCES.get(url, "other"),
+        headers=cache.validators(entry),
+        timeout=(CONNECT_TIMEOUT, READ_TIMEOUT),
+        stream=True,
+    )
+    with response:
+        if response.status_code == 304 and entry:
+            cache.touch(url)
+            get_metrics().observe(
+                "catalog_fetch_seconds", time.perf_counter() - started, resource=_RESOURCES.get(url, "other"), cache="hit"
+            )
+            if replay_cached:
+                yield from read_cached(url)
+            return
+        response.raise_for_status()
+        writer = cache.writer(url, response.headers)
+        committed = False
+        try:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                writer.write(chunk)
+                yield chunk
+            writer.commit()
+            committed = True
+            get_metrics().observe(
+                "catalog_fetch_seconds", time.perf_counter() - started, resource=_RESOURCES.get(url, "other"), cache="miss"
+            )
+        finally:
+            if not committed:
+                writer.abort()
+
+
+async def iter_in_thread(make_iter, deadline):
+    """Drive a blocking chunk iterator in a worker thread and yield its chunks.
+
+    The worker waits whenever CHUNK_QUEUE_SIZE chunks are queued, so a slow
+    consumer slows the download down instead of buffering all of it. It
+    stops, closing the iterator, once the consumer stops or is cancelled.
+    Raises CatalogLoadError once the event loop clock passes deadline.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=CHUNK_QUEUE_SIZE)
+    stopped = threading.Event()
+    done = object()
+
+    def put(item):
+        """Queue item, blocking while the queue is full; False once the consumer has stopped"""
+        future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+        while not stopped.is_set():
+            try:
+                future.result(PUT_POLL_SECONDS)
+                return True
+            except concurrent.futures.TimeoutError:
+                continue
+        future.cancel()
+        return False
+
+    def worker():
+        chunks = None
+        try:
+            chunks = make_iter()
+            for chunk in chunks:
+                if stopped.is_set() or not put(chunk):
+                    return
+            put(done)
+        except Exception as e:
+            put(e)
+        finally:
+            # Ends the request (and aborts a partial cache write) when stopped early.
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+
+    loop.run_in_executor(None, worker)
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError as e:
+                raise CatalogLoadError(f"Timed out loading channels after {TOTAL_TIMEOUT}s") from e
+            if item is done:
+                return
+            if isinstance(item, Exception):
+                raise item
+            yield item
+    finally:
+        stopped.set()
+
+
+def read_cached(url):
+    """Yield url's cached body in chunks.
+
+    The entry can be evicted between checking it and reading it; that is a
+    CatalogLoadError like any other failed read, not a bare OSError.
+    """
+    try:
+        yield from get_cache().iter_body(url)
+    except OSError as e:
+        raise CatalogLoadError(f"Cached copy of {url} is no longer available: {e}") from e
+
+
+async def read_all(make_iter, deadline):
+    return b"".join([chunk async for chunk in iter_in_thread(make_iter, deadline)])
+
+
+def decode_countries(countries_body):
+    try:
+        countries_data = json.loads(countries_body)
+    except ValueError as e:
+        raise CatalogLoadError(f"Error fetching countries data: {e}") from e
+    return CountryCodes((country["name"], country["code"].lower()) for country in countries_data)
+
+
+async def fetch_countries(deadline):
+    try:
+        return decode_countries(await read_all(lambda: stream(COUNTRIES_URL), deadline))
+    except requests.RequestException as e:
+        raise CatalogLoadError(f"Error fetching countries data: {e}") from e
+
+
+async def stream_channels(make_iter, deadline):
+    # Same as aparse_m3u, but times the parser on its own so a slow load can be
+    # told apart from a slow network or a slow consumer.
+    parser = M3UStreamParser()
+    parse_seconds = 0.0
+    try:
+        async for chunk in iter_in_thread(make_iter, deadline):
+            started = time.perf_counter()
+            records = parser.feed(chunk)
+            parse_seconds += time.perf_counter() - started
+            for record in records:
+                yield record
+        started = time.perf_counter()
+        records = parser.close()
+        parse_seconds += time.perf_counter() - started
+        get_metrics().observe("catalog_parse_seconds", parse_seconds)
+        for record in records:
+            yield record
+    except requests.RequestException as e:
+        raise CatalogLoadError(f"Error fetching M3U file: {e}") from e
+
+
+async def download(url, deadline):
+    """Fetch url into the playlist cache without replaying or keeping the body.
+
+    Calls for a url that is already downloading wait for that download instead
+    of starting another one.
+    """
+    loop = asyncio.get_running_loop()
+    task = _downloads.get(url)
+    if task is None or task.get_loop() is not loop:
+        task = loop.create_task(_download(url, deadline))
+        _downloads[url] = task
+        task.add_done_callback(lambda done: _downloads.get(url) is done and _downloads.pop(url))
+    await asyncio.shield(task)
+
+
+async def _download(url, deadline):
+    try:
+        async for _ in iter_in_thread(lambda: stream(url, replay_cached=False), deadline):
+            pass
+    except requests.RequestException as e:
+        raise CatalogLoadError(f"Error fetching {url}: {e}") from e
+
+
+async def merged_channels(sources, deadline, cached=False):
+    """(group, channel) records of every playlist in sources, highest priority first.
+
+    The first playlist streams straight through the parser while the others
+    download into the cache concurrently; each of those is parsed from disk
+    when its turn comes, so the merge is still a single pass. A channel whose
+    tvg-id or URL already came from a higher-priority playlist is dropped
+    (duplicates within one playlist are kept, as before). A playlist that fails
+    is skipped; CatalogLoadError is raised only if none of them loaded. With
+    cached=True nothing is fetched and uncached playlists are skipped.
+    """
+    cache = get_cache()
+    metrics = get_metrics()
+    secondary_deadline = min(deadline, asyncio.get_running_loop().time() + SECONDARY_TIMEOUT)
+
+    async def try_download(url):
+        try:
+            await download(url, secondary_deadline)
+        except CatalogLoadError as e:
+            return e
+
+    downloads = {} if cached else {url: asyncio.ensure_future(try_download(url)) for url in sources[1:]}
+    seen_ids = set()
+    seen_urls = set()
+    errors = []
+    loaded = 0
+    try:
+        for position, url in enumerate(sources):
+            error = await downloads[url] if url in downloads else None
+            if error:
+                errors.append(error)
+                metrics.increment("catalog_source_errors_total")
+                continue
+            if cached or position:
+                if not cache.meta(url):
+                    continue
+                make_iter = lambda url=url: read_cached(url)
+            else:
+                make_iter = lambda url=url: stream(url)
+            ids = set()
+            urls = set()
+            last_channel = None
+            keep = False
+            try:
+                async for group, channel in stream_channels(make_iter, deadline):
+                    if channel is not last_channel:
+                        last_channel = channel
+                        tvg_id = channel.tvg_id
+                        keep = not (tvg_id and tvg_id in seen_ids) and channel.url not in seen_urls
+                        if keep:
+                            if tvg_id:
+                                ids.add(tvg_id)
+                            urls.add(channel.url)
+                        else:
+                            metrics.increment("catalog_duplicates_total")
+                    if keep:
+                        yield group, channel
+                loaded += 1
+            except CatalogLoadError as e:
+                errors.append(e)
+                metrics.increment("catalog_source_errors_total")
+            seen_ids |= ids
+            seen_urls |= urls
+    finally:
+        for task in downloads.values():
+            task.cancel()
+    if not loaded:
+        raise errors[0] if errors else CatalogLoadError("No playlist sources could be loaded")
+
+
+def catalog_sources():
+    return playlist_sources(M3U_URL)
+
+
+def require_sources(sources):
+    if not sources:
+        raise CatalogLoadError("No playlist sources are enabled")
+    return sources
+
+
+def catalog_mirrors(url):
+    return mirrors(url)
+
+
+async def revalidate_sources(sources, deadline):
+    """Conditionally re-download countries.json and every playlist concurrently.
+
+    Secondary playlists that fail or take longer than SECONDARY_TIMEOUT are left
+    as they are in the cache; a failure of countries.json or the primary
+    playlist raises CatalogLoadError.
+    """
+    require_sources(sources)
+    secondary_deadline = min(deadline, asyncio.get_running_loop().time() + SECONDARY_TIMEOUT)
+    results = await asyncio.gather(
+        download(COUNTRIES_URL, deadline),
+        download(sources[0], deadline),
+        *(download(url, secondary_deadline) for url in sources[1:]),
+        return_exceptions=True,
+    )
+    for result in results[:2]:
+        if isinstance(result, BaseException):
+            raise result
+
+
+async def revalidate_catalog(on_update):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + TOTAL_TIMEOUT
+    sources = catalog_sources()
+    old_digest = cached_catalog_digest(sources)
+    try:
+        await revalidate_sources(sources, deadline)
+    except CatalogLoadError:
+        # Keep showing the cached copy; the next visit retries.
+        return
+    if cached_catalog_digest(sources) != old_digest and on_update:
+        try:
+            name_to_code = decode_countries(b"".join(read_cached(COUNTRIES_URL)))
+        except CatalogLoadError:
+            # Evicted since it was revalidated; the next visit retries.
+            return
+        deadline = loop.time() + TOTAL_TIMEOUT
+        on_update(name_to_code, merged_channels(sources, deadline, cached=True))
+
+
+def cached_catalog_digest(sources=None):
+    """Combined sha1 of countries.json and every cached playlist.
+
+    None if countries.json or the primary playlist isn't cached. A secondary
+    playlist that changes, appears or goes away changes it as well.
+    """
+    cache = get_cache()
+    sources = catalog_sources() if sources is None else sources
+    urls = [COUNTRIES_URL, *sources]
+    digests = [(cache.meta(url) or {}).get("sha1") for url in urls]
+    if not sources or not digests[0] or not digests[1]:
+        return None
+    combined = "\n".join(f"{url} {digest or ''}" for url, digest in zip(urls, digests))
+    return hashlib.sha1(combined.encode("utf-8")).hexdigest()
+
+
+def revalidate_if_stale(on_update):
+    """Revalidate the cached catalog in the background if any resource is missing or past the TTL.
+
+    Secondary playlists that have never been cached don't count as missing, so a
+    source that never answers can't force a revalidation on every load.
+    """
+    cache = get_cache()
+    sources = catalog_sources()
+    if not sources:
+        return
+    entries = [cache.meta(url) for url in (COUNTRIES_URL, sources[0])]
+    secondaries = [entry for entry in map(cache.meta, sources[1:]) if entry]
+    if all(entries) and all(cache.is_fresh(entry) for entry in entries + secondaries):
+        return
+    task = asyncio.create_task(revalidate_catalog(on_update))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+async def load_catalog(on_progress=None, on_update=None):
+    """Load countries.json and every configured playlist, preferring the on-disk cache.
+
+    Returns (name_to_code, channels) where channels is an async iterator of
+    merged (group, channel) records parsed while the playlists stream in. When
+    countries.json and the primary playlist are cached they are read from disk
+    right away; anything missing or older than the cache TTL is revalidated in
+    the background and on_update(name_to_code, channels) is called only if
+    upstream actually changed.
+    """
+    cache = get_cache()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + TOTAL_TIMEOUT
+    sources = require_sources(catalog_sources())
+    if cache.meta(COUNTRIES_URL) and cache.meta(sources[0]):
+        name_to_code = decode_countries(await read_all(lambda: read_cached(COUNTRIES_URL), deadline))
+        revalidate_if_stale(on_update)
+        return name_to_code, merged_channels(sources, deadline, cached=True)
+
+    # Start the playlist downloads now and consume them once the (much smaller)
+    # countries list is in, so the requests still overlap.
+    channels = merged_channels(sources, deadline)
+    first_record = asyncio.ensure_future(anext(channels, None))
+    try:
+        name_to_code = await fetch_countries(deadline)
+    except CatalogLoadError:
+        first_record.cancel()
+        raise
+    if on_progress:
+        on_progress("Loaded countries")
+
+    async def all_channels():
+        record = await first_record
+        if record is None:
+            return
+        yield record
+        async for record in channels:
+            yield record
+
+    return name_to_code, all_channels()
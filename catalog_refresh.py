@@ -0,0 +1,115 @@
+import asyncio
+from catalog_db import CatalogDelta, get_catalog_db
+from catalog_loader import (
+    COUNTRIES_URL, TOTAL_TIMEOUT, cached_catalog_digest, catalog_sources, decode_countries, merged_channels,
+    read_cached, revalidate_sources,
+)
+from catalog_snapshot import compile_in_background
+from metrics import get_metrics
+from ui_updates import on_disconnect
+
+# Periodic refreshes only cost conditional GETs unless a playlist changed.
+REFRESH_INTERVAL = 60 * 60
+
+
+class CatalogRefresher:
+    """Keeps the stored catalog current without rebuilding the screens showing it.
+
+    refresh() revalidates countries.json and every playlist source and, if the
+    digest over all of them no longer matches the stored catalog's, re-parses
+    the merged catalog from the cache and applies it to the catalog database
+    as a delta. Subscribers get the CatalogDelta so open grids can patch in
+    only what changed, and the catalog snapshot is recompiled in the
+    background. start(page) runs refresh() every interval seconds for as long
+    as any session that started it is connected; it doesn't keep the page.
+
+    lock serializes everything that writes the catalog, so an initial import
+    and a refresh that lands meanwhile are applied in order.
+    """
+
+    def __init__(self, interval=REFRESH_INTERVAL):
+        self.interval = interval
+        self.lock = asyncio.Lock()
+        self._subscribers = []
+        self._sessions = set()
+        self._task = None
+
+    def subscribe(self, callback, page=None):
+        """Call callback(delta) after every non-empty delta; returns a function that unsubscribes.
+
+        With page, the callback is also dropped when page's session disconnects.
+        """
+        self._subscribers.append(callback)
+
+        def unsubscribe():
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+            forget()
+
+        forget = on_disconnect(page, unsubscribe) if page is not None else lambda: None
+        return unsubscribe
+
+    def start(self, page):
+        """Refresh periodically while page's session, or any other that called this, is connected"""
+        session_id = page.session_id
+        if session_id in self._sessions:
+            return
+        self._sessions.add(session_id)
+        on_disconnect(page, lambda: self._stop(session_id))
+        if self._task is None:
+            # Straight on the loop rather than page.run_task(), which would tie the task to page.
+            self._task = asyncio.run_coroutine_threadsafe(self._run_periodically(), page.loop)
+
+    def _stop(self, session_id):
+        self._sessions.discard(session_id)
+        if not self._sessions and self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _run_periodically(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                await self.refresh()
+            except Exception:
+                # A failed periodic refresh just waits for the next one.
+                get_metrics().increment("catalog_refresh_errors_total")
+
+    async def refresh(self):
+        """Revalidate all sources and apply whatever changed; returns the CatalogDelta"""
+        loop = asyncio.get_running_loop()
+        sources = catalog_sources()
+        with get_metrics().timer("catalog_refresh_seconds"):
+            await revalidate_sources(sources, loop.time() + TOTAL_TIMEOUT)
+            digest = cached_catalog_digest(sources)
+            if digest == await asyncio.to_thread(get_catalog_db().digest):
+                return CatalogDelta()
+            name_to_code = decode_countries(b"".join(read_cached(COUNTRIES_URL)))
+            channels = merged_channels(sources, loop.time() + TOTAL_TIMEOUT, cached=True)
+            return await self.apply(name_to_code, channels, digest)
+
+    async def apply(self, name_to_code, channels, digest=None):
+        """Apply a stream of (group, channel) records to the stored catalog as a delta.
+
+        digest is stored with it; by default that of everything cached now.
+        """
+        async with self.lock:
+            importer = get_catalog_db().importer(name_to_code)
+            async for group, channel in channels:
+                importer.add(group, channel)
+            delta = await asyncio.to_thread(importer.commit, digest or cached_catalog_digest())
+        if delta:
+            for callback in list(self._subscribers):
+                callback(delta)
+            compile_in_background()
+        return delta
+
+
+_refresher = None
+
+
+def get_refresher():
+    global _refresher
+    if _refresher is None:
+        _refresher = CatalogRefresher()
+    return _refresher
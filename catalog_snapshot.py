@@ -0,0 +1,267 @@
+import argparse
+import logging
+import mmap
+import os
+import struct
+import sys
+import tempfile
+import threading
+from array import array
+from channel_store import ChannelGroup, ChannelStore
+from metrics import get_metrics
+from playlist_cache import default_cache_dir
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_NAME = "catalog.snap"
+
+MAGIC = b"CSNP"
+# Bump when the layout or what it holds changes; older files are ignored and
+# recompiled. 2: group codes are resolved through country_codes aliases.
+VERSION = 2
+# magic, version, digest, string count, channel count, group count, member count, string bytes
+HEADER = struct.Struct("<4sI40sIIIII")
+# Per channel: string ids of name, logo, url, tvg-id and the NUL-joined extras.
+CHANNEL_FIELDS = 5
+# Per group: string ids of name and country code, first member, member count.
+GROUP_FIELDS = 4
+NAME, LOGO, URL, TVG_ID, EXTRAS = range(CHANNEL_FIELDS)
+
+
+def snapshot_path():
+    return os.path.join(default_cache_dir("catalog"), SNAPSHOT_NAME)
+
+
+def write_snapshot(path, store: ChannelStore, name_to_code: dict, digest: str):
+    """Compile a ChannelStore into a snapshot file, replacing path atomically.
+
+    Layout after the header, all integers little-endian uint32: string end
+    offsets, channel records, group records, group members (row numbers), then
+    the UTF-8 string bytes. Every distinct string is stored once.
+    """
+    strings = {"": 0}
+
+    def string_id(text):
+        return strings.setdefault(text, len(strings))
+
+    channels = array("I")
+    for row in range(len(store)):
+        name, logo, url, tvg_id, extras = store.record(row)
+        channels.extend((string_id(name), string_id(logo), string_id(url), string_id(tvg_id), string_id("\0".join(extras))))
+    groups = array("I")
+    members = array("I")
+    for name in store.groups():
+        rows = [channel.row for channel in store.group(name)]
+        groups.extend((string_id(name), string_id(name_to_code.get(name) or ""), len(members), len(rows)))
+        members.extend(rows)
+    ends = array("I")
+    encoded = bytearray()
+    for text in strings:
+        encoded += text.encode("utf-8")
+        ends.append(len(encoded))
+    if sys.byteorder == "big":
+        for table in (ends, channels, groups, members):
+            table.byteswap()
+
+    header = HEADER.pack(
+        MAGIC, VERSION, (digest or "").encode("ascii"), len(strings), len(channels) // CHANNEL_FIELDS,
+        len(groups) // GROUP_FIELDS, len(members), len(encoded),
+    )
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(header)
+            for table in (ends, channels, groups, members):
+                table.tofile(f)
+            f.write(encoded)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return path
+
+
+class SnapshotError(Exception):
+    pass
+
+
+class _Column:
+    """One string field of the channel records, decoded when a row is read"""
+
+    __slots__ = ("_snapshot", "_field")
+
+    def __init__(self, snapshot, field):
+        self._snapshot = snapshot
+        self._field = field
+
+    def __getitem__(self, row):
+        snapshot = self._snapshot
+        return snapshot.string(snapshot._channels[row * CHANNEL_FIELDS + self._field])
+
+
+class _Extras:
+    """The extras field as the flat (key, value, ...) tuples ChannelStore keeps"""
+
+    __slots__ = ("_column",)
+
+    def __init__(self, snapshot):
+        self._column = _Column(snapshot, EXTRAS)
+
+    def get(self, row, default=None):
+        extras = self._column[row]
+        return tuple(extras.split("\0")) if extras else default
+
+
+class CatalogSnapshot:
+    """A compiled catalog, memory-mapped read-only.
+
+    Opening one only reads the header; the tables are memoryviews straight over
+    the mapping and strings are decoded when a channel field is read. group()
+    returns the same ChannelGroup and Channel views as ChannelStore, which the
+    snapshot stands in for.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            try:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                raise SnapshotError(f"{path}: {e}") from None
+        if len(self._map) < HEADER.size:
+            raise SnapshotError(f"{path}: truncated")
+        magic, version, digest, n_strings, n_channels, n_groups, n_members, n_bytes = HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError(f"{path}: not a version {VERSION} snapshot")
+        if sys.byteorder == "big":
+            raise SnapshotError("snapshots are little-endian")
+        sizes = (n_strings * 4, n_channels * CHANNEL_FIELDS * 4, n_groups * GROUP_FIELDS * 4, n_members * 4)
+        if len(self._map) != HEADER.size + sum(sizes) + n_bytes:
+            raise SnapshotError(f"{path}: truncated")
+        self.digest = digest.rstrip(b"\0").decode("ascii") or None
+        view = memoryview(self._map)
+        tables = []
+        offset = HEADER.size
+        for size in sizes:
+            tables.append(view[offset:offset + size].cast("I"))
+            offset += size
+        self._ends, self._channels, self._groups, self._members = tables
+        self._bytes = view[offset:]
+        self._index = None
+        # What Channel and ChannelGroup read from their store.
+        self._names = _Column(self, NAME)
+        self._logos = _Column(self, LOGO)
+        self._urls = _Column(self, URL)
+        self._tvg_ids = _Column(self, TVG_ID)
+        self._extras = _Extras(self)
+
+    def string(self, string_id):
+        start = self._ends[string_id - 1] if string_id else 0
+        return str(self._bytes[start:self._ends[string_id]], "utf-8")
+
+    def _group_index(self):
+        if self._index is None:
+            groups = self._groups
+            self._index = {
+                self.string(groups[i]): i for i in range(0, len(groups), GROUP_FIELDS)
+            }
+        return self._index
+
+    def __len__(self):
+        return len(self._channels) // CHANNEL_FIELDS
+
+    def __contains__(self, group):
+        return group in self._group_index()
+
+    def countries(self):
+        """{group name: country code} for every group, like CatalogDB.countries()"""
+        return {name: self.string(self._groups[i + 1]) or None for name, i in self._group_index().items()}
+
+    def group(self, name: str):
+        i = self._group_index().get(name)
+        if i is None:
+            return ChannelGroup(self, name, array("I"))
+        start, count = self._groups[i + 2], self._groups[i + 3]
+        return ChannelGroup(self, name, self._members[start:start + count])
+
+
+_snapshots = {}
+_compile_lock = threading.Lock()
+
+
+def load_snapshot(path):
+    """The snapshot at path, or None if it is missing or unreadable.
+
+    Mappings are shared until the file is replaced; views handed out earlier
+    keep the old mapping alive.
+    """
+    try:
+        stat = os.stat(path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        snapshot = _snapshots.get(path)
+        if snapshot is None or snapshot[0] != key:
+            snapshot = _snapshots[path] = (key, CatalogSnapshot(path))
+        return snapshot[1]
+    except (OSError, SnapshotError):
+        return None
+
+
+def open_snapshot(digest):
+    """The compiled catalog for digest, or None if it hasn't been compiled yet"""
+    snapshot = load_snapshot(snapshot_path())
+    return snapshot if snapshot is not None and digest and snapshot.digest == digest else None
+
+
+def compile_snapshot(catalog=None, path=None):
+    """Recompile the snapshot from the catalog database unless it is already current.
+
+    Returns the path written, or None if there was nothing to do.
+    """
+    from catalog_db import get_catalog_db
+
+    catalog = catalog or get_catalog_db()
+    path = path or snapshot_path()
+    with _compile_lock:
+        current = load_snapshot(path)
+        digest = catalog.digest()
+        if not digest or (current is not None and current.digest == digest):
+            return None
+        digest, name_to_code, store = catalog.export()
+        return write_snapshot(path, store, name_to_code, digest)
+
+
+def compile_in_background():
+    """Recompile after an import so the next launch opens LIVE from the snapshot"""
+
+    def run():
+        metrics = get_metrics()
+        try:
+            compile_snapshot()
+        except Exception:
+            # The next launch just reads the database, but a snapshot that
+            # never compiles should show up in the logs and the metrics.
+            metrics.increment("catalog_snapshot_errors_total")
+            logger.exception("Compiling the catalog snapshot failed")
+
+    threading.Thread(target=run, daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the channel catalog into a binary snapshot")
+    parser.add_argument("--out", help=f"default: {snapshot_path()}")
+    parser.add_argument("--db", help="catalog database to compile (default: config.db)")
+    args = parser.parse_args()
+    from catalog_db import CatalogDB
+
+    path = compile_snapshot(CatalogDB(args.db) if args.db else None, args.out)
+    if path:
+        snapshot = CatalogSnapshot(path)
+        print(f"{path}: {len(snapshot)} channels, {len(snapshot.countries())} groups, {os.path.getsize(path)} bytes")
+    else:
+        print("snapshot is already current")
+
+
+if __name__ == "__main__":
+    main()
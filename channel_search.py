@@ -0,0 +1,97 @@
+import asyncio
+import re
+import unicodedata
+from array import array
+
+SEARCH_DEBOUNCE = 0.15
+NGRAM = 3
+RESULTS_PAGE_SIZE = 48
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def normalize(text: str):
+    """Case- and accent-insensitive form of text used for matching"""
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(ch for ch in decomposed if not unicodedata.combining(ch)).casefold()
+
+
+def ngrams(text: str):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class SearchIndex:
+    """Substring search over a fixed list of names.
+
+    Names are normalized once up front. Once build() has run (it is meant to be
+    called off the UI thread), queries of NGRAM or more characters are answered
+    from a trigram index; until then they fall back to a scan of the normalized
+    names. A query that extends the previous one only re-checks the previous
+    matches.
+    """
+
+    def __init__(self, names):
+        self._names = [normalize(name) for name in names]
+        self._postings = None
+        self._last_query = ""
+        self._last_result = range(len(self._names))
+
+    def build(self):
+        postings = {}
+        for position, name in enumerate(self._names):
+            for gram in ngrams(name):
+                postings.setdefault(gram, array('I')).append(position)
+        self._postings = postings
+
+    def search(self, query: str):
+        """Positions of the names containing query, in their original order"""
+        query = normalize(query.strip())
+        if not query:
+            result = range(len(self._names))
+        elif self._last_query and self._last_query in query:
+            names = self._names
+            result = [position for position in self._last_result if query in names[position]]
+        elif len(query) >= NGRAM and self._postings is not None:
+            result = self._search_ngrams(query)
+        else:
+            result = [position for position, name in enumerate(self._names) if query in name]
+        self._last_query = query
+        self._last_result = result
+        return result
+
+    def _search_ngrams(self, query):
+        lists = sorted((self._postings.get(gram, ()) for gram in ngrams(query)), key=len)
+        candidates = set(lists[0])
+        for positions in lists[1:]:
+            candidates.intersection_update(positions)
+            if not candidates:
+                return []
+        names = self._names
+        return [position for position in sorted(candidates) if query in names[position]]
+
+
+def words(text: str):
+    return _WORD_RE.findall(text)
+
+
+class Debouncer:
+    """Run callback once input has been quiet for delay seconds.
+
+    Every call cancels the pending one, so a burst of keystrokes produces a
+    single callback with the last arguments.
+    """
+
+    def __init__(self, page, callback, delay=SEARCH_DEBOUNCE):
+        self._page = page
+        self._callback = callback
+        self._delay = delay
+        self._pending = None
+
+    def __call__(self, *args):
+        if self._pending:
+            self._pending.cancel()
+        self._pending = self._page.run_task(self._run, *args)
+
+    async def _run(self, *args):
+        await asyncio.sleep(self._delay)
+        self._callback(*args)
@@ -0,0 +1,188 @@
+import sys
+from array import array
+from itertools import chain
+from m3u_parser import DEFAULT_LOGO, ChannelRecord, http_headers
+
+# Attributes kept in their own columns; anything else goes to the sparse extras map.
+_COLUMN_KEYS = ("group-title", "tvg-id", "tvg-logo")
+
+
+def extra_items(channel: ChannelRecord):
+    """(key, value) attributes of the parser record that have no column of their own"""
+    return (
+        (key, value)
+        for key, value in channel.attributes().items()
+        if key not in _COLUMN_KEYS and not (key == "tvg-name" and value == channel.name)
+    )
+
+
+class Channel:
+    """Read-only view of one row in a ChannelStore"""
+
+    __slots__ = ("_store", "row")
+
+    def __init__(self, store, row):
+        self._store = store
+        self.row = row
+
+    @property
+    def name(self):
+        return self._store._names[self.row]
+
+    @property
+    def logo(self):
+        return self._store._logos[self.row] or DEFAULT_LOGO
+
+    @property
+    def url(self):
+        return self._store._urls[self.row]
+
+    @property
+    def tvg_id(self):
+        return self._store._tvg_ids[self.row]
+
+    @property
+    def attrs(self):
+        """All #EXTINF attributes of the channel, rebuilt on demand"""
+        store = self._store
+        extras = store._extras.get(self.row, ())
+        attrs = dict(zip(extras[0::2], extras[1::2]))
+        if store._tvg_ids[self.row]:
+            attrs["tvg-id"] = store._tvg_ids[self.row]
+        if store._logos[self.row]:
+            attrs["tvg-logo"] = store._logos[self.row]
+        return attrs
+
+    @property
+    def http_headers(self):
+        extras = self._store._extras.get(self.row, ())
+        return http_headers(dict(zip(extras[0::2], extras[1::2])))
+
+    def __eq__(self, other):
+        return isinstance(other, Channel) and other._store is self._store and other.row == self.row
+
+    def __hash__(self):
+        return hash((id(self._store), self.row))
+
+    def __repr__(self):
+        return f"Channel({self.name!r})"
+
+
+class ChannelGroup:
+    """Sequence of the channels in one group, backed by an array of row numbers"""
+
+    __slots__ = ("_store", "name", "_rows")
+
+    def __init__(self, store, name, rows):
+        self._store = store
+        self.name = name
+        self._rows = rows
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [Channel(self._store, row) for row in self._rows[index]]
+        return Channel(self._store, self._rows[index])
+
+    def __iter__(self):
+        store = self._store
+        return (Channel(store, row) for row in self._rows)
+
+    def names(self):
+        """Channel names in group order, without building Channel views"""
+        names = self._store._names
+        return [names[row] for row in self._rows]
+
+
+class ChannelList(list):
+    """Plain list of Channel views that offers the same names() as ChannelGroup"""
+
+    def names(self):
+        return [channel.name for channel in self]
+
+
+class ChannelStore:
+    """Columnar channel catalog.
+
+    One list per field instead of one dict per channel, interned group names, and
+    an array of row numbers per group. A channel that belongs to several groups is
+    stored once and referenced from each group.
+    """
+
+    def __init__(self):
+        self._names = []
+        self._logos = []
+        self._urls = []
+        self._tvg_ids = []
+        self._extras = {}
+        self._group_rows = {}
+        self._id_index = {}
+        self._last_channel = None
+
+    def add(self, group: str, channel: ChannelRecord):
+        """Add a (group, channel) record from the M3U parser.
+
+        Returns True if this is the first channel of a new group.
+        """
+        if channel is not self._last_channel:
+            self._last_channel = channel
+            row = len(self._names)
+            attrs = channel.attributes()
+            name = channel.name
+            tvg_id = channel.tvg_id
+            self._names.append(name)
+            self._logos.append(attrs.get("tvg-logo", "").strip())
+            self._urls.append(channel.url)
+            self._tvg_ids.append(tvg_id)
+            # Remaining attributes are rare and repetitive (tvg-country, user-agent, ...),
+            # so they are kept as a flat tuple of interned strings rather than a dict.
+            # Same filter as extra_items(), but popped from a copy so the per-channel
+            # work stays in C.
+            extras = attrs.copy()
+            for key in _COLUMN_KEYS:
+                extras.pop(key, None)
+            if extras.get("tvg-name") == name:
+                del extras["tvg-name"]
+            if extras:
+                self._extras[row] = tuple(map(sys.intern, chain.from_iterable(extras.items())))
+            if tvg_id:
+                self._id_index.setdefault(tvg_id, row)
+        else:
+            row = len(self._names) - 1
+        rows = self._group_rows.get(group)
+        if rows is None:
+            self._group_rows[sys.intern(group)] = array('I', (row,))
+            return True
+        rows.append(row)
+        return False
+
+    def __len__(self):
+        return len(self._names)
+
+    def __contains__(self, group):
+        return group in self._group_rows
+
+    def groups(self):
+        return sorted(self._group_rows)
+
+    def group(self, name: str):
+        return ChannelGroup(self, name, self._group_rows.get(name, array('I')))
+
+    def names(self):
+        """The name column, indexed by row; treat as read-only"""
+        return self._names
+
+    def channel(self, row: int):
+        return Channel(self, row)
+
+    def record(self, row: int):
+        """Raw (name, logo, url, tvg_id, extras) of one row; logo is "" rather than the default"""
+        return (
+            self._names[row], self._logos[row], self._urls[row], self._tvg_ids[row], self._extras.get(row, ()),
+        )
+
+    def by_id(self, tvg_id: str):
+        row = self._id_index.get(tvg_id)
+        return None if row is None else Channel(self, row)
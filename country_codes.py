@@ -0,0 +1,130 @@
+import re
+from channel_search import normalize
+
+# Group titles seen in playlists that don't match their countries.json name,
+# keyed by country_key(). Codes are lower-case ISO 3166-1 alpha-2 like
+# decode_countries() produces.
+ALIASES = {
+    "usa": "us",
+    "united states of america": "us",
+    "america": "us",
+    "uk": "gb",
+    "great britain": "gb",
+    "britain": "gb",
+    "england": "gb",
+    "scotland": "gb",
+    "wales": "gb",
+    "northern ireland": "gb",
+    "uae": "ae",
+    "emirates": "ae",
+    "south korea": "kr",
+    "korea": "kr",
+    "korea republic of": "kr",
+    "republic of korea": "kr",
+    "north korea": "kp",
+    "russia": "ru",
+    "russian federation": "ru",
+    "iran": "ir",
+    "iran islamic republic of": "ir",
+    "syria": "sy",
+    "syrian arab republic": "sy",
+    "vietnam": "vn",
+    "viet nam": "vn",
+    "laos": "la",
+    "lao peoples democratic republic": "la",
+    "czech republic": "cz",
+    "czechia": "cz",
+    "slovak republic": "sk",
+    "holland": "nl",
+    "turkey": "tr",
+    "turkiye": "tr",
+    "ivory coast": "ci",
+    "cote divoire": "ci",
+    "cape verde": "cv",
+    "cabo verde": "cv",
+    "swaziland": "sz",
+    "eswatini": "sz",
+    "burma": "mm",
+    "myanmar": "mm",
+    "dr congo": "cd",
+    "drc": "cd",
+    "congo kinshasa": "cd",
+    "democratic republic of the congo": "cd",
+    "congo brazzaville": "cg",
+    "republic of the congo": "cg",
+    "bosnia": "ba",
+    "bosnia herzegovina": "ba",
+    "macedonia": "mk",
+    "north macedonia": "mk",
+    "moldova": "md",
+    "moldova republic of": "md",
+    "tanzania": "tz",
+    "bolivia": "bo",
+    "venezuela": "ve",
+    "brunei": "bn",
+    "taiwan": "tw",
+    "hong kong": "hk",
+    "macau": "mo",
+    "macao": "mo",
+    "palestine": "ps",
+    "vatican": "va",
+    "vatican city": "va",
+    "holy see": "va",
+    "kosovo": "xk",
+    "east timor": "tl",
+    "timor leste": "tl",
+    "micronesia": "fm",
+    "saint kitts and nevis": "kn",
+    "saint lucia": "lc",
+    "saint vincent and the grenadines": "vc",
+    "trinidad": "tt",
+    "curacao": "cw",
+}
+
+_NON_WORD_RE = re.compile(r"[^\w]+")
+
+
+def country_key(name: str):
+    """Spelling-insensitive form of a country name: no accents, case, punctuation or leading "the\""""
+    key = _NON_WORD_RE.sub(" ", normalize(name).replace("&", " and ").replace("'", "")).strip()
+    return key[4:] if key.startswith("the ") else key
+
+
+class CountryCodes(dict):
+    """countries.json's {name: code}, with lookups that forgive spelling.
+
+    get() falls back from the exact name to its country_key() and then to
+    ALIASES (or the name itself when it is a known code), so groups titled
+    "USA", "Côte d'Ivoire" or "Korea, Republic of" still resolve. Results are
+    memoized per name; a group that resolves to nothing gets None instead of a
+    guess.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._by_key = None
+        self._codes = set()
+        self._resolved = {}
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._by_key = None
+        self._resolved.clear()
+
+    def get(self, name, default=None):
+        code = super().get(name)
+        if code is not None:
+            return code
+        if name not in self._resolved:
+            self._resolved[name] = self._resolve(name)
+        return self._resolved[name] or default
+
+    def _resolve(self, name):
+        if self._by_key is None:
+            self._by_key = {country_key(country): code for country, code in self.items() if code}
+            self._codes = set(self._by_key.values())
+        key = country_key(name)
+        code = self._by_key.get(key) or ALIASES.get(key)
+        if code is None and key in self._codes:
+            code = key
+        return code
@@ -0,0 +1,87 @@
+import os
+import flet as ft
+from metrics import get_metrics
+from playlist_cache import default_cache_dir
+
+# Channels listed on the debug screen, most errors first.
+DEBUG_CHANNEL_ROWS = 20
+
+
+def format_ms(seconds):
+    return f"{seconds * 1000:.0f} ms"
+
+
+def describe_labels(labels):
+    return ", ".join(f"{key}={value}" for key, value in labels.items())
+
+
+def header(*names):
+    return [ft.DataColumn(ft.Text(name, color=ft.Colors.WHITE, weight=ft.FontWeight.BOLD)) for name in names]
+
+
+def row(*values):
+    return ft.DataRow(cells=[ft.DataCell(ft.Text(str(value), color=ft.Colors.WHITE)) for value in values])
+
+
+def show_debug_view(page: ft.Page, on_back):
+    """Show the current timing histograms, counters and per-channel playback stats"""
+    page.title = "Debug - Metrics"
+    page.scroll = ft.ScrollMode.AUTO
+    metrics = get_metrics()
+    export_dir = default_cache_dir("metrics")
+
+    status = ft.Text("", color=ft.Colors.WHITE)
+    histograms = ft.DataTable(columns=header("Timing", "Labels", "Count", "p50", "p95", "p99", "Max"))
+    counters = ft.DataTable(columns=header("Counter", "Labels", "Value"))
+    channels = ft.DataTable(columns=header("Channel", "Attempts", "Loaded", "Errors", "Avg start", "Last error"))
+
+    def refresh(e=None):
+        snapshot = metrics.snapshot()
+        histograms.rows = [
+            row(
+                entry["name"], describe_labels(entry["labels"]), entry["count"],
+                format_ms(entry["p50"]), format_ms(entry["p95"]), format_ms(entry["p99"]), format_ms(entry["max"]),
+            )
+            for entry in snapshot["histograms"]
+        ]
+        counters.rows = [
+            row(entry["name"], describe_labels(entry["labels"]), entry["value"])
+            for entry in snapshot["counters"]
+        ]
+        ranked = sorted(snapshot["channels"].items(), key=lambda item: (-item[1]["errors"], -item[1]["attempts"]))
+        channels.rows = [
+            row(
+                name, stats["attempts"], stats["loaded"], stats["errors"],
+                format_ms(stats["load_seconds"] / stats["loaded"]) if stats["loaded"] else "-",
+                stats["last_error"] or "",
+            )
+            for name, stats in ranked[:DEBUG_CHANNEL_ROWS]
+        ]
+        page.update()
+
+    def export(filename):
+        try:
+            status.value = f"Saved {metrics.write(os.path.join(export_dir, filename))}"
+        except OSError as e:
+            status.value = f"Export failed: {e}"
+        page.update()
+
+    top_bar = ft.Row(
+        controls=[
+            ft.IconButton(icon=ft.Icons.ARROW_BACK, icon_color=ft.Colors.WHITE, on_click=lambda e: on_back()),
+            ft.Text("Metrics", size=20, color=ft.Colors.WHITE, weight=ft.FontWeight.BOLD),
+            ft.TextButton("Refresh", on_click=refresh),
+            ft.TextButton("Export JSON", on_click=lambda e: export("metrics.json")),
+            ft.TextButton("Export Prometheus", on_click=lambda e: export("metrics.prom")),
+        ],
+        spacing=10,
+    )
+
+    page.controls.clear()
+    page.controls.append(
+        ft.Column(
+            controls=[top_bar, status, histograms, counters, channels],
+            spacing=20,
+        )
+    )
+    refresh()
@@ -0,0 +1,557 @@
+import asyncio
+import base64
+import hashlib
+import hmac
+import os
+import re
+import shutil
+import threading
+import time
+from collections import OrderedDict
+from http import HTTPStatus
+from urllib.parse import urljoin, urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from metrics import get_metrics
+from playlist_cache import default_cache_dir, remove_orphans
+
+# The relay is for desktop playback, where the player runs next to it. Left
+# as None, it is used for desktop pages and not for Flet web mode, where
+# browsers can't reach 127.0.0.1 on this machine, unless RELAY_URL says where
+# they can (bind RELAY_HOST to match). SMARTERS_RELAY=1 or 0 forces it.
+RELAY_ENABLED = {"1": True, "0": False}.get(os.getenv("SMARTERS_RELAY", ""))
+RELAY_HOST = os.getenv("SMARTERS_RELAY_HOST", "127.0.0.1")
+RELAY_PORT = int(os.getenv("SMARTERS_RELAY_PORT", "0"))
+RELAY_URL = os.getenv("SMARTERS_RELAY_URL")
+SEGMENT_MEMORY_BYTES = 64 * 1024 * 1024
+SEGMENT_DISK_BYTES = 256 * 1024 * 1024
+# Bigger responses are streamed through to the player instead of being
+# buffered, and not kept.
+MAX_CACHED_BYTES = 16 * 1024 * 1024
+STREAM_CHUNK_SIZE = 256 * 1024
+# Live playlists change every target duration; this only merges players
+# that poll the same playlist at the same moment.
+MANIFEST_TTL = 1.0
+UPSTREAM_CONNECT_TIMEOUT = 5
+UPSTREAM_READ_TIMEOUT = 15
+UPSTREAM_POOL_SIZE = 16
+MANIFEST_TYPE = "application/vnd.apple.mpegurl"
+
+_URI_ATTRIBUTE_RE = re.compile(r'URI="([^"]*)"')
+
+
+def is_hls_url(url: str):
+    return urlsplit(url).path.lower().endswith((".m3u8", ".m3u"))
+
+
+def relay_enabled(page=None):
+    """Whether players on page should go through the relay"""
+    if RELAY_ENABLED is not None:
+        return RELAY_ENABLED
+    return bool(RELAY_URL) or not getattr(page, "web", False)
+
+
+def is_manifest(content_type: str, body: bytes):
+    return "mpegurl" in content_type.lower() or body.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"#EXTM3U")
+
+
+def rewrite_manifest(text: str, base: str, local):
+    """text with every URI in it, resolved against base, replaced by local(uri).
+
+    Covers the URI lines and the URI="..." attributes of tags like
+    EXT-X-KEY, EXT-X-MAP and EXT-X-MEDIA. Non-HTTP URIs (data:, skd:) stay.
+    """
+
+    def relay(uri):
+        absolute = urljoin(base, uri)
+        return local(absolute) if absolute.startswith(("http://", "https://")) else uri
+
+    lines = []
+    for line in text.splitlines():
+        stripped = line.strip()
+        if stripped and not stripped.startswith("#"):
+            lines.append(relay(stripped))
+        elif stripped.startswith("#EXT") and 'URI="' in stripped:
+            lines.append(_URI_ATTRIBUTE_RE.sub(lambda match: f'URI="{relay(match.group(1))}"', stripped))
+        else:
+            lines.append(line)
+    return "\n".join(lines) + "\n"
+
+
+class Upstream:
+    """One relayed response, as stored in the cache.
+
+    For a response too big to cache, body is only what was read before that
+    was clear and rest streams the remainder.
+    """
+
+    __slots__ = ("status", "url", "content_type", "content_range", "body", "rest")
+
+    def __init__(self, status, url, content_type, content_range, body, rest=None):
+        self.status = status
+        self.url = url
+        self.content_type = content_type
+        self.content_range = content_range
+        self.body = body
+        self.rest = rest
+
+
+class StreamedBody:
+    """The rest of an upstream response, read from the network as the player takes it.
+
+    It can only be sent once: claim() tells the first request for it apart
+    from any others that were waiting on the same fetch.
+    """
+
+    def __init__(self, response, head, chunks):
+        self.response = response
+        self._head = head
+        self._chunks = chunks
+        self.claimed = False
+
+    def claim(self):
+        claimed, self.claimed = self.claimed, True
+        return not claimed
+
+    async def chunks(self):
+        # What was read before the response turned out too big comes first.
+        yield self._head
+        done = object()
+        while True:
+            chunk = await asyncio.to_thread(next, self._chunks, done)
+            if chunk is done:
+                return
+            get_metrics().increment("relay_upstream_bytes_total", len(chunk))
+            yield chunk
+
+    def close(self):
+        self.response.close()
+
+
+class SegmentCache:
+    """LRU of relayed segments, in memory first and spilling to disk.
+
+    Entries pushed out of memory are written to a directory of this
+    process's own under directory until the files there exceed disk_bytes,
+    then dropped least recently used first. A disk hit moves the entry back
+    into memory. Segments are only worth keeping while their channel is
+    live, so the directory starts empty and close() deletes it; the
+    directories of processes that are gone are deleted on start. Other
+    instances of the app running at the same time keep theirs.
+    """
+
+    def __init__(self, directory=None, memory_bytes=SEGMENT_MEMORY_BYTES, disk_bytes=SEGMENT_DISK_BYTES):
+        root = directory or default_cache_dir("segments")
+        remove_orphans(root, r"(\d+)")
+        self.directory = os.path.join(root, str(os.getpid()))
+        self.memory_bytes = memory_bytes
+        self.disk_bytes = disk_bytes
+        shutil.rmtree(self.directory, ignore_errors=True)
+        os.makedirs(self.directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._memory = OrderedDict()
+        self._memory_total = 0
+        self._files = OrderedDict()
+        self._disk_total = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, hashlib.sha1(key.encode("utf-8")).hexdigest())
+
+    def peek(self, key):
+        """The entry for key if it is in memory, without touching the disk"""
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+            return entry
+
+    def get(self, key):
+        entry = self.peek(key)
+        if entry is not None:
+            return entry
+        with self._lock:
+            if key not in self._files:
+                return None
+            meta, size = self._files.pop(key)
+            self._disk_total -= size
+        try:
+            with open(self._path(key), "rb") as f:
+                body = f.read()
+            os.remove(self._path(key))
+        except OSError:
+            return None
+        entry = Upstream(meta.status, meta.url, meta.content_type, meta.content_range, body)
+        self.put(key, entry)
+        return entry
+
+    def put(self, key, entry):
+        spilled = []
+        with self._lock:
+            if key in self._memory:
+                self._memory_total -= len(self._memory.pop(key).body)
+            self._memory[key] = entry
+            self._memory_total += len(entry.body)
+            while self._memory_total > self.memory_bytes and len(self._memory) > 1:
+                old_key, old = self._memory.popitem(last=False)
+                self._memory_total -= len(old.body)
+                spilled.append((old_key, old))
+        for old_key, old in spilled:
+            self._spill(old_key, old)
+
+    def close(self):
+        """Drop every entry and delete the directory; entries spilled later recreate it"""
+        with self._lock:
+            self._memory.clear()
+            self._memory_total = 0
+            self._files.clear()
+            self._disk_total = 0
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+    def _spill(self, key, entry):
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            with open(self._path(key), "wb") as f:
+                f.write(entry.body)
+        except OSError:
+            return
+        # Keep the metadata and the body's length, not the body itself.
+        meta = Upstream(entry.status, entry.url, entry.content_type, entry.content_range, b"")
+        with self._lock:
+            if key in self._files:
+                self._disk_total -= self._files.pop(key)[1]
+            self._files[key] = (meta, len(entry.body))
+            self._disk_total += len(entry.body)
+            while self._disk_total > self.disk_bytes and self._files:
+                old_key, (_, size) = self._files.popitem(last=False)
+                self._disk_total -= size
+                try:
+                    os.remove(self._path(old_key))
+                except OSError:
+                    pass
+
+
+class HLSRelay:
+    """In-process HTTP relay for HLS channels, shared by every player and session.
+
+    url_for() turns a channel URL into one on the relay. Playlists fetched
+    through it are rewritten so the segments, keys and variant playlists
+    they list come through the relay too. Segments are kept in a
+    SegmentCache, so re-tuning a channel or a second player on it is served
+    locally. Requests for something already being fetched wait for that fetch
+    instead of starting another, and upstream requests share one pooled
+    session. The relay runs its own event loop on a daemon thread, so it
+    doesn't depend on any page being open.
+
+    Only URLs the relay handed out are served: each carries a header key
+    issued by url_for() and a signature of the upstream URL, and anything
+    else gets a 404, so the relay can't be used to fetch arbitrary URLs.
+    """
+
+    def __init__(self, host=RELAY_HOST, port=RELAY_PORT, public_url=RELAY_URL, cache=None, session=None):
+        self.host = host
+        self.port = port
+        self.public_url = public_url
+        self.cache = cache
+        self.session = session
+        self._headers = {}
+        self._secret = os.urandom(16)
+        self._mounts = {}
+        # key -> (playlist Upstream, monotonic time it expires); also written by prime().
+        self._manifests = {}
+        self._manifests_lock = threading.Lock()
+        self._in_flight = {}
+        self._loop = None
+        self._thread = None
+        self._server = None
+        self._started = threading.Lock()
+
+    def start(self):
+        """Start serving if not already; returns the base URL players should use"""
+        with self._started:
+            if self._loop is None:
+                if self.cache is None:
+                    self.cache = SegmentCache()
+                if self.session is None:
+                    self.session = requests.Session()
+                    adapter = HTTPAdapter(pool_connections=UPSTREAM_POOL_SIZE, pool_maxsize=UPSTREAM_POOL_SIZE)
+                    self.session.mount("https://", adapter)
+                    self.session.mount("http://", adapter)
+                ready = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(ready,), name="hls-relay", daemon=True)
+                self._thread.start()
+                ready.wait()
+        return self.public_url or f"http://{self.host}:{self.port}"
+
+    def prime(self, url: str, final_url: str, body: bytes, ttl: float):
+        """Answer requests for playlist url with body for the next ttl seconds.
+
+        For playlists fetched ahead of playback, e.g. by the zap prefetcher;
+        final_url is where url redirected to, which relative URIs in body
+        resolve against.
+        """
+        self._remember_manifest(url, Upstream(200, final_url, MANIFEST_TYPE, None, body), ttl)
+
+    def _remember_manifest(self, key, entry, ttl):
+        now = time.monotonic()
+        with self._manifests_lock:
+            self._manifests[key] = (entry, now + ttl)
+            for old_key in [k for k, (_, expires) in self._manifests.items() if expires <= now]:
+                del self._manifests[old_key]
+
+    def mount(self, prefix: str, handler):
+        """Answer requests whose path starts with prefix with await handler(method, path, headers)"""
+        # Replaced rather than changed in place, since the relay's loop may be iterating it.
+        self._mounts = {**self._mounts, prefix: handler}
+
+    def unmount(self, prefix: str):
+        self._mounts = {key: handler for key, handler in self._mounts.items() if key != prefix}
+
+    def submit(self, coroutine):
+        """Run coroutine on the relay's loop; returns a concurrent.futures.Future"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def stop(self):
+        """Stop serving and empty the segment cache; returns once open
+        connections and submitted work are cancelled"""
+        with self._started:
+            if self._loop is not None:
+                self._loop.call_soon_threadsafe(self._loop.stop)
+                self._loop = None
+                if self._thread is not threading.current_thread():
+                    self._thread.join()
+                self._thread = None
+                self.cache.close()
+
+    def _run(self, ready):
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._server = loop.run_until_complete(asyncio.start_server(self._serve, self.host, self.port))
+        self.port = self._server.sockets[0].getsockname()[1]
+        self._loop = loop
+        ready.set()
+        try:
+            loop.run_forever()
+        finally:
+            self._server.close()
+            # Connections and recorders still running would otherwise be
+            # destroyed pending when the loop closes.
+            tasks = asyncio.all_tasks(loop)
+            for task in tasks:
+                task.cancel()
+            loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+            loop.run_until_complete(self._server.wait_closed())
+            # Upstream fetches in worker threads report back to the loop.
+            loop.run_until_complete(loop.shutdown_default_executor())
+            loop.close()
+
+    def url_for(self, url: str, headers=None):
+        """The relay URL for url, fetched upstream with headers (e.g. a channel's User-Agent)"""
+        headers = dict(headers or {})
+        key = hashlib.sha1(repr(sorted(headers.items())).encode("utf-8")).hexdigest()[:12]
+        self._headers[key] = headers
+        return self._local(self.start(), key, url)
+
+    def _signature(self, key, url):
+        return hmac.new(self._secret, f"{key} {url}".encode("utf-8"), hashlib.sha1).hexdigest()[:16]
+
+    def _local(self, base, key, url):
+        encoded = base64.urlsafe_b64encode(url.encode("utf-8")).decode("ascii").rstrip("=")
+        # Keep the upstream file name last so players can still tell what it is.
+        name = urlsplit(url).path.rsplit("/", 1)[-1] or "index.m3u8"
+        return f"{base}/{key}/{self._signature(key, url)}/{encoded}/{name}"
+
+    async def _serve(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode("latin-1").split(" ", 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                status, response_headers, body = await self._respond(method, target, headers)
+                try:
+                    reason = HTTPStatus(status).phrase
+                except ValueError:
+                    reason = ""
+                head = [f"HTTP/1.1 {status} {reason}"]
+                if isinstance(body, StreamedBody):
+                    response_headers["Transfer-Encoding"] = "chunked"
+                else:
+                    response_headers["Content-Length"] = str(len(body))
+                response_headers["Access-Control-Allow-Origin"] = "*"
+                head += [f"{name}: {value}" for name, value in response_headers.items()]
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+                if isinstance(body, StreamedBody):
+                    try:
+                        if method != "HEAD":
+                            await self._send_chunked(writer, body)
+                    finally:
+                        body.close()
+                else:
+                    if method != "HEAD":
+                        writer.write(body)
+                    await writer.drain()
+                    get_metrics().increment("relay_served_bytes_total", len(body))
+                if headers.get("connection", "").lower() == "close":
+                    break
+        except (ConnectionError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # stop() closing the relay; ending normally keeps asyncio from logging it.
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _send_chunked(writer, body):
+        async for chunk in body.chunks():
+            if chunk:
+                writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                await writer.drain()
+                get_metrics().increment("relay_served_bytes_total", len(chunk))
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    async def _respond(self, method, target, headers):
+        """(status, headers, body) for one request to the relay"""
+        if method == "OPTIONS":
+            return 204, {"Access-Control-Allow-Headers": "*", "Access-Control-Allow-Methods": "GET, HEAD"}, b""
+        if method not in ("GET", "HEAD"):
+            return 405, {}, b""
+        path = target.split("?", 1)[0]
+        for prefix, handler in self._mounts.items():
+            if path.startswith(prefix):
+                return await handler(method, path, headers)
+        try:
+            _, key, signature, encoded, _ = path.split("/", 4)
+            url = base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)).decode("utf-8")
+        except ValueError:
+            return 404, {}, b""
+        upstream_headers = self._headers.get(key)
+        if upstream_headers is None or not hmac.compare_digest(signature.encode("latin-1"), self._signature(key, url).encode("ascii")):
+            return 404, {}, b""
+        upstream_range = headers.get("range")
+        try:
+            upstream = await self._get(url, upstream_headers, upstream_range)
+        except requests.RequestException:
+            get_metrics().increment("relay_upstream_errors_total")
+            return 502, {}, b""
+        if upstream.status >= 400:
+            if upstream.rest is not None:
+                upstream.rest.close()
+            return upstream.status, {}, b""
+        if upstream.rest is None and is_manifest(upstream.content_type, upstream.body):
+            base = self.public_url or f"http://{self.host}:{self.port}"
+            text = rewrite_manifest(
+                upstream.body.decode("utf-8", "replace"), upstream.url, lambda uri: self._local(base, key, uri)
+            )
+            return 200, {"Content-Type": MANIFEST_TYPE, "Cache-Control": "no-cache"}, text.encode("utf-8")
+        response_headers = {"Content-Type": upstream.content_type or "application/octet-stream"}
+        if upstream.content_range:
+            response_headers["Content-Range"] = upstream.content_range
+        return upstream.status, response_headers, upstream.body if upstream.rest is None else upstream.rest
+
+    async def _get(self, url, headers, upstream_range=None):
+        key = url if upstream_range is None else f"{url} {upstream_range}"
+        entry = self.cache.peek(key)
+        if entry is None:
+            with self._manifests_lock:
+                manifest = self._manifests.get(key)
+            if manifest is not None and time.monotonic() < manifest[1]:
+                entry = manifest[0]
+        if entry is not None:
+            get_metrics().increment("relay_requests_total", cache="hit")
+            return entry
+        future = self._in_flight.get(key)
+        if future is not None:
+            get_metrics().increment("relay_requests_total", cache="coalesced")
+        else:
+            future = asyncio.ensure_future(asyncio.to_thread(self._fetch, key, url, headers, upstream_range))
+            self._in_flight[key] = future
+            future.add_done_callback(lambda done: self._fetched(key, done))
+        # Shielded: a player hanging up mustn't cancel a fetch others wait on.
+        entry = await asyncio.shield(future)
+        if entry.rest is not None and not entry.rest.claim():
+            # Another request is already streaming that response; this one needs its own.
+            entry = await asyncio.to_thread(self._fetch, key, url, headers, upstream_range)
+            if entry.rest is not None:
+                entry.rest.claim()
+        return entry
+
+    def _fetched(self, key, future):
+        del self._in_flight[key]
+        if future.cancelled() or future.exception() is not None:
+            return
+        entry = future.result()
+        if entry.status < 400 and is_manifest(entry.content_type, entry.body):
+            self._remember_manifest(key, entry, MANIFEST_TTL)
+
+    def _fetch(self, key, url, headers, upstream_range):
+        # Runs in a worker thread: the disk tier of the cache and the upstream request.
+        entry = self.cache.get(key)
+        if entry is not None:
+            get_metrics().increment("relay_requests_total", cache="hit")
+            return entry
+        get_metrics().increment("relay_requests_total", cache="miss")
+        if upstream_range:
+            headers = dict(headers, Range=upstream_range)
+        response = self.session.get(
+            url, headers=headers, timeout=(UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT), stream=True
+        )
+        content_type = response.headers.get("Content-Type", "")
+        chunks = response.iter_content(STREAM_CHUNK_SIZE)
+        body = bytearray()
+        try:
+            length = int(response.headers.get("Content-Length", ""))
+        except ValueError:
+            length = None
+        if length is None or length <= MAX_CACHED_BYTES or "mpegurl" in content_type.lower():
+            for chunk in chunks:
+                body += chunk
+                if len(body) > MAX_CACHED_BYTES and not is_manifest(content_type, body):
+                    break
+            else:
+                response.close()
+                get_metrics().increment("relay_upstream_bytes_total", len(body))
+                entry = Upstream(
+                    response.status_code, response.url, content_type, response.headers.get("Content-Range"), bytes(body)
+                )
+                if entry.status in (200, 206) and not is_manifest(entry.content_type, entry.body):
+                    self.cache.put(key, entry)
+                return entry
+        get_metrics().increment("relay_upstream_bytes_total", len(body))
+        body = bytes(body)
+        return Upstream(
+            response.status_code, response.url, content_type, response.headers.get("Content-Range"), body,
+            StreamedBody(response, body, chunks),
+        )
+
+
+_relay = None
+
+
+def get_relay():
+    global _relay
+    if _relay is None:
+        _relay = HLSRelay()
+    return _relay
+
+
+def stop_relay():
+    """Stop the shared relay if it was ever started, e.g. when the app exits"""
+    if _relay is not None:
+        _relay.stop()
+
+
+def relay_url(url: str, headers=None, page=None):
+    """(url, headers) for the player on page: through the relay for HLS URLs when it is on"""
+    if not relay_enabled(page) or not is_hls_url(url):
+        return url, headers
+    return get_relay().url_for(url, headers), None
@@ -0,0 +1,185 @@
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, wait
+import requests
+from catalog_db import CONFIG_DB
+from metrics import get_metrics
+
+# Requests per resource in total, counting hedges and failovers to a mirror.
+MAX_ATTEMPTS = 4
+# Backoff before the next round once every request in flight has failed:
+# BACKOFF_BASE, doubling per failure up to BACKOFF_MAX, with jitter.
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8
+# Send the next mirror a request too if the current one hasn't sent response
+# headers by then. Comfortably above a healthy time to first byte.
+HEDGE_DELAY = 1.5
+# Statuses worth asking again or asking a mirror; anything else is the answer.
+RETRY_STATUSES = frozenset({408, 425, 429, 500, 502, 503, 504})
+
+# Copies of the iptv-org resources, used when config.db has no mirrors for a URL.
+# Both are built from the same gh-pages branches as the github.io originals.
+DEFAULT_MIRRORS = {
+    "https://iptv-org.github.io/api/countries.json": [
+        "https://raw.githubusercontent.com/iptv-org/api/gh-pages/countries.json",
+        "https://cdn.jsdelivr.net/gh/iptv-org/api@gh-pages/countries.json",
+    ],
+    "https://iptv-org.github.io/iptv/index.country.m3u": [
+        "https://raw.githubusercontent.com/iptv-org/iptv/gh-pages/index.country.m3u",
+        "https://cdn.jsdelivr.net/gh/iptv-org/iptv@gh-pages/index.country.m3u",
+    ],
+}
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS fetch_mirrors (
+    url TEXT NOT NULL,
+    mirror TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    enabled INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (url, mirror)
+)
+"""
+
+
+def mirrors(url: str, path=CONFIG_DB):
+    """Mirrors of url in the order to try them.
+
+    Rows in the fetch_mirrors table for url take over from DEFAULT_MIRRORS
+    completely, so a single disabled row turns failover off for it.
+    """
+    conn = sqlite3.connect(path)
+    try:
+        rows = conn.execute(
+            "SELECT mirror, enabled FROM fetch_mirrors WHERE url = ? ORDER BY priority, rowid", (url,)
+        ).fetchall()
+    except sqlite3.OperationalError:
+        rows = []
+    finally:
+        conn.close()
+    if not rows:
+        return list(DEFAULT_MIRRORS.get(url, ()))
+    return [mirror for mirror, enabled in rows if enabled]
+
+
+def add_mirror(url: str, mirror: str, priority=0, enabled=True, path=CONFIG_DB):
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.execute(_SCHEMA)
+            conn.execute(
+                "INSERT INTO fetch_mirrors (url, mirror, priority, enabled) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (url, mirror) DO UPDATE SET priority = excluded.priority, enabled = excluded.enabled",
+                (url, mirror, priority, int(enabled)),
+            )
+    finally:
+        conn.close()
+
+
+def remove_mirror(url: str, mirror: str, path=CONFIG_DB):
+    conn = sqlite3.connect(path)
+    try:
+        with conn:
+            conn.execute(_SCHEMA)
+            conn.execute("DELETE FROM fetch_mirrors WHERE url = ? AND mirror = ?", (url, mirror))
+    finally:
+        conn.close()
+
+
+def _start(call, *args, **kwargs):
+    # A daemon thread rather than an executor, so a hedge that lost and is
+    # still waiting on a dead server never holds up the app's exit.
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(call(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, daemon=True).start()
+    return future
+
+
+def _close_response(future):
+    if future.exception() is None:
+        future.result().close()
+
+
+class Fetcher:
+    """GETs that survive a slow or failing server.
+
+    get() asks the URLs in turn: the first one, then its mirrors, then round
+    again, for up to attempts requests. A request that hasn't answered within
+    hedge_delay gets a second one to the next URL alongside it, and whichever
+    answers first wins; the other is closed. Once everything in flight has
+    failed with a connection error or a RETRY_STATUSES status, the next
+    request waits out an exponential backoff. hedge_delay=None turns hedging
+    off.
+
+    "Answered" means response headers: with stream=True the winner's body is
+    still read by the caller, and a connection that dies mid-body is the
+    caller's to handle.
+    """
+
+    def __init__(
+        self, session, attempts=MAX_ATTEMPTS, hedge_delay=HEDGE_DELAY, backoff_base=BACKOFF_BASE,
+        backoff_max=BACKOFF_MAX,
+    ):
+        self.session = session
+        self.attempts = attempts
+        self.hedge_delay = hedge_delay
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def backoff(self, failures: int):
+        return random.uniform(0.5, 1) * min(self.backoff_base * 2 ** (failures - 1), self.backoff_max)
+
+    def get(self, urls, resource="other", **kwargs):
+        """(url, response) of the first of urls to answer; kwargs go to session.get().
+
+        Raises the last requests.RequestException once every attempt failed.
+        """
+        metrics = get_metrics()
+        candidates = [urls[attempt % len(urls)] for attempt in range(self.attempts)]
+        pending = {}
+        failures = 0
+        error = None
+
+        def launch():
+            url = candidates.pop(0)
+            pending[_start(self.session.get, url, **kwargs)] = url
+
+        launch()
+        try:
+            while pending:
+                hedge = self.hedge_delay if candidates and len(pending) == 1 else None
+                done, _ = wait(pending, hedge, FIRST_COMPLETED)
+                if not done:
+                    metrics.increment("fetch_hedges_total", resource=resource)
+                    launch()
+                    continue
+                for future in done:
+                    url = pending.pop(future)
+                    try:
+                        response = future.result()
+                    except requests.RequestException as e:
+                        error = e
+                    else:
+                        if response.status_code not in RETRY_STATUSES:
+                            if url != urls[0]:
+                                metrics.increment("fetch_failovers_total", resource=resource)
+                            return url, response
+                        response.close()
+                        error = requests.HTTPError(f"{response.status_code} Server Error for url: {url}", response=response)
+                    failures += 1
+                    metrics.increment("fetch_errors_total", resource=resource)
+                if not pending and candidates:
+                    time.sleep(self.backoff(failures))
+                    metrics.increment("fetch_retries_total", resource=resource)
+                    launch()
+            raise error
+        finally:
+            for future in pending:
+                future.add_done_callback(_close_response)
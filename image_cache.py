@@ -0,0 +1,185 @@
+import base64
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import requests
+from catalog_loader import CONNECT_TIMEOUT, get_session
+from m3u_parser import DEFAULT_LOGO
+from playlist_cache import default_cache_dir
+from ui_updates import schedule_update
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it images are cached at full size.
+    Image = None
+
+IMAGE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+IMAGE_WORKERS = 6
+IMAGE_READ_TIMEOUT = 10
+# Logos are stored at this multiple of their display size to stay sharp on high-DPI screens.
+IMAGE_SCALE = 2
+MEMORY_ENTRIES = 512
+
+
+class ImageCache:
+    """Local cache for remote logos and flags.
+
+    attach() points an ft.Image at the cached copy of a URL, or at the bundled
+    placeholder while a bounded pool of workers downloads it, downscales it to the
+    display size and stores it on disk. Files are evicted least recently used
+    first once they exceed max_bytes. URLs that fail to download or decode keep
+    the placeholder for the rest of the session.
+    """
+
+    def __init__(self, directory=None, max_bytes=IMAGE_CACHE_MAX_BYTES, workers=IMAGE_WORKERS):
+        self.directory = directory or default_cache_dir("images")
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="image-cache")
+        self._lock = threading.Lock()
+        self._files = OrderedDict()
+        self._total = 0
+        self._memory = OrderedDict()
+        self._waiting = {}
+        self._failed = set()
+        self._scan()
+
+    def _scan(self):
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.is_file() and entry.name.endswith(".img"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name, stat.st_size))
+        for _, name, size in sorted(entries):
+            self._files[name] = size
+            self._total += size
+
+    @staticmethod
+    def _key(url, width, height):
+        return hashlib.sha1(f"{url}|{width}x{height}".encode("utf-8")).hexdigest() + ".img"
+
+    def _read(self, key):
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                return self._memory[key]
+            if key not in self._files:
+                return None
+            self._files.move_to_end(key)
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, "rb") as f:
+                encoded = base64.b64encode(f.read()).decode("ascii")
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._total -= self._files.pop(key, 0)
+            return None
+        self._remember(key, encoded)
+        return encoded
+
+    def _remember(self, key, encoded):
+        with self._lock:
+            self._memory[key] = encoded
+            if len(self._memory) > MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+
+    def _store(self, key, data):
+        path = os.path.join(self.directory, key)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+        os.replace(path + ".tmp", path)
+        with self._lock:
+            self._total += len(data) - self._files.pop(key, 0)
+            self._files[key] = len(data)
+            while self._total > self.max_bytes and len(self._files) > 1:
+                old_key, size = self._files.popitem(last=False)
+                self._total -= size
+                self._memory.pop(old_key, None)
+                try:
+                    os.remove(os.path.join(self.directory, old_key))
+                except OSError:
+                    pass
+
+    def attach(self, image, url, width, height):
+        """Show url in image at width x height, from the cache when possible.
+
+        Safe to call again when the tile is rebound: a download that finishes
+        after image has moved on to another URL is stored but not applied.
+        """
+        image.src = DEFAULT_LOGO
+        image.src_base64 = None
+        if not url or url.startswith("/"):
+            image.src = url or DEFAULT_LOGO
+            image.data = None
+            return
+        key = self._key(url, width, height)
+        image.data = key
+        if key in self._failed:
+            return
+        encoded = self._read(key)
+        if encoded:
+            image.src_base64 = encoded
+            return
+        with self._lock:
+            waiting = self._waiting.get(key)
+            if waiting is not None:
+                waiting.append(image)
+                return
+            self._waiting[key] = [image]
+        self._executor.submit(self._download, key, url, width, height)
+
+    def _download(self, key, url, width, height):
+        data = None
+        try:
+            response = get_session().get(url, timeout=(CONNECT_TIMEOUT, IMAGE_READ_TIMEOUT))
+            response.raise_for_status()
+            data = downscale(response.content, width * IMAGE_SCALE, height * IMAGE_SCALE)
+        except (requests.RequestException, OSError, ValueError):
+            pass
+        finally:
+            # Whatever happened, the key must stop counting as in flight, or every
+            # later attach() of it would queue behind a download that never ends.
+            with self._lock:
+                images = self._waiting.pop(key, [])
+        if data is None:
+            self._failed.add(key)
+            return
+        self._store(key, data)
+        encoded = base64.b64encode(data).decode("ascii")
+        self._remember(key, encoded)
+        for image in images:
+            if image.data == key:
+                image.src_base64 = encoded
+                page = image.page
+                if page:
+                    # A screenful of logos lands within a few frames; send them together.
+                    schedule_update(page, image)
+
+
+def downscale(data, width, height):
+    """Shrink image bytes to fit width x height (PNG output); unchanged without Pillow"""
+    if Image is None:
+        return data
+    with Image.open(io.BytesIO(data)) as img:
+        if img.width <= width and img.height <= height:
+            return data
+        img.thumbnail((width, height))
+        if img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGBA")
+        out = io.BytesIO()
+        img.save(out, format="PNG", optimize=True)
+        return out.getvalue()
+
+
+_image_cache = None
+
+
+def get_image_cache():
+    global _image_cache
+    if _image_cache is None:
+        _image_cache = ImageCache()
+    return _image_cache
@@ -0,0 +1,110 @@
+from collections import OrderedDict
+from ui_updates import schedule_update
+
+LAZY_BATCH_SIZE = 60
+# Start loading the next batch this many pixels before the end of the scroll extent.
+SCROLL_THRESHOLD = 400
+# Tiles kept bound to items that are not on screen, so filtering back to them is free.
+MAX_POOLED_TILES = 240
+
+
+class LazyGrid:
+    """Windowed rendering for a GridView with a tile pool keyed by item.
+
+    Only the first batch of items gets a tile; scrolling near the end of the
+    rendered window materializes the next batch. Items must be hashable (a
+    Channel hashes by its row, a country by its name) and each keeps its own tile
+    for as long as it stays in the pool, so re-filtering only reorders existing
+    controls and binds tiles for items that weren't shown before. When the pool is
+    full the least recently shown tiles are rebound to new items rather than
+    discarded.
+
+    make_tile() creates an empty tile control and bind_tile(tile, item) points it
+    at an item. scroller is the control whose on_scroll drives loading, when the
+    grid itself doesn't scroll.
+    """
+
+    def __init__(self, grid, make_tile, bind_tile, batch_size=LAZY_BATCH_SIZE, scroller=None,
+                 max_pooled=MAX_POOLED_TILES):
+        self.grid = grid
+        self._make_tile = make_tile
+        self._bind_tile = bind_tile
+        self._batch_size = batch_size
+        self._max_pooled = max_pooled
+        self._items = []
+        self._tiles = OrderedDict()
+        scroller = scroller or grid
+        scroller.on_scroll = self._on_scroll
+        scroller.on_scroll_interval = 100
+
+    def __len__(self):
+        return len(self._items)
+
+    def __getitem__(self, index):
+        return self._items[index]
+
+    def index(self, item):
+        """Position of item in the full item list, or -1"""
+        try:
+            return self._items.index(item)
+        except ValueError:
+            return -1
+
+    @property
+    def rendered(self):
+        return len(self.grid.controls)
+
+    def _tile_for(self, item):
+        tile = self._tiles.pop(item, None)
+        if tile is None:
+            if len(self._tiles) >= max(self._max_pooled, self.rendered + self._batch_size):
+                # Oldest entries were shown longest ago; currently rendered tiles
+                # are always at the recent end.
+                _, tile = self._tiles.popitem(last=False)
+            else:
+                tile = self._make_tile()
+            self._bind_tile(tile, item)
+        self._tiles[item] = tile
+        return tile
+
+    def set_items(self, items):
+        """Show items from the top, reusing the tiles items already have"""
+        self._items = list(items)
+        window = self._items[:max(self._batch_size, 1)]
+        self.grid.controls = [self._tile_for(item) for item in window]
+
+    def insert(self, index, item):
+        """Insert item at index, materializing a tile only if it lands in the window"""
+        self._items.insert(index, item)
+        controls = self.grid.controls
+        if index < len(controls) or len(controls) < self._batch_size:
+            controls.insert(index, self._tile_for(item))
+
+    def remove(self, item):
+        """Remove item, and its tile if it is rendered; the tile stays pooled"""
+        index = self.index(item)
+        if index == -1:
+            return
+        del self._items[index]
+        if index < len(self.grid.controls):
+            del self.grid.controls[index]
+
+    def rebind(self, item):
+        """Bind item's tile again, e.g. after what it shows changed; no-op without one"""
+        tile = self._tiles.get(item)
+        if tile is not None:
+            self._bind_tile(tile, item)
+
+    def load_more(self):
+        """Materialize the next batch; returns False when everything is rendered"""
+        controls = self.grid.controls
+        start = len(controls)
+        if start >= len(self._items):
+            return False
+        controls.extend(self._tile_for(item) for item in self._items[start:start + self._batch_size])
+        return True
+
+    def _on_scroll(self, e):
+        if e.pixels >= e.max_scroll_extent - SCROLL_THRESHOLD and self.load_more():
+            # Scroll events come in bursts; batches they add share one update per frame.
+            schedule_update(self.grid.page, self.grid)
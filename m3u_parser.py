@@ -0,0 +1,201 @@
+import codecs
+import re
+from itertools import islice
+
+# Bundled in assets/, so a missing logo never costs a network request.
+DEFAULT_LOGO = "/placeholder.png"
+
+# Fallback for #EXTINF lines whose title comma doesn't directly follow the last attribute.
+_EXTINF_RE = re.compile(r'#EXTINF:\s*(-?[\d.]+)((?:\s*[\w-]+="[^"]*")*)\s*(.*)')
+_ATTR_RE = re.compile(r'([\w-]+)\s*=\s*"([^"]*)"')
+# Playlists are cut into entries on this, rather than into lines.
+_ENTRY = "\n#EXTINF"
+# #EXTVLCOPT options kept, under the attribute names they are stored as.
+_OPTIONS = {"http-user-agent": "user-agent", "http-referrer": "referrer"}
+_NOT_URL = ("", "#")
+
+
+def irregular(text: str):
+    """Whether text has the spacing split_attrs can't take apart without the regex"""
+    return '  ' in text or ' =' in text or '= ' in text or '\t' in text
+
+
+def split_attrs(line: str, end: int, start: int = 8):
+    """Attributes of an #EXTINF line whose attribute block closes at end.
+
+    The block begins at the first space from start on. Turning every '="' into
+    '" ' makes keys and values alternate between '" ' separators, which is cheaper
+    than running a regex over every line; blocks with unusual spacing use the regex.
+    """
+    block = line[line.find(' ', start) + 1:end + 1]
+    if irregular(block):
+        return dict(_ATTR_RE.findall(block))
+    items = iter(block[:-1].replace('="', '" ').split('" '))
+    return dict(zip(items, items))
+
+
+def parse_extinf(line: str):
+    """Tokenize an #EXTINF line once into (attributes, title)"""
+    # Attribute values can't contain quotes, so the first '",' is where the title starts.
+    end = line.find('",')
+    if end != -1:
+        return split_attrs(line, end), line[end + 2:].strip()
+    match = _EXTINF_RE.match(line)
+    if match is None:
+        return {}, line.split(',', 1)[1].strip() if ',' in line else ""
+    rest = match.group(3)
+    title = rest[1:] if rest.startswith(',') else rest.split(',', 1)[-1]
+    return dict(_ATTR_RE.findall(match.group(2))), title.strip()
+
+
+class ChannelRecord:
+    """One channel of a playlist.
+
+    The #EXTINF attributes are tokenized once while parsing, into the same dict
+    that attributes() and get() read, together with the user-agent/referrer options.
+    """
+
+    __slots__ = ("name", "url", "tvg_id", "_attrs")
+
+    def attributes(self):
+        """Every raw #EXTINF attribute, plus the user-agent/referrer options"""
+        return self._attrs
+
+    @classmethod
+    def from_attributes(cls, name: str, url: str, attrs: dict):
+        """A record for a channel that isn't parsed from a playlist, e.g. one read back from the catalog"""
+        channel = cls()
+        channel.name = name
+        channel.url = url
+        channel.tvg_id = attrs.get("tvg-id", "")
+        channel._attrs = attrs
+        return channel
+
+    def get(self, key: str, default=None):
+        return self._attrs.get(key, default)
+
+
+def http_headers(channel: dict):
+    """Request headers a player needs for channel, from its user-agent/referrer options"""
+    headers = {}
+    if channel.get("user-agent"):
+        headers["User-Agent"] = channel["user-agent"]
+    if channel.get("referrer"):
+        headers["Referer"] = channel["referrer"]
+    return headers
+
+
+class M3UStreamParser:
+    """Incremental M3U parser fed with raw byte chunks as they arrive.
+
+    feed() returns the (group, channel) records for every entry completed by the chunk,
+    so callers never need the whole playlist in memory. Channels are ChannelRecords;
+    one listed in several groups ("A;B") is yielded once per group, sharing the same
+    record. If an index dict is given, channels with a tvg-id are also collected in it.
+    """
+
+    def __init__(self, index=None):
+        self.index = index
+        self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+        # Text from the start of the last, possibly incomplete, entry. The leading
+        # newline lets a playlist that opens with #EXTINF split like the rest.
+        self._pending_text = "\n"
+
+    def _decode(self, chunk: bytes, final=False):
+        text = self._decoder.decode(chunk, final)
+        # Dropping CRs once per chunk is cheaper than stripping them from every line.
+        return text.replace('\r', '') if '\r' in text else text
+
+    def feed(self, chunk: bytes):
+        text = self._pending_text + self._decode(chunk)
+        entries = text.split(_ENTRY)
+        if len(entries) == 1:
+            self._pending_text = text
+            return ()
+        self._pending_text = _ENTRY + entries.pop()
+        return self._parse_entries(entries, irregular(text))
+
+    def close(self):
+        text = self._pending_text + self._decode(b"", final=True)
+        self._pending_text = "\n"
+        return self._parse_entries(text.split(_ENTRY), irregular(text))
+
+    def _parse_entries(self, entries, irregular_spacing):
+        # Hot loop: each entry is tokenized exactly once, and the record keeps that
+        # attribute dict. The spacing is checked once for the whole chunk, so the
+        # usual chunk splits every attribute block inline. Records come out of a
+        # zip, which reuses its tuple when the caller unpacks it.
+        groups = []
+        channels = []
+        add_group = groups.append
+        add_channel = channels.append
+        index = self.index
+        # entries[0] is whatever came before the first #EXTINF.
+        for entry in islice(entries, 1, None):
+            line, _, rest = entry.partition('\n')
+            end = line.find('",')
+            if end != -1:
+                if irregular_spacing:
+                    attrs = split_attrs(line, end, 1)
+                else:
+                    items = iter(line[line.find(' ', 1) + 1:end].replace('="', '" ').split('" '))
+                    attrs = dict(zip(items, items))
+                name = line[end + 2:]
+            else:
+                # Unusual spacing, or a title that doesn't follow the attributes.
+                attrs, name = parse_extinf("#EXTINF" + line)
+            group_title = attrs.get("group-title")
+            if group_title is None:
+                continue
+            channel = ChannelRecord()
+            channel._attrs = attrs
+            channel.name = name or attrs.get("tvg-name") or "Unnamed Channel"
+            channel.tvg_id = tvg_id = attrs.get("tvg-id", "")
+            # Entries are split apart at the newline that ends the URL line, so the
+            # rest is normally just the URL.
+            url = rest.strip()
+            channel.url = url if url[:1] not in _NOT_URL and '\n' not in url else self._options(attrs, rest)
+            if tvg_id and index is not None:
+                index.setdefault(tvg_id, channel)
+            if ';' in group_title:
+                for group in group_title.split(';'):
+                    if group:
+                        add_group(group)
+                        add_channel(channel)
+            else:
+                add_group(group_title)
+                add_channel(channel)
+        return zip(groups, channels)
+
+    @staticmethod
+    def _options(attrs, lines):
+        """Add the #EXTVLCOPT options ahead of the URL to attrs and return the URL ("" if none)"""
+        for line in lines.split('\n'):
+            line = line.strip()
+            if not line:
+                continue
+            if line[0] != '#':
+                return line
+            if line.startswith('#EXTVLCOPT:'):
+                key, _, value = line[11:].partition('=')
+                if key in _OPTIONS:
+                    attrs[_OPTIONS[key]] = value
+        return ""
+
+
+def parse_m3u(chunks, index=None):
+    """Yield (group, channel) records from an iterable of byte chunks"""
+    parser = M3UStreamParser(index)
+    for chunk in chunks:
+        yield from parser.feed(chunk)
+    yield from parser.close()
+
+
+async def aparse_m3u(chunks, index=None):
+    """Async variant of parse_m3u for chunks arriving from an async iterator"""
+    parser = M3UStreamParser(index)
+    async for chunk in chunks:
+        for record in parser.feed(chunk):
+            yield record
+    for record in parser.close():
+        yield record
@@ -1,8 +1,24 @@
+import bisect
+import importlib
+import sys
+import time
 import flet as ft
 import asyncio
-import requests
+from channel_store import ChannelList, ChannelStore
+from channel_search import RESULTS_PAGE_SIZE, Debouncer, SearchIndex
+from lazy_grid import LazyGrid
+from metrics import get_metrics
 from datetime import datetime
-from flet_video import Video, VideoMedia
+from ui_updates import get_ticker, schedule_update
+
+# Modules that pull in requests, sqlite, Pillow or the video plugin are imported
+# where they are first used, so none of them delay the first frame.
+
+# Seconds after the home screen is up before the live-TV modules are imported
+# in the background and the catalog refresher starts.
+WARMUP_DELAY = 2
+WARMUP_MODULES = ("catalog_refresh", "image_cache", "stream_health", "zap_prefetch", "flet_video")
+LOGO_URL = "https://store-images.s-microsoft.com/image/apps.16279.13585032091773240.4bccec73-8553-4cf4-9cd6-1461f6ab35d9.36817858-a9fd-4617-af4e-7dd2aca3c698?h=210"
 
 class RealTimeClock(ft.Text):
     def __init__(self):
@@ -14,17 +30,14 @@ class RealTimeClock(ft.Text):
         )
 
     def did_mount(self):
-        self.running = True
-        self.page.run_task(self.update_clock)
+        self.unsubscribe = get_ticker(self.page).subscribe(self.tick)
 
     def will_unmount(self):
-        self.running = False
+        self.unsubscribe()
 
-    async def update_clock(self):
-        while self.running:
-            self.value = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.update()
-            await asyncio.sleep(1)
+    def tick(self, now):
+        self.value = now.strftime("%Y-%m-%d %H:%M:%S")
+        schedule_update(self.page, self)
 
 def show_about_dialog(page: ft.Page):
     dialog = ft.AlertDialog(
@@ -59,66 +72,144 @@ def show_coming_soon_dialog(page: ft.Page):
     dialog.open = True
     page.update()
 
+def show_snack_bar(page: ft.Page, message: str):
+    snack_bar = ft.SnackBar(content=ft.Text(message))
+    page.overlay.append(snack_bar)
+    snack_bar.open = True
+    page.update()
+
+def update_channels(page: ft.Page):
+    """Refresh the catalog on demand; open grids get the delta, playback is untouched"""
+    from catalog_loader import CatalogLoadError
+    from catalog_refresh import get_refresher
+
+    show_snack_bar(page, "Checking for channel updates...")
+
+    async def run():
+        try:
+            delta = await get_refresher().refresh()
+        except CatalogLoadError as e:
+            show_snack_bar(page, str(e))
+            return
+        show_snack_bar(page, f"Channels updated: {delta.summary()}" if delta else "Channels are up to date")
+
+    page.run_task(run)
+
 def close_dialog(page: ft.Page, dialog: ft.AlertDialog):
     dialog.open = False
     page.overlay.remove(dialog)
     page.update()
 
 def live_view(page: ft.Page):
+    from catalog_db import get_catalog_db
+    from catalog_loader import cached_catalog_digest, load_catalog, revalidate_if_stale, CatalogLoadError
+    from catalog_refresh import get_refresher
+    from catalog_snapshot import compile_in_background, open_snapshot
+
     page.title = "Country Channel Selector"
     page.scroll = "auto"
     page.bgcolor = "#090B7C"
     page.padding = 20
 
     loading_ring = ft.ProgressRing(visible=True)
-    page.add(loading_ring)
-
-    countries_url = 'https://iptv-org.github.io/api/countries.json'
-    try:
-        countries_response = requests.get(countries_url)
-        countries_response.raise_for_status()
-        countries_data = countries_response.json()
-    except requests.RequestException as e:
-        page.add(ft.Text(f"Error fetching countries data: {e}", color=ft.Colors.WHITE))
-        return
+    loading_text = ft.Text("Loading channels...", color=ft.Colors.WHITE)
+    load_task = None
 
-    name_to_code = {country["name"]: country["code"].lower() for country in countries_data}
-
-    m3u_url = 'https://iptv-org.github.io/iptv/index.country.m3u'
-    try:
-        m3u_response = requests.get(m3u_url)
-        m3u_response.raise_for_status()
-        m3u_content = m3u_response.text
-    except requests.RequestException as e:
-        page.add(ft.Text(f"Error fetching M3U file: {e}", color=ft.Colors.WHITE))
-        return
+    def cancel_loading(e):
+        if load_task:
+            load_task.cancel()
+        main_view(page)
 
-    country_channels = {}
-    lines = m3u_content.splitlines()
-    for i in range(len(lines)):
-        line = lines[i]
-        if line.startswith('#EXTINF'):
-            parts = line.split('group-title="')
-            if len(parts) > 1:
-                country = parts[1].split('"')[0]
-                channel_name = line.split(',', 1)[1] if ',' in line else "Unnamed Channel"
-                logo = line.split('tvg-logo="')[1].split('"')[0] if 'tvg-logo="' in line else "https://via.placeholder.com/64"
-                url = lines[i + 1].strip() if (i + 1 < len(lines) and not lines[i + 1].startswith('#')) else ""
-                if country not in country_channels:
-                    country_channels[country] = []
-                country_channels[country].append({"name": channel_name, "logo": logo, "url": url})
-
-    loading_ring.visible = False
-    page.update()
+    loading_view = ft.Column(
+        controls=[
+            loading_ring,
+            loading_text,
+            ft.TextButton("Cancel", on_click=cancel_loading),
+        ],
+        horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+        spacing=10
+    )
+    page.add(loading_view)
+
+    def refresh(name_to_code, channels):
+        # Upstream changed while we rendered from cache; apply it as a delta so
+        # open screens only patch in what changed.
+        page.run_task(get_refresher().apply, name_to_code, channels)
+
+    def show_progress(message):
+        loading_text.value = message
+        schedule_update(page, loading_text)
+
+    async def load():
+        catalog = get_catalog_db()
+        digest = cached_catalog_digest()
+        if digest and digest == catalog.digest():
+            # Already imported from this exact playlist: skip parsing and let each
+            # screen query only the rows it shows. The compiled snapshot, when
+            # there is one, serves the grid without touching the database.
+            snapshot = open_snapshot(digest)
+            if snapshot is None:
+                compile_in_background()
+            revalidate_if_stale(refresh)
+            show_countries(page, (snapshot or catalog).countries(), None, snapshot)
+            return
+        try:
+            name_to_code, channels = await load_catalog(on_progress=show_progress, on_update=refresh)
+        except CatalogLoadError as e:
+            loading_ring.visible = False
+            page.add(ft.Text(str(e), color=ft.Colors.WHITE))
+            return
+
+        show_countries(page, name_to_code, channels)
+
+    load_task = page.run_task(load)
+
+def show_countries(page: ft.Page, name_to_code: dict, channels, snapshot=None):
+    """Show the country grid and fill it in as (group, channel) records stream in.
+
+    The streamed catalog is imported into the catalog database once complete.
+    With channels=None the catalog is already there and is read from it instead,
+    or from snapshot, if given, until a refresh changes the catalog.
+    """
+    from catalog_db import get_catalog_db
+    from catalog_loader import cached_catalog_digest, CatalogLoadError
+    from catalog_refresh import get_refresher
+    from catalog_snapshot import compile_in_background
+
+    fill_task = None
+    refresher = get_refresher()
+
+    def go_back(e):
+        if fill_task:
+            fill_task.cancel()
+        unsubscribe()
+        main_view(page)
+
+    streaming_ring = ft.ProgressRing(width=20, height=20, stroke_width=2)
+    catalog = get_catalog_db()
+    # Global search queries the database, so it waits for the import.
+    imported = channels is None and (snapshot is None or snapshot.digest == catalog.digest())
+    search_debouncer = Debouncer(page, lambda query: run_search(query))
+
+    global_search = ft.TextField(
+        label="Search all channels",
+        width=300,
+        bgcolor=ft.Colors.WHITE,
+        color=ft.Colors.BLACK,
+        disabled=not imported,
+        on_change=lambda e: search_debouncer(e.control.value)
+    )
 
     top_bar = ft.Row(
         controls=[
             ft.IconButton(
                 icon=ft.Icons.ARROW_BACK,
                 icon_color=ft.Colors.WHITE,
-                on_click=lambda e: main_view(page),
+                on_click=go_back,
             ),
-            ft.Image(src="https://store-images.s-microsoft.com/image/apps.16279.13585032091773240.4bccec73-8553-4cf4-9cd6-1461f6ab35d9.36817858-a9fd-4617-af4e-7dd2aca3c698?h=210", height=40)
+            ft.Image(src=LOGO_URL, height=40),
+            streaming_ring,
+            global_search,
         ],
         alignment=ft.MainAxisAlignment.START,
         spacing=10
@@ -132,61 +223,267 @@ def live_view(page: ft.Page):
         expand=True,
     )
 
-    for country in sorted(country_channels.keys()):
-        code = name_to_code.get(country)
-        flag_url = f"https://flagcdn.com/36x27/{code}.png"
-        country_container = ft.Container(
-            content=ft.Column(
-                controls=[
-                    ft.Image(src=flag_url, width=36, height=27),
-                    ft.Text(country, size=16, color=ft.Colors.WHITE, text_align=ft.TextAlign.CENTER)
-                ],
-                alignment=ft.MainAxisAlignment.CENTER,
-                horizontal_alignment=ft.CrossAxisAlignment.CENTER,
-                spacing=5
-            ),
-            padding=5,
-            bgcolor=ft.Colors.BLUE,
-            border_radius=5,
-            alignment=ft.alignment.center,
-            on_click=lambda e, cnt=country: show_country_channels(page, cnt, country_channels[cnt]),
-        )
-        country_grid.controls.append(country_container)
+    results_label = ft.Text("", color=ft.Colors.WHITE)
+    previous_button = ft.TextButton("Previous", on_click=lambda e: show_results(results_page - 1))
+    next_button = ft.TextButton("Next", on_click=lambda e: show_results(results_page + 1))
+    results_grid = ft.GridView(
+        runs_count=6,
+        child_aspect_ratio=0.8,
+        spacing=10,
+        padding=10,
+        expand=True,
+    )
+    result_tiles = LazyGrid(
+        results_grid,
+        lambda: make_channel_tile(
+            lambda e: show_country_channels(page, f"Search: {query}", results, autoplay=e.control.data, on_back=restore)
+        ),
+        bind_channel_tile,
+        batch_size=RESULTS_PAGE_SIZE,
+    )
+    results_view = ft.Column(
+        controls=[
+            ft.Row(controls=[results_label, previous_button, next_button], spacing=10),
+            results_grid
+        ],
+        visible=False,
+        expand=True
+    )
 
     page_content = ft.Column(
         controls=[
             top_bar,
-            country_grid
+            country_grid,
+            results_view
         ],
         spacing=20,
         expand=True
     )
 
+    query = ""
+    results_page = 0
+    results = ChannelList()
+
+    def show_results(page_number):
+        nonlocal results_page, results
+        results_page = page_number
+        total, found = catalog.search(query, page_number)
+        results = ChannelList(found)
+        result_tiles.set_items(results)
+        results_label.value = f"{total} channels"
+        previous_button.disabled = page_number == 0
+        next_button.disabled = (page_number + 1) * RESULTS_PAGE_SIZE >= total
+        schedule_update(page, page_content)
+
+    def run_search(value):
+        nonlocal query
+        query = value.strip()
+        country_grid.visible = not query
+        results_view.visible = bool(query)
+        if query:
+            show_results(0)
+        else:
+            schedule_update(page, page_content)
+
+    def restore():
+        # Coming back from a channel view: reattach the grid as it was instead of
+        # reloading the catalog and rebuilding every tile.
+        page.title = "Country Channel Selector"
+        page.scroll = "auto"
+        page.controls.clear()
+        page.controls.append(page_content)
+        schedule_update(page)
+
+    store = ChannelStore()
+    country_names = []
+
+    def channels_for(country):
+        # While streaming the rows are already in memory; otherwise map or fetch
+        # just this country's, which also picks up refreshes.
+        if snapshot is not None:
+            return snapshot.group(country)
+        return catalog.group(country) if imported else store.group(country)
+
+    country_tiles = LazyGrid(
+        country_grid,
+        lambda: make_country_tile(
+            lambda e: show_country_channels(
+                page, e.control.data, channels_for(e.control.data), on_back=restore, group=e.control.data
+            )
+        ),
+        lambda tile, country: bind_country_tile(tile, country, name_to_code.get(country)),
+        batch_size=90,
+    )
+
+    def add_country(country):
+        index = bisect.bisect(country_names, country)
+        if index and country_names[index - 1] == country:
+            return
+        country_names.insert(index, country)
+        country_tiles.insert(index, country)
+
+    def apply_delta(delta):
+        nonlocal snapshot, imported
+        # The database now holds a newer catalog than the snapshot.
+        snapshot = None
+        if not imported:
+            imported = True
+            global_search.disabled = False
+            if page_content in page.controls:
+                schedule_update(page, global_search)
+        name_to_code.update(delta.codes)
+        for country in delta.removed_groups:
+            if country in country_names:
+                country_names.remove(country)
+                country_tiles.remove(country)
+        for country in delta.added_groups:
+            add_country(country)
+        for country in delta.codes:
+            # Existing groups whose code changed need their flag redrawn.
+            country_tiles.rebind(country)
+        if delta.added_groups or delta.removed_groups or delta.codes:
+            if page_content in page.controls:
+                schedule_update(page, country_grid)
+
+    unsubscribe = refresher.subscribe(apply_delta, page)
+
+    async def fill():
+        nonlocal imported
+        metrics = get_metrics()
+        importer = catalog.importer(name_to_code)
+        started = time.monotonic()
+        try:
+            # Held until the import commits so a refresh landing meanwhile applies after it.
+            async with refresher.lock:
+                async for country, channel in channels:
+                    if store.add(country, channel):
+                        add_country(country)
+                        # Groups added within a frame go out in one grid update.
+                        schedule_update(page, country_grid)
+                    importer.add(country, channel)
+                metrics.observe("catalog_load_seconds", time.monotonic() - started)
+                # One transaction, off the UI thread.
+                with metrics.timer("catalog_import_seconds"):
+                    await asyncio.to_thread(importer.commit, cached_catalog_digest())
+        except CatalogLoadError as e:
+            metrics.increment("catalog_errors_total")
+            page_content.controls.append(ft.Text(str(e), color=ft.Colors.WHITE))
+        else:
+            imported = True
+            global_search.disabled = False
+            compile_in_background()
+        finally:
+            streaming_ring.visible = False
+            schedule_update(page)
+
+    if channels is None:
+        country_names.extend(sorted(name_to_code))
+        country_tiles.set_items(country_names)
+        streaming_ring.visible = False
+
     page.controls.clear()
     page.controls.append(page_content)
     page.update()
+    if channels is not None:
+        fill_task = page.run_task(fill)
+    return page_content
+
+def make_channel_tile(on_click, on_hover=None):
+    return ft.Container(
+        content=ft.Column(
+            controls=[
+                ft.Image(width=64, height=64, fit=ft.ImageFit.COVER),
+                ft.Text(size=14, color=ft.Colors.WHITE, text_align=ft.TextAlign.CENTER)
+            ],
+            alignment=ft.MainAxisAlignment.CENTER,
+            horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+            spacing=5
+        ),
+        padding=5,
+        bgcolor=ft.Colors.GREY_900,
+        border_radius=10,
+        alignment=ft.alignment.center,
+        on_click=on_click,
+        on_hover=on_hover
+    )
+
+def bind_channel_tile(tile, channel):
+    from image_cache import get_image_cache
+
+    image, label = tile.content.controls
+    get_image_cache().attach(image, channel.logo, 64, 64)
+    label.value = channel.name
+    tile.data = channel
+
+def make_country_tile(on_click):
+    return ft.Container(
+        content=ft.Column(
+            controls=[
+                ft.Image(width=36, height=27),
+                ft.Text(size=16, color=ft.Colors.WHITE, text_align=ft.TextAlign.CENTER)
+            ],
+            alignment=ft.MainAxisAlignment.CENTER,
+            horizontal_alignment=ft.CrossAxisAlignment.CENTER,
+            spacing=5
+        ),
+        padding=5,
+        bgcolor=ft.Colors.BLUE,
+        border_radius=5,
+        alignment=ft.alignment.center,
+        on_click=on_click,
+    )
+
+def bind_country_tile(tile, country, code):
+    from image_cache import get_image_cache
+
+    flag, label = tile.content.controls
+    # Groups without a code get the placeholder rather than a request that can only fail.
+    get_image_cache().attach(flag, f"https://flagcdn.com/36x27/{code}.png" if code else "", 36, 27)
+    label.value = country
+    tile.data = country
+
+def show_country_channels(page: ft.Page, country: str, channels, autoplay=None, on_back=None, group=None):
+    from catalog_db import get_catalog_db
+    from catalog_refresh import get_refresher
+    from hls_relay import relay_url
+    from multiview import LAYOUTS, MultiView
+    from stream_health import STATUS_DEAD, STATUS_OK, get_health_store, health_rank, is_offline, probe_channels
+    from timeshift import close_timeshift, get_timeshift, stop_timeshift
+    from zap_prefetch import get_prefetcher, swap_media
 
-def show_country_channels(page: ft.Page, country: str, channels: list):
     page.title = f"Channels - {country}"
     page.bgcolor = "#090B7C"
     page.padding = 20
     page.scroll = None  # غیرفعال کردن اسکرول کل صفحه
 
     def show_message(message):
-        page.snackbar = ft.SnackBar(content=ft.Text(message))
-        page.update()
+        page.open(ft.SnackBar(content=ft.Text(message)))
 
     if not channels:
         page.add(ft.Text(f"No channels found for {country}", color=ft.Colors.WHITE))
         page.update()
         return
 
+    probe_task = None
+
+    def go_back(e):
+        if probe_task:
+            probe_task.cancel()
+        unsubscribe()
+        close_timeshift(page)
+        if multiview is not None:
+            multiview.stop()
+        if on_back:
+            on_back()
+        else:
+            live_view(page)
+
     top_bar = ft.Row(
         controls=[
             ft.IconButton(
                 icon=ft.Icons.ARROW_BACK,
                 icon_color=ft.Colors.WHITE,
-                on_click=lambda e: live_view(page),
+                on_click=go_back,
             ),
             ft.Text(f"{country}", size=20, color=ft.Colors.WHITE, weight=ft.FontWeight.BOLD)
         ],
@@ -194,12 +491,55 @@ def show_country_channels(page: ft.Page, country: str, channels: list):
         spacing=10
     )
 
+    search_index = SearchIndex(channels.names())
+    page.run_thread(search_index.build)
+    search_debouncer = Debouncer(page, lambda query: update_channel_list(query))
+
     search_field = ft.TextField(
         label="Search Channels",
         width=300,
         bgcolor=ft.Colors.WHITE,
         color=ft.Colors.BLACK,
-        on_change=lambda e: update_channel_list(e.control.value)
+        on_change=lambda e: search_debouncer(e.control.value)
+    )
+
+    # Results from earlier probes; channels probed in this view are added as they finish.
+    health_store = get_health_store()
+    health = health_store.lookup(channel.url for channel in channels)
+
+    hide_offline = ft.Checkbox(
+        label="Hide offline",
+        value=False,
+        label_style=ft.TextStyle(color=ft.Colors.WHITE),
+        on_change=lambda e: update_channel_list(search_field.value or "")
+    )
+
+    # Records the playing channel so it can be paused and rewound; toggling
+    # it re-tunes the channel onto or off the recording.
+    time_shift = ft.Checkbox(
+        label="Time-shift",
+        value=False,
+        label_style=ft.TextStyle(color=ft.Colors.WHITE),
+        on_change=lambda e: playing and multiview is None and play_channel(playing)
+    )
+
+    # Probing sends a request to every channel not checked lately, so it only
+    # runs when asked for.
+    check_streams = ft.TextButton(
+        "Check streams",
+        icon=ft.Icons.NETWORK_CHECK,
+        style=ft.ButtonStyle(color=ft.Colors.WHITE),
+        on_click=lambda e: start_health_check()
+    )
+
+    view_mode = ft.Dropdown(
+        label="View",
+        value="Single",
+        width=110,
+        options=[ft.dropdown.Option("Single"), *(ft.dropdown.Option(layout) for layout in LAYOUTS)],
+        bgcolor=ft.Colors.WHITE,
+        color=ft.Colors.BLACK,
+        on_change=lambda e: set_view_mode(e.control.value)
     )
 
     progress_bar = ft.ProgressBar(
@@ -237,71 +577,143 @@ def show_country_channels(page: ft.Page, country: str, channels: list):
         col={"xs": 12, "md": 4}
     )
 
-    def update_channel_list(search_query: str):
-        channel_grid.controls.clear()
-        filtered_channels = [
-            channel for channel in channels
-            if search_query.lower() in channel["name"].lower() or not search_query
-        ]
-        for channel in filtered_channels:
-            logo_src = channel["logo"] if channel["logo"] and channel["logo"].strip() else "https://via.placeholder.com/64"
-            def play_channel(e, url=channel["url"]):
-                progress_bar.visible = True
-                video_player.content = ft.Column(
-                    controls=[progress_bar],
-                    alignment=ft.MainAxisAlignment.CENTER
-                )
-                page.update()
-
-                video_player.content = Video(
-                    expand=True,
-                    playlist=[VideoMedia(url)],
-                    playlist_mode=ft.PlaylistMode.LOOP,
-                    autoplay=True,
-                    volume=100,
-                    aspect_ratio=16/9,
-                    show_controls=True,
-                    filter_quality=ft.FilterQuality.HIGH,
-                    muted=False,
-                    on_enter_fullscreen=lambda e: show_message("Video entered fullscreen!"),
-                    on_exit_fullscreen=lambda e: show_message("Video exited fullscreen!"),
-                    on_loaded=lambda e: (
-                        setattr(progress_bar, "visible", False),
-                        page.update()
-                    ),
-                    on_error=lambda e: (
-                        setattr(video_player, "content", ft.Text(f"Playback error: {e.data}", color=ft.Colors.RED)),
-                        page.update()
-                    )
-                )
-                page.update()
-
-            channel_container = ft.Container(
-                content=ft.Column(
-                    controls=[
-                        ft.Image(src=logo_src, width=64, height=64, fit=ft.ImageFit.COVER),
-                        ft.Text(channel["name"], size=14, color=ft.Colors.WHITE, text_align=ft.TextAlign.CENTER)
-                    ],
-                    alignment=ft.MainAxisAlignment.CENTER,
-                    horizontal_alignment=ft.CrossAxisAlignment.CENTER,
-                    spacing=5
-                ),
-                padding=5,
-                bgcolor=ft.Colors.GREY_900,
-                border_radius=10,
-                alignment=ft.alignment.center,
-                on_click=play_channel
+    channel_tiles = LazyGrid(
+        channel_grid,
+        lambda: make_channel_tile(lambda e: play_channel(e.control.data), on_hover=prefetch_hovered),
+        bind_channel_tile,
+        scroller=scrollable_channel_column,
+    )
+
+    prefetcher = get_prefetcher()
+    metrics = get_metrics()
+    player = None
+    playing = None
+    # The multi-view grid while a 2x2/3x3 view is picked, else None.
+    multiview = None
+    # Click time of the zap still waiting for the player to report it started,
+    # and whether that zap built a new player or switched the running one.
+    play_started = None
+    play_mode = "new"
+
+    def loaded():
+        nonlocal play_started
+        if play_started is not None:
+            metrics.play_loaded(playing.name, time.perf_counter() - play_started, play_mode)
+            play_started = None
+
+    async def record_health(url, status):
+        # A commit to config.db; keep it off the UI loop.
+        await asyncio.to_thread(health_store.record, url, status)
+
+    def on_player_loaded(e):
+        loaded()
+        page.run_task(record_health, playing.url, STATUS_OK)
+        progress_bar.visible = False
+        schedule_update(page, progress_bar)
+
+    def on_player_error(e):
+        nonlocal player, play_started
+        play_started = None
+        metrics.play_failed(playing.name, str(e.data))
+        page.run_task(record_health, playing.url, STATUS_DEAD)
+        player = None
+        video_player.content = ft.Text(f"Playback error: {e.data}", color=ft.Colors.RED)
+        schedule_update(page, video_player)
+
+    def play_channel(channel):
+        nonlocal player, playing, play_started, play_mode
+        # The video plugin is the slowest import of all; nothing needs it until now.
+        from flet_video import Video, VideoMedia
+
+        playing = channel
+        if multiview is not None:
+            multiview.add(channel)
+            prefetcher.prefetch_around(channel_tiles, channel_tiles.index(channel), page=page)
+            return
+        play_started = time.perf_counter()
+        play_mode = "new" if player is None else "switch"
+        metrics.play_started(channel.name)
+        if time_shift.value:
+            url, http_headers = get_timeshift(page).play_url(prefetcher.play_url(channel), channel.http_headers or None, page)
+        else:
+            stop_timeshift(page)
+            # Through the local relay, so re-tunes and other players share its segment cache.
+            url, http_headers = relay_url(prefetcher.play_url(channel), channel.http_headers or None, page)
+        media = VideoMedia(url, http_headers=http_headers)
+        if player is not None:
+            # Keep the running player and swap its media rather than building a
+            # new control; the previous item is dropped once the new one is current.
+            swap_media(player, media)
+        else:
+            player = Video(
+                expand=True,
+                playlist=[media],
+                playlist_mode=ft.PlaylistMode.LOOP,
+                autoplay=True,
+                volume=100,
+                aspect_ratio=16/9,
+                show_controls=True,
+                filter_quality=ft.FilterQuality.HIGH,
+                muted=False,
+                on_enter_fullscreen=lambda e: show_message("Video entered fullscreen!"),
+                on_exit_fullscreen=lambda e: show_message("Video exited fullscreen!"),
+                on_loaded=on_player_loaded,
+                on_track_changed=lambda e: loaded(),
+                on_error=on_player_error
             )
-            channel_grid.controls.append(channel_container)
-        page.update()
+            video_player.content = player
+            schedule_update(page, video_player)
+        # The next zap is most likely to a neighbour in the grid.
+        prefetcher.prefetch_around(channel_tiles, channel_tiles.index(channel), page=page)
+
+    def set_view_mode(mode):
+        nonlocal multiview, player
+        if mode in LAYOUTS:
+            if multiview is None:
+                from flet_video import Video, VideoMedia
+
+                # The single player and its recording make way for the grid.
+                stop_timeshift(page)
+                player = None
+                multiview = MultiView(page, Video, VideoMedia, mode)
+                if playing:
+                    multiview.add(playing)
+            else:
+                multiview.set_layout(mode)
+            video_player.content = multiview.control
+            schedule_update(page, video_player)
+        elif multiview is not None:
+            multiview.stop()
+            multiview = None
+            if playing:
+                play_channel(playing)
+            else:
+                video_player.content = ft.Text("Select a channel to play", color=ft.Colors.WHITE, size=16)
+                schedule_update(page, video_player)
+
+    def prefetch_hovered(e):
+        if e.data == "true":
+            prefetcher.prefetch(e.control.data, page)
+
+    def visible_channels(search_query: str):
+        found = (channels[position] for position in search_index.search(search_query))
+        if hide_offline.value:
+            found = (channel for channel in found if not is_offline(health, channel))
+        # Stable sort: live channels first, unprobed next, offline last, each in playlist order.
+        return sorted(found, key=lambda channel: health_rank(health, channel))
 
-    update_channel_list("")
+    def update_channel_list(search_query: str):
+        channel_tiles.set_items(visible_channels(search_query))
+        # Only the grid changed; don't walk and diff the whole page.
+        schedule_update(page, channel_grid)
+
+    channel_tiles.set_items(visible_channels(""))
 
     page_content = ft.Column(
         controls=[
             top_bar,
             ft.Row(
-                controls=[search_field],
+                controls=[search_field, hide_offline, check_streams, time_shift, view_mode],
                 alignment=ft.MainAxisAlignment.CENTER,
                 spacing=10
             ),
@@ -323,6 +735,45 @@ def show_country_channels(page: ft.Page, country: str, channels: list):
     page.controls.append(page_content)
     page.update()
 
+    def apply_delta(delta):
+        # A refresh touched this country: reload its rows but leave the player alone.
+        nonlocal channels, search_index
+        if group not in delta.changed_groups:
+            return
+        channels = get_catalog_db().group(group)
+        search_index = SearchIndex(channels.names())
+        page.run_thread(search_index.build)
+        health.update(health_store.lookup(channel.url for channel in channels))
+        channel_tiles.set_items(visible_channels(search_field.value or ""))
+        if page_content in page.controls:
+            schedule_update(page, channel_grid)
+
+    unsubscribe = get_refresher().subscribe(apply_delta, page) if group else lambda: None
+
+    def remember(channel, status):
+        health[channel.url] = (status, None, None)
+
+    async def check_health():
+        nonlocal probe_task
+        try:
+            await probe_channels(channels, health_store, on_result=remember)
+            # Re-sort once at the end rather than reshuffling tiles under the user.
+            update_channel_list(search_field.value or "")
+        finally:
+            probe_task = None
+            check_streams.disabled = False
+            schedule_update(page, check_streams)
+
+    def start_health_check():
+        nonlocal probe_task
+        if probe_task is None:
+            check_streams.disabled = True
+            schedule_update(page, check_streams)
+            probe_task = page.run_task(check_health)
+
+    if autoplay:
+        play_channel(autoplay)
+
 def main_view(page: ft.Page):
     page.bgcolor = "#090B7C"
     page.padding = 20
@@ -330,7 +781,7 @@ def main_view(page: ft.Page):
     clock = RealTimeClock()
 
     logo = ft.Image(
-        src="https://store-images.s-microsoft.com/image/apps.16279.13585032091773240.4bccec73-8553-4cf4-9cd6-1461f6ab35d9.36817858-a9fd-4617-af4e-7dd2aca3c698?h=210",
+        src=LOGO_URL,
         width=128,
         border_radius=10,
         fit=ft.ImageFit.CONTAIN,
@@ -454,6 +905,7 @@ def main_view(page: ft.Page):
         alignment=ft.alignment.center,
         padding=10,
         col={"xs": 12, "sm": 4},
+        on_click=lambda e: update_channels(page),
     )
 
     info_row = ft.ResponsiveRow(
@@ -464,7 +916,13 @@ def main_view(page: ft.Page):
 
     header_row = ft.ResponsiveRow(
         controls=[
-            ft.Container(content=logo, alignment=ft.alignment.center_left, col={"xs": 6}),
+            ft.Container(
+                content=logo,
+                alignment=ft.alignment.center_left,
+                col={"xs": 6},
+                # Hidden entry point to the metrics screen.
+                on_long_press=lambda e: open_debug_view(page),
+            ),
             ft.Container(content=clock, alignment=ft.alignment.center_right, expand=True, col={"xs": 6}),
         ],
         alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
@@ -505,11 +963,54 @@ def main_view(page: ft.Page):
     page.controls.append(content)
     page.update()
 
+def open_debug_view(page: ft.Page):
+    from debug_view import show_debug_view
+
+    show_debug_view(page, lambda: main_view(page))
+
+def show_shell(page: ft.Page):
+    """First frame: background and logo only, so the window isn't blank while the rest builds"""
+    page.bgcolor = "#090B7C"
+    page.padding = 20
+    page.controls.clear()
+    page.controls.append(
+        ft.Container(
+            content=ft.Image(src=LOGO_URL, width=128, border_radius=10, fit=ft.ImageFit.CONTAIN),
+            alignment=ft.alignment.center_left,
+        )
+    )
+    page.update()
+
+def warm_up():
+    """Import the live-TV modules ahead of the first tap on LIVE"""
+    for name in WARMUP_MODULES:
+        importlib.import_module(name)
+
+async def hydrate(page: ft.Page):
+    # Give the shell a chance to go out before building the home screen.
+    await asyncio.sleep(0)
+    main_view(page)
+    await asyncio.sleep(WARMUP_DELAY)
+    await asyncio.to_thread(warm_up)
+    from catalog_refresh import get_refresher
+
+    get_refresher().start(page)
+
 async def main(page: ft.Page):
     page.title = "Smarters Player Lite"
     page.scroll = ft.ScrollMode.AUTO
     page.main_view = lambda: main_view(page)
-    main_view(page)
+    show_shell(page)
+    page.run_task(hydrate, page)
+
+def shutdown():
+    """Stop the HLS relay if it was ever started; it would leave its segment files behind"""
+    relay = sys.modules.get("hls_relay")
+    if relay is not None:
+        relay.stop_relay()
 
 if __name__ == "__main__":
-    ft.app(target=main)
+    try:
+        ft.app(target=main, assets_dir="assets")
+    finally:
+        shutdown()
@@ -0,0 +1,196 @@
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+# Upper bounds in seconds, spanning a fast grid update up to a slow catalog download.
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+QUANTILES = (0.5, 0.95, 0.99)
+# Per-channel playback stats kept for the channels used most recently.
+MAX_TRACKED_CHANNELS = 500
+PROMETHEUS_PREFIX = "smarters_"
+
+
+class Histogram:
+    """Fixed-bucket histogram; quantiles are interpolated within a bucket"""
+
+    __slots__ = ("counts", "sum", "count", "max")
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float):
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            if count and seen + count >= rank:
+                lower = BUCKETS[index - 1] if index else 0.0
+                upper = BUCKETS[index] if index < len(BUCKETS) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / count, self.max)
+            seen += count
+        return self.max
+
+    def as_dict(self):
+        summary = {"count": self.count, "sum": round(self.sum, 6), "max": round(self.max, 6)}
+        for q in QUANTILES:
+            summary[f"p{round(q * 100)}"] = round(self.quantile(q), 6)
+        summary["buckets"] = dict(zip(map(str, BUCKETS + (math.inf,)), self.counts))
+        return summary
+
+
+class Metrics:
+    """In-process timings and counters for the catalog, the grids and playback.
+
+    Histograms and counters are keyed by name plus a small set of labels.
+    Playback is also tracked per channel (attempts, errors, load times), for the
+    MAX_TRACKED_CHANNELS most recently played channels. Per-channel stats only
+    go into the JSON snapshot, to keep the Prometheus export's cardinality low.
+    """
+
+    def __init__(self, max_channels=MAX_TRACKED_CHANNELS):
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._channels = OrderedDict()
+        self._max_channels = max_channels
+
+    @staticmethod
+    def _key(name, labels):
+        return name, tuple(sorted(labels.items()))
+
+    def observe(self, name: str, seconds: float, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def increment(self, name: str, amount=1, **labels):
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    @contextmanager
+    def timer(self, name: str, **labels):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - started, **labels)
+
+    def _channel(self, channel: str):
+        stats = self._channels.pop(channel, None)
+        if stats is None:
+            stats = {"attempts": 0, "loaded": 0, "errors": 0, "load_seconds": 0.0, "last_error": None}
+            if len(self._channels) >= self._max_channels:
+                self._channels.popitem(last=False)
+        self._channels[channel] = stats
+        return stats
+
+    def play_started(self, channel: str):
+        self.increment("play_attempts_total")
+        with self._lock:
+            self._channel(channel)["attempts"] += 1
+
+    def play_loaded(self, channel: str, seconds: float, mode: str):
+        self.observe("play_start_seconds", seconds, mode=mode)
+        with self._lock:
+            stats = self._channel(channel)
+            stats["loaded"] += 1
+            stats["load_seconds"] += seconds
+
+    def play_failed(self, channel: str, error: str):
+        self.increment("play_errors_total")
+        with self._lock:
+            stats = self._channel(channel)
+            stats["errors"] += 1
+            stats["last_error"] = error
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "generated_at": time.time(),
+                "histograms": [
+                    {"name": name, "labels": dict(labels), **histogram.as_dict()}
+                    for (name, labels), histogram in sorted(self._histograms.items())
+                ],
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self._counters.items())
+                ],
+                "channels": {
+                    channel: {**stats, "load_seconds": round(stats["load_seconds"], 6)}
+                    for channel, stats in self._channels.items()
+                },
+            }
+
+    def to_json(self):
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Snapshot in the Prometheus text exposition format, for node_exporter's textfile collector"""
+        lines = []
+        snapshot = self.snapshot()
+        typed = set()
+        for entry in snapshot["histograms"]:
+            name = PROMETHEUS_PREFIX + entry["name"]
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} histogram")
+            cumulative = 0
+            for bound, count in entry["buckets"].items():
+                cumulative += count
+                le = "+Inf" if bound == "inf" else bound
+                lines.append(f"{name}_bucket{format_labels({**entry['labels'], 'le': le})} {cumulative}")
+            lines.append(f"{name}_sum{format_labels(entry['labels'])} {entry['sum']}")
+            lines.append(f"{name}_count{format_labels(entry['labels'])} {entry['count']}")
+        for entry in snapshot["counters"]:
+            name = PROMETHEUS_PREFIX + entry["name"]
+            if name not in typed:
+                typed.add(name)
+                lines.append(f"# TYPE {name} counter")
+            lines.append(f"{name}{format_labels(entry['labels'])} {entry['value']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path: str):
+        """Write a snapshot to path atomically; .prom files get the Prometheus format, anything else JSON"""
+        text = self.to_prometheus() if path.endswith(".prom") else self.to_json()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with open(path + ".tmp", "w", encoding="utf-8") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+        return path
+
+
+def format_labels(labels: dict):
+    parts = []
+    for key, value in labels.items():
+        value = str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        parts.append(f'{key}="{value}"')
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+_metrics = None
+
+
+def get_metrics():
+    global _metrics
+    if _metrics is None:
+        _metrics = Metrics()
+    return _metrics
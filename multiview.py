@@ -0,0 +1,278 @@
+import os
+import threading
+import flet as ft
+import requests
+from hls_relay import is_hls_url, relay_url
+from catalog_loader import get_session
+from ui_updates import schedule_update
+from zap_prefetch import PREFETCH_CONNECT_TIMEOUT, PREFETCH_READ_TIMEOUT, bandwidth, media_lines, swap_media
+
+LAYOUTS = {"2x2": 2, "3x3": 3}
+# What every playing tile together may pull, in bits per second, and how many
+# streams may decode at once. Low-end devices run out of CPU before bandwidth.
+MULTIVIEW_BANDWIDTH_BUDGET = int(os.getenv("SMARTERS_MULTIVIEW_BUDGET_KBPS", "8000")) * 1000
+MULTIVIEW_MAX_DECODES = int(os.getenv("SMARTERS_MULTIVIEW_MAX_DECODES", "4"))
+# Assumed for streams whose playlists don't declare a BANDWIDTH.
+DEFAULT_BANDWIDTH = 3_000_000
+FOCUS_COLOR = ft.Colors.AMBER
+
+
+def fetch_variants(url: str, headers=None):
+    """[(bandwidth, uri)] of url's HLS variants, lowest first; [(0, url)] if it has none to choose from"""
+    if not is_hls_url(url):
+        return [(0, url)]
+    try:
+        response = get_session().get(url, headers=headers, timeout=(PREFETCH_CONNECT_TIMEOUT, PREFETCH_READ_TIMEOUT))
+        response.raise_for_status()
+        text = response.text
+    except requests.RequestException:
+        return [(0, url)]
+    variants = sorted(
+        (bandwidth(tag), uri) for tag, uri in media_lines(text, response.url) if tag.startswith("#EXT-X-STREAM-INF")
+    )
+    return variants or [(0, url)]
+
+
+def cost(variant):
+    return variant[0] or DEFAULT_BANDWIDTH
+
+
+class BudgetScheduler:
+    """Decides which multi-view tiles play, and at which variant.
+
+    Tiles are admitted in priority order: the focused one, then the unmuted
+    ones, then the muted ones, each in grid order. Each admitted tile gets
+    its lowest variant, for as long as the total stays within budget and
+    fewer than max_decodes streams play. Whatever budget is left then goes
+    to the focused tile, as the highest variant it pays for. Tiles that
+    aren't admitted, or aren't on screen, get no variant. The focused tile
+    always plays, even alone over budget.
+    """
+
+    def __init__(self, budget=MULTIVIEW_BANDWIDTH_BUDGET, max_decodes=MULTIVIEW_MAX_DECODES):
+        self.budget = budget
+        self.max_decodes = max_decodes
+
+    def plan(self, tiles, focused):
+        """The (bandwidth, uri) each tile should play, or None to stop it"""
+        choices = [None] * len(tiles)
+        order = sorted(
+            (index for index, tile in enumerate(tiles) if tile.channel is not None and tile.visible and tile.variants),
+            key=lambda index: (index != focused, tiles[index].muted, index),
+        )
+        spent = 0
+        playing = 0
+        for index in order:
+            if playing >= self.max_decodes:
+                break
+            lowest = tiles[index].variants[0]
+            if playing and spent + cost(lowest) > self.budget:
+                continue
+            choices[index] = lowest
+            spent += cost(lowest)
+            playing += 1
+        if 0 <= focused < len(tiles) and choices[focused] is not None:
+            for variant in tiles[focused].variants:
+                if spent - cost(choices[focused]) + cost(variant) <= self.budget:
+                    spent += cost(variant) - cost(choices[focused])
+                    choices[focused] = variant
+        return choices
+
+
+class MultiViewTile:
+    __slots__ = (
+        "channel", "variants", "muted", "visible", "player", "playing", "paused", "control", "body", "title", "mute",
+        "notice",
+    )
+
+    def __init__(self):
+        self.channel = None
+        self.variants = None
+        self.muted = True
+        self.visible = True
+        self.player = None
+        self.playing = None
+        self.paused = False
+
+
+class MultiView:
+    """A grid of players for watching several channels at once.
+
+    add() puts a channel in the first empty tile, or in place of the focused
+    one when the grid is full. Clicking a tile focuses it; only the focused
+    tile has sound unless another is unmuted. After every change the
+    BudgetScheduler's plan is applied: tiles switch variant by swapping
+    their player's media. Tiles on screen that the plan leaves out are
+    paused where they are and resume when there is budget again; tiles
+    hidden by a smaller layout drop their player altogether, keep their
+    channel and pick up again when it grows back.
+
+    video and video_media are the player classes (flet_video's or ft's).
+    """
+
+    def __init__(self, page, video, video_media, layout="2x2", scheduler=None):
+        self.page = page
+        self._video = video
+        self._video_media = video_media
+        self.scheduler = scheduler or BudgetScheduler()
+        self.tiles = []
+        self.focused = 0
+        self.control = ft.Column(spacing=4)
+        # Variants resolve on worker threads, which reschedule too.
+        self._lock = threading.RLock()
+        self.set_layout(layout)
+
+    def set_layout(self, layout):
+        size = LAYOUTS[layout]
+        while len(self.tiles) < size * size:
+            self.tiles.append(self._make_tile(len(self.tiles)))
+        for index, tile in enumerate(self.tiles):
+            tile.visible = index < size * size
+        if not self.tiles[self.focused].visible:
+            self.focused = 0
+        self.control.controls = [
+            ft.Row(controls=[tile.control for tile in self.tiles[row * size:(row + 1) * size]], spacing=4)
+            for row in range(size)
+        ]
+        self.reschedule()
+
+    def _make_tile(self, index):
+        tile = MultiViewTile()
+        tile.title = ft.Text("", color=ft.Colors.WHITE, size=12, expand=True, no_wrap=True)
+        tile.mute = ft.IconButton(
+            icon=ft.Icons.VOLUME_OFF, icon_color=ft.Colors.WHITE, icon_size=16,
+            on_click=lambda e: self.toggle_mute(index),
+        )
+        tile.body = ft.Container(
+            content=ft.Text("Pick a channel", color=ft.Colors.WHITE54, size=12),
+            alignment=ft.alignment.center,
+            aspect_ratio=16/9,
+        )
+        tile.notice = ft.Container(
+            content=ft.Text("Paused to stay within the playback budget", color=ft.Colors.WHITE, size=12),
+            alignment=ft.alignment.center,
+            bgcolor=ft.Colors.BLACK54,
+            left=0, top=0, right=0, bottom=0,
+            visible=False,
+        )
+        tile.control = ft.Container(
+            content=ft.Column(
+                controls=[
+                    ft.Row(
+                        controls=[
+                            tile.title,
+                            tile.mute,
+                            ft.IconButton(
+                                icon=ft.Icons.CLOSE, icon_color=ft.Colors.WHITE, icon_size=16,
+                                on_click=lambda e: self.remove(index),
+                            ),
+                        ],
+                        spacing=0,
+                    ),
+                    tile.body,
+                ],
+                spacing=0,
+            ),
+            expand=True,
+            bgcolor=ft.Colors.BLACK,
+            border=ft.border.all(2, ft.Colors.TRANSPARENT),
+            on_click=lambda e: self.focus(index),
+        )
+        return tile
+
+    def add(self, channel):
+        visible = [index for index, tile in enumerate(self.tiles) if tile.visible]
+        index = next((index for index in visible if self.tiles[index].channel is None), self.focused)
+        self._stop(self.tiles[index])
+        tile = self.tiles[index]
+        tile.channel = channel
+        tile.variants = None
+        tile.title.value = channel.name
+        self.focused = index
+        self.page.run_thread(self._resolve, tile, channel)
+        self.reschedule()
+
+    def _resolve(self, tile, channel):
+        variants = fetch_variants(channel.url, channel.http_headers or None)
+        if tile.channel is channel:
+            tile.variants = variants
+            self.reschedule()
+
+    def focus(self, index):
+        self.focused = index
+        self.reschedule()
+
+    def toggle_mute(self, index):
+        tile = self.tiles[index]
+        tile.muted = not tile.muted
+        tile.mute.icon = ft.Icons.VOLUME_OFF if tile.muted else ft.Icons.VOLUME_UP
+        self.reschedule()
+
+    def remove(self, index):
+        tile = self.tiles[index]
+        self._stop(tile)
+        tile.channel = tile.variants = None
+        tile.title.value = ""
+        tile.body.content = ft.Text("Pick a channel", color=ft.Colors.WHITE54, size=12)
+        self.reschedule()
+
+    def stop(self):
+        """Stop every tile, e.g. when leaving the screen"""
+        for tile in self.tiles:
+            self._stop(tile)
+
+    def _stop(self, tile):
+        tile.player = tile.playing = None
+        tile.paused = False
+        tile.notice.visible = False
+
+    def _pause(self, tile):
+        if not tile.paused:
+            tile.player.pause()
+            tile.paused = True
+            tile.notice.visible = True
+
+    def reschedule(self):
+        with self._lock:
+            self._apply(self.scheduler.plan(self.tiles, self.focused))
+        schedule_update(self.page, self.control)
+
+    def _apply(self, plan):
+        for index, (tile, variant) in enumerate(zip(self.tiles, plan)):
+            tile.control.border = ft.border.all(2, FOCUS_COLOR if index == self.focused else ft.Colors.TRANSPARENT)
+            if tile.channel is None:
+                continue
+            if variant is None:
+                if tile.visible and tile.player is not None and tile.player.page is not None:
+                    # Over budget: stop it downloading and decoding, but keep it
+                    # where it is so it resumes as soon as there is room.
+                    self._pause(tile)
+                else:
+                    self._stop(tile)
+                    message = "Loading..." if tile.variants is None else "Paused to stay within the playback budget"
+                    tile.body.content = ft.Text(message, color=ft.Colors.WHITE54, size=12)
+                continue
+            volume = 100 if index == self.focused or not tile.muted else 0
+            if variant != tile.playing:
+                url, http_headers = relay_url(variant[1], tile.channel.http_headers or None, self.page)
+                media = self._video_media(url, http_headers=http_headers)
+                # A player that hasn't reached the client yet is simply replaced.
+                if tile.player is None or tile.player.page is None:
+                    tile.player = self._video(
+                        playlist=[media],
+                        playlist_mode=ft.PlaylistMode.LOOP,
+                        autoplay=True,
+                        volume=volume,
+                        aspect_ratio=16/9,
+                        show_controls=False,
+                    )
+                    tile.paused = tile.notice.visible = False
+                    tile.body.content = ft.Stack(controls=[tile.player, tile.notice])
+                else:
+                    # Same as a zap: swap the media instead of rebuilding the player.
+                    swap_media(tile.player, media)
+                tile.playing = variant
+            if tile.paused:
+                tile.player.play()
+                tile.paused = tile.notice.visible = False
+            tile.player.volume = volume
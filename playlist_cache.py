@@ -0,0 +1,229 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import threading
+import time
+
+CACHE_TTL = 6 * 60 * 60
+CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+
+def default_cache_dir(name="playlists"):
+    # Packaged Flet apps get a per-app cache directory through this variable.
+    base = os.getenv("FLET_APP_STORAGE_CACHE") or os.path.join(os.path.expanduser("~"), ".cache", "smarters_player")
+    return os.path.join(base, name)
+
+
+def pid_alive(pid: int):
+    """Whether process pid is still running"""
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        # os.kill() would terminate the process there rather than probe it.
+        import ctypes
+
+        kernel32 = ctypes.windll.kernel32
+        handle = kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        code = ctypes.c_ulong()
+        try:
+            return bool(kernel32.GetExitCodeProcess(handle, ctypes.byref(code))) and code.value == 259  # STILL_ACTIVE
+        finally:
+            kernel32.CloseHandle(handle)
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def remove_orphans(directory, pattern):
+    """Delete what processes that are gone left in directory; returns how many entries.
+
+    pattern is a regex matched against each entry's name, capturing the pid
+    of the process that owns it; anything it doesn't match is left alone.
+    """
+    removed = 0
+    try:
+        names = os.listdir(directory)
+    except OSError:
+        return removed
+    for name in names:
+        match = re.fullmatch(pattern, name)
+        if match is None or pid_alive(int(match.group(1))):
+            continue
+        path = os.path.join(directory, name)
+        try:
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            else:
+                os.remove(path)
+        except OSError:
+            continue
+        removed += 1
+    return removed
+
+
+class PlaylistCache:
+    """On-disk store of raw response bodies plus their validators (ETag / Last-Modified).
+
+    Entries older than ttl are still served but reported as stale so the caller can
+    revalidate them. Once the bodies on disk exceed max_bytes, the least recently
+    used entries are evicted.
+    """
+
+    def __init__(self, directory=None, ttl=CACHE_TTL, max_bytes=CACHE_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+        self._index_path = os.path.join(self.directory, "index.json")
+        self._index = self._load_index()
+
+    def _load_index(self):
+        try:
+            with open(self._index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_index(self):
+        tmp_path = self._index_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._index, f)
+        os.replace(tmp_path, self._index_path)
+
+    def _body_path(self, url):
+        return os.path.join(self.directory, hashlib.sha1(url.encode("utf-8")).hexdigest())
+
+    def get(self, url):
+        """Return the cached entry for url (metadata dict with a "body" key) or None"""
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is None:
+                return None
+            try:
+                with open(self._body_path(url), "rb") as f:
+                    body = f.read()
+            except OSError:
+                del self._index[url]
+                self._save_index()
+                return None
+            entry["accessed_at"] = time.time()
+            self._save_index()
+            return dict(entry, body=body)
+
+    def is_fresh(self, entry):
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    def validators(self, entry):
+        """Conditional request headers for revalidating entry"""
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def put(self, url, body, headers):
+        writer = self.writer(url, headers)
+        writer.write(body)
+        writer.commit()
+
+    def writer(self, url, headers):
+        """Start writing a new body for url chunk by chunk; nothing is visible until commit()"""
+        return CacheWriter(self, url, headers)
+
+    def _commit(self, url, tmp_path, size, digest, headers):
+        with self._lock:
+            os.replace(tmp_path, self._body_path(url))
+            now = time.time()
+            self._index[url] = {
+                "etag": headers.get("ETag"),
+                "last_modified": headers.get("Last-Modified"),
+                "size": size,
+                "sha1": digest,
+                "fetched_at": now,
+                "accessed_at": now,
+            }
+            self._evict(keep=url)
+            self._save_index()
+
+    def meta(self, url):
+        """Return the index entry for url without reading its body, or None"""
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is None or not os.path.exists(self._body_path(url)):
+                return None
+            return dict(entry)
+
+    def iter_body(self, url, chunk_size=64 * 1024):
+        """Yield the cached body for url in chunks"""
+        with self._lock:
+            if url in self._index:
+                self._index[url]["accessed_at"] = time.time()
+                self._save_index()
+        with open(self._body_path(url), "rb") as f:
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    break
+                yield chunk
+
+    def touch(self, url):
+        """Mark url as freshly validated after a 304 Not Modified"""
+        with self._lock:
+            if url in self._index:
+                self._index[url]["fetched_at"] = time.time()
+                self._save_index()
+
+    def _evict(self, keep=None):
+        total = sum(entry["size"] for entry in self._index.values())
+        for url, entry in sorted(self._index.items(), key=lambda item: item[1]["accessed_at"]):
+            if total <= self.max_bytes:
+                break
+            if url == keep:
+                continue
+            try:
+                os.remove(self._body_path(url))
+            except OSError:
+                pass
+            total -= entry["size"]
+            del self._index[url]
+
+
+class CacheWriter:
+    def __init__(self, cache, url, headers):
+        self._cache = cache
+        self._url = url
+        self._headers = headers
+        # A temp file of its own, so overlapping downloads of url can't write into each other.
+        fd, self._tmp_path = tempfile.mkstemp(suffix=".part", dir=cache.directory)
+        self._file = os.fdopen(fd, "wb")
+        self._hash = hashlib.sha1()
+        self._size = 0
+
+    def write(self, chunk):
+        self._file.write(chunk)
+        self._hash.update(chunk)
+        self._size += len(chunk)
+
+    def commit(self):
+        self._file.close()
+        digest = self._hash.hexdigest()
+        self._cache._commit(self._url, self._tmp_path, self._size, digest, self._headers)
+        return digest
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
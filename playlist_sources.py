@@ -0,0 +1,109 @@
+import sqlite3
+from urllib.parse import urlsplit
+from catalog_db import CONFIG_DB
+
+# Where a server from server_config serves its playlist.
+SERVER_PLAYLIST_PATH = "/playlist.m3u"
+# Priorities the default playlist and the configured servers are added
+# with. Lower numbers come first and win duplicates.
+DEFAULT_PRIORITY = 0
+SERVER_PRIORITY = 10
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS playlist_sources (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL UNIQUE,
+    priority INTEGER NOT NULL DEFAULT 0,
+    enabled INTEGER NOT NULL DEFAULT 1
+)
+"""
+
+
+def server_playlist_url(address: str, port: str):
+    """Playlist URL for a server_config row; ws/wss addresses map to http/https"""
+    parts = urlsplit(address if "://" in address else f"http://{address}")
+    scheme = {"ws": "http", "wss": "https"}.get(parts.scheme, parts.scheme)
+    host = parts.hostname or ""
+    port = port or parts.port
+    return f"{scheme}://{host}:{port}{SERVER_PLAYLIST_PATH}" if port else f"{scheme}://{host}{SERVER_PLAYLIST_PATH}"
+
+
+# Databases this process has created the table in, and seeded.
+_prepared = set()
+_seeded = set()
+
+
+def _connect(path):
+    conn = sqlite3.connect(path)
+    if path not in _prepared:
+        with conn:
+            conn.execute(_SCHEMA)
+        _prepared.add(path)
+    return conn
+
+
+def playlist_sources(default_url: str, path=CONFIG_DB):
+    """Enabled playlist URLs, highest priority first.
+
+    The sources are the rows of the playlist_sources table. default_url is
+    added, enabled, when the table is empty. A server in server_config is
+    only a guess at a playlist, so it is added switched off the first time
+    it is seen; set_source_enabled() opts into it. Both happen once per
+    process. With every row off the list is empty rather than falling back
+    to default_url.
+    """
+    conn = _connect(path)
+    try:
+        if path not in _seeded:
+            with conn:
+                if conn.execute("SELECT NOT EXISTS (SELECT 1 FROM playlist_sources)").fetchone()[0]:
+                    conn.execute(
+                        "INSERT INTO playlist_sources (url, priority) VALUES (?, ?)", (default_url, DEFAULT_PRIORITY)
+                    )
+                try:
+                    servers = conn.execute("SELECT address, port FROM server_config ORDER BY id").fetchall()
+                except sqlite3.OperationalError:
+                    servers = []
+                conn.executemany(
+                    "INSERT OR IGNORE INTO playlist_sources (url, priority, enabled) VALUES (?, ?, 0)",
+                    [(server_playlist_url(address, port), SERVER_PRIORITY) for address, port in servers],
+                )
+            _seeded.add(path)
+        rows = conn.execute("SELECT url FROM playlist_sources WHERE enabled ORDER BY priority, id").fetchall()
+    finally:
+        conn.close()
+    return [url for url, in rows]
+
+
+def add_source(url: str, priority=DEFAULT_PRIORITY, path=CONFIG_DB):
+    """Add an enabled source; a known one only has its priority changed"""
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT INTO playlist_sources (url, priority) VALUES (?, ?) "
+                "ON CONFLICT (url) DO UPDATE SET priority = excluded.priority",
+                (url, priority),
+            )
+    finally:
+        conn.close()
+
+
+def set_source_enabled(url: str, enabled: bool, path=CONFIG_DB):
+    """Switch a source on or off without forgetting it"""
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.execute("UPDATE playlist_sources SET enabled = ? WHERE url = ?", (int(enabled), url))
+    finally:
+        conn.close()
+
+
+def remove_source(url: str, path=CONFIG_DB):
+    """Forget a source; a server_config server's comes back switched off while the server is configured"""
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.execute("DELETE FROM playlist_sources WHERE url = ?", (url,))
+    finally:
+        conn.close()
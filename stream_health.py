@@ -0,0 +1,177 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+from catalog_db import CONFIG_DB
+
+PROBE_CONCURRENCY = 16
+PROBE_CONNECT_TIMEOUT = 3
+PROBE_READ_TIMEOUT = 5
+# Enough of the response to see the #EXTM3U header without downloading segments.
+PROBE_READ_BYTES = 4096
+# Results younger than this are trusted instead of probing the stream again.
+HEALTH_TTL = 6 * 60 * 60
+COMMIT_EVERY = 32
+
+STATUS_OK = "ok"
+STATUS_DEAD = "dead"
+STATUS_INVALID = "invalid"
+# Sort order for show_country_channels: live first, then unprobed, then offline.
+_RANK = {STATUS_OK: 0, None: 1, STATUS_INVALID: 2, STATUS_DEAD: 2}
+
+
+class HealthStore:
+    """Probe results per stream URL, kept in the channel_health table of config.db"""
+
+    def __init__(self, path=CONFIG_DB):
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS channel_health (
+                url TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                http_status INTEGER,
+                latency_ms INTEGER,
+                checked_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.commit()
+        self._pending = 0
+
+    def lookup(self, urls):
+        """Return {url: (status, latency_ms, checked_at)} for the urls that were probed"""
+        urls = list(urls)
+        found = {}
+        with self._lock:
+            # Stay below SQLite's bound-parameter limit.
+            for start in range(0, len(urls), 900):
+                batch = urls[start:start + 900]
+                rows = self._conn.execute(
+                    f"SELECT url, status, latency_ms, checked_at FROM channel_health "
+                    f"WHERE url IN ({','.join('?' * len(batch))})",
+                    batch,
+                )
+                for url, status, latency_ms, checked_at in rows:
+                    found[url] = (status, latency_ms, checked_at)
+        return found
+
+    def record(self, url, status, http_status=None, latency_ms=None, commit=True):
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO channel_health (url, status, http_status, latency_ms, checked_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (url, status, http_status, latency_ms, time.time()),
+            )
+            self._pending += 1
+            if commit or self._pending >= COMMIT_EVERY:
+                self._conn.commit()
+                self._pending = 0
+
+    def flush(self):
+        with self._lock:
+            self._conn.commit()
+            self._pending = 0
+
+    def dead_urls(self):
+        """URLs last seen offline, for shipping a pre-filtered playlist"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT url FROM channel_health WHERE status != ?", (STATUS_OK,)
+            )
+            return {url for (url,) in rows}
+
+
+_probe_session = None
+
+
+def get_probe_session():
+    """Session for probes, pooled for PROBE_CONCURRENCY of them at once"""
+    global _probe_session
+    if _probe_session is None:
+        _probe_session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=PROBE_CONCURRENCY, pool_maxsize=PROBE_CONCURRENCY)
+        _probe_session.mount("https://", adapter)
+        _probe_session.mount("http://", adapter)
+    return _probe_session
+
+
+def probe(url, headers=None):
+    """Fetch the start of a stream and return (status, http_status, latency_ms).
+
+    HLS URLs must answer with an #EXTM3U manifest; anything else only needs to
+    start sending data.
+    """
+    started = time.monotonic()
+    try:
+        response = get_probe_session().get(
+            url,
+            headers=headers,
+            timeout=(PROBE_CONNECT_TIMEOUT, PROBE_READ_TIMEOUT),
+            stream=True,
+        )
+        with response:
+            head = next(response.iter_content(PROBE_READ_BYTES), b"")
+    except requests.RequestException:
+        return STATUS_DEAD, None, None
+    latency_ms = round((time.monotonic() - started) * 1000)
+    if response.status_code >= 400:
+        return STATUS_DEAD, response.status_code, latency_ms
+    content_type = response.headers.get("Content-Type", "").lower()
+    if "mpegurl" in content_type or urlsplit(url).path.endswith(".m3u8"):
+        playable = head.lstrip(b"\xef\xbb\xbf \t\r\n").startswith(b"#EXTM3U")
+    else:
+        playable = bool(head)
+    return STATUS_OK if playable else STATUS_INVALID, response.status_code, latency_ms
+
+
+async def probe_channels(channels, store, concurrency=PROBE_CONCURRENCY, ttl=HEALTH_TTL, on_result=None):
+    """Probe every channel whose stored result is missing or older than ttl.
+
+    At most concurrency probes run at once. on_result(channel, status) is called
+    on the event loop as each one finishes.
+    """
+    known = await asyncio.to_thread(store.lookup, (channel.url for channel in channels))
+    now = time.time()
+    stale = [
+        channel for channel in channels
+        if channel.url and (channel.url not in known or now - known[channel.url][2] >= ttl)
+    ]
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def check(channel):
+        async with semaphore:
+            status, http_status, latency_ms = await asyncio.to_thread(probe, channel.url, channel.http_headers or None)
+            await asyncio.to_thread(store.record, channel.url, status, http_status, latency_ms, False)
+        if on_result:
+            on_result(channel, status)
+
+    try:
+        await asyncio.gather(*(check(channel) for channel in stale))
+    finally:
+        await asyncio.to_thread(store.flush)
+
+
+def health_rank(health, channel):
+    """Sort key putting live channels first and offline ones last"""
+    entry = health.get(channel.url)
+    return _RANK.get(entry and entry[0], 1)
+
+
+def is_offline(health, channel):
+    entry = health.get(channel.url)
+    return entry is not None and entry[0] != STATUS_OK
+
+
+_health_store = None
+
+
+def get_health_store():
+    global _health_store
+    if _health_store is None:
+        _health_store = HealthStore()
+    return _health_store
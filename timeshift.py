@@ -0,0 +1,422 @@
+import asyncio
+import itertools
+import math
+import os
+import re
+import threading
+from collections import deque
+from urllib.parse import urljoin, urlsplit
+import requests
+from hls_relay import (
+    MANIFEST_TYPE, UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT, get_relay, is_hls_url, relay_enabled, relay_url,
+)
+from metrics import get_metrics
+from playlist_cache import default_cache_dir, remove_orphans
+from ui_updates import on_disconnect
+from zap_prefetch import bandwidth, media_lines
+
+# How far back the playing channel can be rewound, as long as its segments
+# fit in TIMESHIFT_BYTES; at high bitrates the bytes run out first.
+TIMESHIFT_SECONDS = 30 * 60
+TIMESHIFT_BYTES = 512 * 1024 * 1024
+# How long the first playlist request waits for the recorder to store something.
+FIRST_SEGMENT_TIMEOUT = 15
+# Tags that apply to the segment after them and are kept with it.
+SEGMENT_TAGS = ("#EXT-X-DISCONTINUITY", "#EXT-X-PROGRAM-DATE-TIME")
+PREFIX = "/timeshift/"
+
+_URI_ATTRIBUTE_RE = re.compile(r'URI="([^"]*)"')
+# Numbers each Timeshift's ring file and relay path.
+_names = itertools.count(1)
+# Ring files are named after the process recording into them.
+RING_FILE_PATTERN = r"ring-(\d+)-\d+\.bin"
+
+
+def extension(uri: str):
+    """uri's file extension (".ts", ".m4s", ...), or "" """
+    name = urlsplit(uri).path.rsplit("/", 1)[-1]
+    return name[name.rfind("."):] if "." in name else ""
+
+
+def backfill(segments, window):
+    """The newest of a playlist's segments that fit in window seconds"""
+    total = 0.0
+    for position in range(len(segments) - 1, -1, -1):
+        total += segments[position][1]
+        if total > window:
+            return segments[position + 1:]
+    return segments
+
+
+class MediaPlaylist:
+    """The parts of an HLS media playlist the recorder needs"""
+
+    def __init__(self, text: str, base: str):
+        self.target_duration = 6
+        self.map_uri = None
+        self.ended = "#EXT-X-ENDLIST" in text
+        # (upstream sequence, duration, key tag, other tags, absolute URI)
+        self.segments = []
+        sequence = 0
+        duration = 0.0
+        key = None
+        tags = []
+        for line in text.splitlines():
+            line = line.strip()
+            if line.startswith("#EXT-X-MEDIA-SEQUENCE:"):
+                sequence = int(line.split(":", 1)[1])
+            elif line.startswith("#EXT-X-TARGETDURATION:"):
+                self.target_duration = int(line.split(":", 1)[1])
+            elif line.startswith("#EXTINF:"):
+                duration = float(line[8:].split(",", 1)[0])
+            elif line.startswith("#EXT-X-MAP:"):
+                match = _URI_ATTRIBUTE_RE.search(line)
+                self.map_uri = urljoin(base, match.group(1)) if match else None
+            elif line.startswith("#EXT-X-KEY:"):
+                key = None if "METHOD=NONE" in line else line
+                if key:
+                    key = _URI_ATTRIBUTE_RE.sub(lambda match: f'URI="{urljoin(base, match.group(1))}"', key)
+            elif line.startswith(SEGMENT_TAGS):
+                tags.append(line)
+            elif line and not line.startswith("#"):
+                self.segments.append((sequence, duration, key, tuple(tags), urljoin(base, line)))
+                sequence += 1
+                tags = []
+
+
+class SegmentRing:
+    """Bounded on-disk ring of the most recent segments.
+
+    One file is written round and round, growing as segments arrive until
+    it reaches capacity bytes, so a short session never takes the whole
+    capacity on disk. Appending evicts the oldest segments until the new one
+    fits and the durations still kept add up to at most window seconds, so
+    neither the file nor the index in memory grows past that. Segments are
+    numbered in the order they were appended.
+    """
+
+    def __init__(self, path, capacity=TIMESHIFT_BYTES, window=TIMESHIFT_SECONDS):
+        self.path = path
+        self.capacity = capacity
+        self.window = window
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "w+b")
+        self._epoch = 0
+        self.reset()
+
+    def reset(self):
+        """Forget every segment; returns the epoch appends must name from now on"""
+        with self._lock:
+            self._epoch += 1
+            # (sequence, offset, length, duration, meta)
+            self._index = deque()
+            self._by_sequence = {}
+            self._head = 0
+            self._used = 0
+            self._duration = 0.0
+            self._next = 0
+            return self._epoch
+
+    def close(self):
+        """Close the file; appends still in flight are dropped as if after a reset()"""
+        self.reset()
+        with self._lock:
+            self._file.close()
+
+    def append(self, duration: float, meta, body: bytes, epoch=None):
+        """Store body; returns the (sequence, duration, meta) entries evicted to make room.
+
+        An append naming an epoch from before the last reset() is dropped, so
+        a recorder that was just stopped can't leave a segment behind.
+        """
+        evicted = []
+        if len(body) > self.capacity:
+            return evicted
+        with self._lock:
+            if epoch is not None and epoch != self._epoch:
+                return evicted
+            while self._index and (
+                self._used + len(body) > self.capacity or self._duration + duration > self.window
+            ):
+                sequence, _, length, old_duration, old_meta = self._index.popleft()
+                del self._by_sequence[sequence]
+                self._used -= length
+                self._duration -= old_duration
+                evicted.append((sequence, old_duration, old_meta))
+            offset = self._head
+            first = min(len(body), self.capacity - offset)
+            self._file.seek(offset)
+            self._file.write(body[:first])
+            if first < len(body):
+                self._file.seek(0)
+                self._file.write(body[first:])
+            self._file.flush()
+            self._head = (offset + len(body)) % self.capacity
+            entry = (self._next, offset, len(body), duration, meta)
+            self._index.append(entry)
+            self._by_sequence[self._next] = entry
+            self._used += len(body)
+            self._duration += duration
+            self._next += 1
+        return evicted
+
+    def read(self, sequence: int):
+        """(body, meta) of segment sequence, or None once it has been evicted"""
+        with self._lock:
+            entry = self._by_sequence.get(sequence)
+            if entry is None:
+                return None
+            _, offset, length, _, meta = entry
+            first = min(length, self.capacity - offset)
+            self._file.seek(offset)
+            body = self._file.read(first)
+            if first < length:
+                self._file.seek(0)
+                body += self._file.read(length - first)
+            return body, meta
+
+    def entries(self):
+        """(sequence, duration, meta) of every stored segment, oldest first"""
+        with self._lock:
+            return [(sequence, duration, meta) for sequence, _, _, duration, meta in self._index]
+
+
+class Timeshift:
+    """Records the playing channel so it can be paused and rewound locally.
+
+    play_url() starts recording a channel into a SegmentRing and returns the
+    URL of a sliding-window playlist of what has been recorded, served by
+    the HLS relay. The window starts with the segments the live playlist
+    already lists, and grows by polling it, until it holds TIMESHIFT_SECONDS.
+    Pausing, rewinding within the window and resuming then only read the
+    local file. Only one channel is recorded at a time; switching to another
+    starts the ring over.
+
+    Each instance records into a ring file and serves a relay path of its
+    own, so every session can have one (see get_timeshift()). close() stops
+    it and deletes the file; files left by processes that died before they
+    could are deleted when the next recording starts.
+    """
+
+    def __init__(self, relay=None, directory=None, capacity=TIMESHIFT_BYTES, window=TIMESHIFT_SECONDS):
+        self.relay = relay or get_relay()
+        self.directory = directory or default_cache_dir("timeshift")
+        self.capacity = capacity
+        self.window = window
+        self.name = f"{os.getpid()}-{next(_names)}"
+        self.prefix = f"{PREFIX}{self.name}/"
+        self.ring = None
+        # Guards ring, which close() can clear while the relay is serving a request.
+        self._lock = threading.Lock()
+        self._channel = None
+        self._generation = 0
+        self._task = None
+        self._epoch = None
+        self._init = None
+        self._ended = False
+        self._recorded = None
+        # Discontinuities that have scrolled out of the window, for EXT-X-DISCONTINUITY-SEQUENCE.
+        self._discontinuities = 0
+
+    def play_url(self, url: str, headers=None, page=None):
+        """(url, headers) for the player on page: the time-shift playlist for HLS URLs.
+
+        The playlist is served by the relay, so without it the stream is played live.
+        """
+        if not is_hls_url(url) or not relay_enabled(page):
+            self.stop()
+            return relay_url(url, headers, page)
+        base = self.relay.start()
+        if self.ring is None:
+            remove_orphans(self.directory, RING_FILE_PATTERN)
+            ring = SegmentRing(os.path.join(self.directory, f"ring-{self.name}.bin"), self.capacity, self.window)
+            with self._lock:
+                self.ring = ring
+            self.relay.mount(self.prefix, self._respond)
+        channel = (url, tuple(sorted((headers or {}).items())))
+        if channel != self._channel:
+            self.stop()
+            self._channel = channel
+            self._generation += 1
+            self._epoch = self.ring.reset()
+            self._init = None
+            self._ended = False
+            self._discontinuities = 0
+            self._recorded = asyncio.Event()
+            self._task = self.relay.submit(self._record(url, dict(headers or {}), self._generation, self._epoch))
+        return f"{base}{self.prefix}{self._generation}/index.m3u8", None
+
+    def stop(self):
+        """Stop recording; what was recorded stays playable until the next play_url()"""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        self._channel = None
+
+    def close(self):
+        """Stop recording, stop serving and delete the ring file"""
+        self.stop()
+        with self._lock:
+            ring, self.ring = self.ring, None
+        if ring is not None:
+            self.relay.unmount(self.prefix)
+            ring.close()
+            try:
+                os.remove(ring.path)
+            except OSError:
+                pass
+
+    def _get(self, url, headers):
+        response = self.relay.session.get(url, headers=headers, timeout=(UPSTREAM_CONNECT_TIMEOUT, UPSTREAM_READ_TIMEOUT))
+        response.raise_for_status()
+        return response
+
+    async def _record(self, url, headers, generation, epoch):
+        metrics = get_metrics()
+        recorded = self._recorded
+        ring = self.ring
+        map_uri = None
+        last = None
+        resolved = False
+        while True:
+            delay = 1.0
+            try:
+                response = await asyncio.to_thread(self._get, url, headers)
+                text = response.text
+                if "#EXT-X-STREAM-INF" in text:
+                    variants = [
+                        (bandwidth(tag), uri) for tag, uri in media_lines(text, response.url)
+                        if tag.startswith("#EXT-X-STREAM-INF")
+                    ]
+                    if not variants or resolved:
+                        # Nothing to record, and asking again won't change that.
+                        metrics.increment("timeshift_errors_total")
+                        return
+                    # The same variant the player would start on.
+                    url = max(variants)[1]
+                    resolved = True
+                    continue
+                playlist = MediaPlaylist(text, response.url)
+                delay = playlist.target_duration / 2
+                if playlist.map_uri != map_uri:
+                    map_uri = playlist.map_uri
+                    self._init = (await asyncio.to_thread(self._get, map_uri, headers)).content if map_uri else None
+                if last is not None and playlist.segments and playlist.segments[-1][0] < last:
+                    # The stream restarted with lower sequence numbers.
+                    last = None
+                restarted = last is None and recorded.is_set()
+                segments = playlist.segments
+                if last is None:
+                    segments = backfill(segments, self.window)
+                for sequence, duration, key, tags, uri in segments:
+                    if last is not None and sequence <= last:
+                        continue
+                    response = await asyncio.to_thread(self._get, uri, headers)
+                    if restarted and "#EXT-X-DISCONTINUITY" not in tags:
+                        tags = ("#EXT-X-DISCONTINUITY", *tags)
+                    restarted = False
+                    if key:
+                        key = _URI_ATTRIBUTE_RE.sub(lambda match: f'URI="{self.relay.url_for(match.group(1), headers)}"', key)
+                    meta = (key, tags, response.headers.get("Content-Type") or "video/mp2t", extension(uri))
+                    evicted = await asyncio.to_thread(ring.append, duration, meta, response.content, epoch)
+                    self._discontinuities += sum("#EXT-X-DISCONTINUITY" in meta[1] for _, _, meta in evicted)
+                    metrics.increment("timeshift_recorded_bytes_total", len(response.content))
+                    last = sequence
+                    recorded.set()
+                if playlist.ended:
+                    self._ended = True
+                    return
+                if playlist.segments and last == playlist.segments[-1][0]:
+                    delay = playlist.segments[-1][1] or delay
+            except (requests.RequestException, ValueError):
+                metrics.increment("timeshift_errors_total")
+            except OSError:
+                # Writing the ring failed, e.g. the disk is full. The segment is
+                # fetched again on the next poll rather than ending the recording.
+                metrics.increment("timeshift_write_errors_total")
+            if generation != self._generation:
+                return
+            await asyncio.sleep(delay)
+
+    async def _respond(self, method, path, headers):
+        with self._lock:
+            ring = self.ring
+        if ring is None:
+            return 404, {}, b""
+        try:
+            generation, name = path[len(self.prefix):].split("/", 1)
+            if int(generation) != self._generation:
+                return 404, {}, b""
+        except ValueError:
+            return 404, {}, b""
+        if name == "index.m3u8":
+            if self._recorded is None:
+                return 404, {}, b""
+            try:
+                await asyncio.wait_for(self._recorded.wait(), FIRST_SEGMENT_TIMEOUT)
+            except asyncio.TimeoutError:
+                return 504, {}, b""
+            return 200, {"Content-Type": MANIFEST_TYPE, "Cache-Control": "no-cache"}, self._playlist(ring).encode("utf-8")
+        if name == "init.mp4" and self._init is not None:
+            return 200, {"Content-Type": "video/mp4"}, self._init
+        if name.startswith("seg/"):
+            try:
+                found = await asyncio.to_thread(ring.read, int(name[4:].split(".", 1)[0]))
+            except ValueError:
+                found = None
+            if found is not None:
+                body, (_, _, content_type, _) = found
+                return 200, {"Content-Type": content_type}, body
+        return 404, {}, b""
+
+    def _playlist(self, ring):
+        entries = ring.entries()
+        lines = [
+            "#EXTM3U",
+            "#EXT-X-VERSION:6",
+            f"#EXT-X-TARGETDURATION:{math.ceil(max((duration for _, duration, _ in entries), default=6))}",
+            f"#EXT-X-MEDIA-SEQUENCE:{entries[0][0] if entries else 0}",
+            f"#EXT-X-DISCONTINUITY-SEQUENCE:{self._discontinuities}",
+        ]
+        if self._init is not None:
+            lines.append('#EXT-X-MAP:URI="init.mp4"')
+        current_key = None
+        for sequence, duration, (key, tags, _, suffix) in entries:
+            if key != current_key:
+                lines.append(key or "#EXT-X-KEY:METHOD=NONE")
+                current_key = key
+            lines.extend(tags)
+            lines.append(f"#EXTINF:{duration:.3f},")
+            lines.append(f"seg/{sequence}{suffix}")
+        if self._ended:
+            lines.append("#EXT-X-ENDLIST")
+        return "\n".join(lines) + "\n"
+
+
+# page.session_id -> (the Timeshift of that session, unsubscribe from its disconnect).
+_timeshifts = {}
+
+
+def get_timeshift(page):
+    """The Timeshift of page's session, closed when the session disconnects"""
+    entry = _timeshifts.get(page.session_id)
+    if entry is None:
+        entry = _timeshifts[page.session_id] = (Timeshift(), on_disconnect(page, lambda: close_timeshift(page)))
+    return entry[0]
+
+
+def stop_timeshift(page):
+    """Stop recording for page's session only; other sessions keep theirs"""
+    entry = _timeshifts.get(page.session_id)
+    if entry is not None:
+        entry[0].stop()
+
+
+def close_timeshift(page):
+    """Stop page's session recording and delete its ring file"""
+    entry = _timeshifts.pop(page.session_id, None)
+    if entry is not None:
+        timeshift, unsubscribe = entry
+        unsubscribe()
+        timeshift.close()
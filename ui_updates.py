@@ -0,0 +1,130 @@
+import asyncio
+import threading
+import time
+from datetime import datetime
+from metrics import get_metrics
+
+# Requests made within one frame go out as a single update.
+FRAME_SECONDS = 1 / 60
+TICK_SECONDS = 1
+
+
+class UpdateScheduler:
+    """Coalesces update requests for one page into at most one update per frame.
+
+    request(*controls) marks controls dirty, or the whole page when called
+    without any, and flushes them together one frame after the first request.
+    Controls that have left the page by then are dropped rather than sent. Safe
+    to call from event handler threads.
+    """
+
+    def __init__(self, page, frame=FRAME_SECONDS):
+        self.page = page
+        self.frame = frame
+        self._lock = threading.Lock()
+        self._dirty = {}
+        self._whole_page = False
+        self._scheduled = False
+
+    def request(self, *controls):
+        get_metrics().increment("ui_update_requests_total")
+        with self._lock:
+            if controls:
+                for control in controls:
+                    self._dirty[id(control)] = control
+            else:
+                self._whole_page = True
+            if self._scheduled:
+                return
+            self._scheduled = True
+        self.page.run_task(self._flush_later)
+
+    async def _flush_later(self):
+        await asyncio.sleep(self.frame)
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            controls = list(self._dirty.values())
+            whole_page = self._whole_page
+            self._dirty.clear()
+            self._whole_page = False
+            self._scheduled = False
+        if whole_page:
+            self.page.update()
+        else:
+            controls = [control for control in controls if control.page is not None]
+            if not controls:
+                return
+            self.page.update(*controls)
+        get_metrics().increment("ui_flushes_total")
+
+
+class Ticker:
+    """One timer per page that calls every subscriber with the current time, on
+    the second, instead of each clock running its own loop.
+
+    The loop only runs while something is subscribed.
+    """
+
+    def __init__(self, page, interval=TICK_SECONDS):
+        self.page = page
+        self.interval = interval
+        self._subscribers = []
+        self._task = None
+
+    def subscribe(self, callback):
+        """Call callback(now) every interval; returns a function that unsubscribes"""
+        self._subscribers.append(callback)
+        if self._task is None:
+            self._task = self.page.run_task(self._run)
+        return lambda: callback in self._subscribers and self._subscribers.remove(callback)
+
+    async def _run(self):
+        try:
+            while self._subscribers:
+                # Wake on the boundary so every subscriber ticks in the same frame.
+                await asyncio.sleep(self.interval - time.time() % self.interval)
+                now = datetime.now()
+                for callback in list(self._subscribers):
+                    callback(now)
+        finally:
+            self._task = None
+
+
+def get_update_scheduler(page):
+    scheduler = getattr(page, "update_scheduler", None)
+    if scheduler is None:
+        scheduler = page.update_scheduler = UpdateScheduler(page)
+    return scheduler
+
+
+def get_ticker(page):
+    ticker = getattr(page, "ticker", None)
+    if ticker is None:
+        ticker = page.ticker = Ticker(page)
+    return ticker
+
+
+def on_disconnect(page, callback):
+    """Call callback() when page's session disconnects; returns a function that unsubscribes.
+
+    page.on_disconnect holds a single handler, so everything that keeps
+    per-session state registers here rather than replacing each other's.
+    """
+    callbacks = getattr(page, "disconnect_callbacks", None)
+    if callbacks is None:
+        callbacks = page.disconnect_callbacks = []
+
+        def disconnected(e):
+            for callback in list(callbacks):
+                callback()
+
+        page.on_disconnect = disconnected
+    callbacks.append(callback)
+    return lambda: callback in callbacks and callbacks.remove(callback)
+
+
+def schedule_update(page, *controls):
+    """Update controls (or the whole page) with the next frame instead of right away"""
+    get_update_scheduler(page).request(*controls)
@@ -0,0 +1,189 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+import requests
+from catalog_loader import get_session
+from hls_relay import get_relay, relay_enabled
+
+PREFETCH_WORKERS = 4
+# Redirect targets are often tokenized URLs that expire, and master playlists
+# are only kept this long.
+PREFETCH_TTL = 30
+# How many grid neighbours on each side of a focused or playing channel to prefetch.
+PREFETCH_NEIGHBOURS = 2
+MAX_PREFETCHED = 64
+PREFETCH_CONNECT_TIMEOUT = 3
+PREFETCH_READ_TIMEOUT = 5
+# Fetching the start of the segment playback begins with also warms the CDN edge.
+PREFETCH_FIRST_SEGMENT = True
+SEGMENT_PROBE_BYTES = 64 * 1024
+
+
+def media_lines(text: str, base: str):
+    """(tag line, absolute URI) pairs of an HLS playlist, pairing each URI with the tag before it"""
+    pairs = []
+    tag = ""
+    for line in text.splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        if line.startswith("#"):
+            tag = line
+        else:
+            pairs.append((tag, urljoin(base, line)))
+            tag = ""
+    return pairs
+
+
+def bandwidth(tag: str):
+    start = tag.find("BANDWIDTH=")
+    if start == -1:
+        return 0
+    digits = tag[start + 10:].split(",", 1)[0]
+    return int(digits) if digits.isdigit() else 0
+
+
+def target_duration(text: str, default=6):
+    start = text.find("#EXT-X-TARGETDURATION:")
+    if start == -1:
+        return default
+    digits = text[start + 22:].split("\n", 1)[0].strip()
+    return int(digits) if digits.isdigit() else default
+
+
+def swap_media(player, media):
+    """Play media on a running player in place of its current item.
+
+    The new item is appended and jumped to before the old one, always at
+    index 0, is removed, so the player never runs out of media and its
+    playlist stays one item long.
+    """
+    player.playlist_add(media)
+    player.jump_to(1)
+    player.playlist_remove(0)
+
+
+class ManifestPrefetcher:
+    """Fetch channels' HLS playlists ahead of the user zapping to them.
+
+    prefetch() follows a channel's redirects to its playlist on a small worker
+    pool. For a master playlist it also fetches the highest-bandwidth variant
+    and touches the segment playback of that variant would start from, which
+    warms the CDN edge. When page plays through the HLS relay, the playlist
+    bodies are primed into it, so a player tuning in through it soon after
+    gets them without a round trip.
+
+    play_url() returns the URL the channel redirected to, which saves the
+    player the redirect chain. It is still the master playlist, so the player
+    picks and switches variants itself.
+    """
+
+    def __init__(self, workers=PREFETCH_WORKERS, ttl=PREFETCH_TTL, max_entries=MAX_PREFETCHED):
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="zap-prefetch")
+        self._ttl = ttl
+        self._max_entries = max_entries
+        self._lock = threading.Lock()
+        self._resolved = OrderedDict()
+        self._in_flight = set()
+
+    def _fresh(self, url):
+        entry = self._resolved.get(url)
+        return entry is not None and time.monotonic() - entry[1] < self._ttl
+
+    def prefetch(self, channel, page=None):
+        """Resolve channel for the player on page in the background"""
+        url = channel.url
+        if not url:
+            return
+        with self._lock:
+            if url in self._in_flight or self._fresh(url):
+                return
+            self._in_flight.add(url)
+        # Without the relay nothing would read the primed bodies, and priming would only start it.
+        self._executor.submit(self._resolve, url, channel.http_headers or None, relay_enabled(page))
+
+    def prefetch_around(self, channels, index, radius=PREFETCH_NEIGHBOURS, page=None):
+        """Prefetch channels[index] and its neighbours, nearest first; nothing for index -1"""
+        if index < 0:
+            return
+        for offset in range(radius + 1):
+            for position in {index + offset, index - offset}:
+                if 0 <= position < len(channels):
+                    self.prefetch(channels[position], page)
+
+    def play_url(self, channel):
+        """Where channel's URL redirected to if that is freshly known, else its own URL"""
+        with self._lock:
+            if self._fresh(channel.url):
+                self._resolved.move_to_end(channel.url)
+                return self._resolved[channel.url][0]
+        return channel.url
+
+    def _resolve(self, url, headers, prime):
+        try:
+            play_url = self._resolve_playlist(url, headers, prime)
+        except (requests.RequestException, ValueError):
+            play_url = None
+        with self._lock:
+            self._in_flight.discard(url)
+            if play_url is None:
+                return
+            self._resolved[url] = (play_url, time.monotonic())
+            self._resolved.move_to_end(url)
+            while len(self._resolved) > self._max_entries:
+                self._resolved.popitem(last=False)
+
+    def _get_playlist(self, url, headers, prime):
+        """(final URL, text) of playlist url, also primed into the relay if prime is set.
+
+        A live media playlist is primed for its target duration, about as long
+        as it stays current; anything else for the prefetch TTL.
+        """
+        response = get_session().get(url, headers=headers, timeout=(PREFETCH_CONNECT_TIMEOUT, PREFETCH_READ_TIMEOUT))
+        response.raise_for_status()
+        text = response.text
+        if not text.lstrip("\ufeff \t\r\n").startswith("#EXTM3U"):
+            raise ValueError(f"{url} is not an HLS playlist")
+        live = "#EXTINF" in text and "#EXT-X-ENDLIST" not in text
+        ttl = min(target_duration(text), self._ttl) if live else self._ttl
+        if prime:
+            body = response.content
+            # The player may ask for either the URL or where it redirected to.
+            for key in {url, response.url}:
+                get_relay().prime(key, response.url, body, ttl)
+        return response.url, text
+
+    def _resolve_playlist(self, url, headers, prime):
+        """The URL to play url from: where it redirected to"""
+        play_url, text = self._get_playlist(url, headers, prime)
+        final_url = play_url
+        entries = media_lines(text, final_url)
+        if "#EXT-X-STREAM-INF" in text:
+            variants = [(bandwidth(tag), uri) for tag, uri in entries if tag.startswith("#EXT-X-STREAM-INF")]
+            if not variants:
+                return play_url
+            final_url, text = self._get_playlist(max(variants)[1], headers, prime)
+            entries = media_lines(text, final_url)
+        if PREFETCH_FIRST_SEGMENT and entries:
+            # Players join a live playlist about three segments from its end.
+            first = 0 if "#EXT-X-ENDLIST" in text else max(len(entries) - 3, 0)
+            with get_session().get(
+                entries[first][1],
+                headers=headers,
+                timeout=(PREFETCH_CONNECT_TIMEOUT, PREFETCH_READ_TIMEOUT),
+                stream=True,
+            ) as response:
+                next(response.iter_content(SEGMENT_PROBE_BYTES), None)
+        return play_url
+
+
+_prefetcher = None
+
+
+def get_prefetcher():
+    global _prefetcher
+    if _prefetcher is None:
+        _prefetcher = ManifestPrefetcher()
+    return _prefetcher